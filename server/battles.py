@@ -0,0 +1,447 @@
+"""
+PvP battles: two players stake the same amount, both throw a Telegram die, the higher throw takes both stakes
+Open battles are indexed in memory by bet amount (FIFO per amount) and by id, so matching an
+opponent, joining or cancelling a battle never looks at the battles table. The opponent's stake
+and the claim on the battle are committed together before the dice are thrown (concurrently);
+the result and the payout are committed together afterwards.
+"""
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import aliased
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from time import perf_counter
+import asyncio
+import logging
+import os
+
+from cache_bus import CacheBus
+from database import AsyncSessionLocal
+from ledger import Ledger
+from models import Battle, User
+
+logger = logging.getLogger(__name__)
+
+BATTLE_MIN_BET = int(os.getenv("BATTLE_MIN_BET", "1"))
+BATTLE_MAX_OPEN = int(os.getenv("BATTLE_MAX_OPEN", "5"))  # open battles per user
+BATTLE_MAX_THROWS = int(os.getenv("BATTLE_MAX_THROWS", "3"))  # rounds of throws before a tie is a draw
+BATTLE_DICE_EMOJI = os.getenv("BATTLE_DICE_EMOJI", "🎲")
+BATTLE_ACTIVE_TIMEOUT = float(os.getenv("BATTLE_ACTIVE_TIMEOUT", "300"))  # seconds before a battle left active is refunded
+
+# (dice value, dice message id)
+Roll = Callable[[], Awaitable[Tuple[int, int]]]
+
+
+class OpenBattle(NamedTuple):
+    id: int
+    bet_amount: int
+    creator_id: int  # users.id
+    creator_telegram_id: int
+    created_at: datetime
+
+
+class BattleUnavailable(Exception):
+    """The battle was joined or cancelled meanwhile (possibly by another worker)"""
+
+
+class BattleService:
+    """
+    Matchmaking over battles rows with status 'waiting'
+    The creator's stake is debited when the battle is opened. Joining takes the battle out
+    of its bucket, then debits the opponent and moves the battle to 'active' with
+    UPDATE ... WHERE status = 'waiting' in one transaction, so a battle cancelled or joined
+    elsewhere (or a player short of Stars) is turned down before any die is thrown. While
+    active, completed_at holds the time of the claim; battles left active by a dead worker
+    are refunded on startup. With several workers, opened and closed battles are announced
+    on the cache bus so every worker's index converges.
+    """
+
+    def __init__(self, ledger: Ledger, roll: Roll, bus: Optional[CacheBus] = None, min_bet: int = BATTLE_MIN_BET, max_open: int = BATTLE_MAX_OPEN):
+        self.ledger = ledger
+        self.roll = roll
+        self.bus = bus
+        self.min_bet = min_bet
+        self.max_open = max_open
+        self._buckets: Dict[int, "OrderedDict[int, OpenBattle]"] = {}  # bet amount -> id -> battle, oldest first
+        self._open: Dict[int, OpenBattle] = {}  # id -> battle
+        self._by_creator: Dict[int, set] = {}  # users.id -> ids
+        if bus is not None:
+            bus.subscribe("battle", self._on_event)
+
+        # Metrics
+        self.created = 0
+        self.completed = 0
+        self.draws = 0
+        self.cancelled = 0
+        self.conflicts = 0
+        self.throws = 0
+        self.last_throw_ms = 0.0
+
+    async def start(self):
+        """Refund battles abandoned mid-fight, then index the waiting battles (FastAPI startup)"""
+        await self.recover()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Battle.id, Battle.bet_amount, Battle.creator_id, User.telegram_id, Battle.created_at)
+                .join(User, User.id == Battle.creator_id)
+                .where(Battle.status == "waiting")
+                .order_by(Battle.id)
+            )).all()
+        self._buckets.clear()
+        self._open.clear()
+        self._by_creator.clear()
+        for battle_id, bet_amount, creator_id, telegram_id, created_at in rows:
+            self._index(OpenBattle(battle_id, int(bet_amount), creator_id, telegram_id, created_at))
+        if rows:
+            logger.info(f"⚔️ {len(rows)} open battles in {len(self._buckets)} bet buckets")
+
+    async def create(self, user_id: int, telegram_id: int, bet_amount: int) -> Dict[str, Any]:
+        """
+        Open a battle for users.id, debiting the stake
+        Raises InsufficientFunds, or ValueError for a bet below the minimum / too many open battles
+        """
+        bet_amount = int(bet_amount)
+        if bet_amount < self.min_bet:
+            raise ValueError(f"Minimum battle bet is {self.min_bet} Stars")
+        if len(self._by_creator.get(user_id, ())) >= self.max_open:
+            raise ValueError(f"At most {self.max_open} open battles per player")
+
+        async with self.ledger.transaction() as tx:
+            _, balance = await tx.apply(user_id, -bet_amount, "battle_bet", "Battle stake")
+            battle_id, created_at = (await tx.db.execute(
+                insert(Battle)
+                .values(creator_id=user_id, bet_amount=bet_amount, status="waiting", created_at=datetime.utcnow())
+                .returning(Battle.id, Battle.created_at)
+            )).one()
+
+        battle = OpenBattle(battle_id, bet_amount, user_id, telegram_id, created_at)
+        self._index(battle)
+        self._publish(f"open:{battle_id}:{bet_amount}:{user_id}:{telegram_id}:{created_at.isoformat()}")
+        self.created += 1
+        return {**self._describe(battle), "balance": balance}
+
+    async def match(self, user_id: int, telegram_id: int, bet_amount: int) -> Dict[str, Any]:
+        """Fight the oldest open battle at this bet amount, or open one when there is none"""
+        bet_amount = int(bet_amount)
+        while True:
+            battle = self._take(bet_amount, exclude=user_id)
+            if battle is None:
+                return await self.create(user_id, telegram_id, bet_amount)
+            try:
+                return await self._fight(battle, user_id, telegram_id)
+            except BattleUnavailable:
+                continue  # stale entry; try the next one
+
+    async def join(self, battle_id: int, user_id: int, telegram_id: int) -> Dict[str, Any]:
+        """
+        Fight one open battle
+        Raises LookupError when it is not open, BattleUnavailable when it closed meanwhile,
+        ValueError for the player's own battle, InsufficientFunds
+        """
+        battle = self._open.get(battle_id)
+        if battle is None:
+            raise LookupError(f"Battle {battle_id} is not open")
+        if battle.creator_id == user_id:
+            raise ValueError("Cannot join your own battle")
+        self._unindex(battle)
+        return await self._fight(battle, user_id, telegram_id)
+
+    async def cancel(self, battle_id: int, user_id: int) -> Dict[str, Any]:
+        """Close the player's own open battle and refund the stake"""
+        battle = self._open.get(battle_id)
+        if battle is None or battle.creator_id != user_id:
+            raise LookupError(f"Battle {battle_id} is not open")
+        self._unindex(battle)
+        completed_at = datetime.utcnow()
+        try:
+            async with self.ledger.transaction() as tx:
+                await self._claim(tx.db, battle_id, status="cancelled", completed_at=completed_at)
+                _, balance = await tx.apply(user_id, battle.bet_amount, "battle_refund", f"Battle {battle_id} cancelled")
+        except Exception as e:
+            if not isinstance(e, BattleUnavailable):
+                self._index(battle, front=True)
+            raise
+        self._publish(f"closed:{battle_id}")
+        self.cancelled += 1
+        return {**self._describe(battle, status="cancelled", completed_at=completed_at), "balance": balance}
+
+    async def recover(self, older_than: float = BATTLE_ACTIVE_TIMEOUT) -> int:
+        """
+        Cancel battles claimed more than older_than seconds ago and never settled (the worker
+        died or the database failed mid-fight), refunding both stakes; returns how many
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Battle.id, Battle.bet_amount, Battle.creator_id, Battle.opponent_id)
+                .where(Battle.status == "active", Battle.completed_at < cutoff)
+            )).all()
+        recovered = 0
+        for battle_id, bet_amount, creator_id, opponent_id in rows:
+            try:
+                await self._abandon(battle_id, int(bet_amount), creator_id, opponent_id)
+            except BattleUnavailable:
+                continue  # settled or recovered meanwhile
+            recovered += 1
+        if recovered:
+            logger.warning(f"⚔️ Refunded {recovered} battles abandoned mid-fight")
+        return recovered
+
+    def open_battles(self, bet_amount: Optional[int] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """Oldest open battles, of one bet amount or of every bucket"""
+        if bet_amount is not None:
+            buckets = [self._buckets.get(int(bet_amount), {})]
+        else:
+            buckets = [self._buckets[bet] for bet in sorted(self._buckets)]
+        battles: List[Dict[str, Any]] = []
+        for bucket in buckets:
+            for battle in bucket.values():
+                if len(battles) >= limit:
+                    return battles
+                battles.append(self._describe(battle))
+        return battles
+
+    async def history(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """The player's latest battles, newest first"""
+        creator, opponent = aliased(User), aliased(User)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Battle, creator.telegram_id, opponent.telegram_id)
+                .join(creator, creator.id == Battle.creator_id)
+                .outerjoin(opponent, opponent.id == Battle.opponent_id)
+                .where(or_(Battle.creator_id == user_id, Battle.opponent_id == user_id))
+                .order_by(Battle.id.desc())
+                .limit(limit)
+            )).all()
+        return [self._describe_row(battle, creator_tg, opponent_tg) for battle, creator_tg, opponent_tg in rows]
+
+    async def get(self, battle_id: int) -> Optional[Dict[str, Any]]:
+        battle = self._open.get(battle_id)
+        if battle is not None:
+            return self._describe(battle)
+        creator, opponent = aliased(User), aliased(User)
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(
+                select(Battle, creator.telegram_id, opponent.telegram_id)
+                .join(creator, creator.id == Battle.creator_id)
+                .outerjoin(opponent, opponent.id == Battle.opponent_id)
+                .where(Battle.id == battle_id)
+            )).first()
+        return self._describe_row(*row) if row else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "open": len(self._open),
+            "buckets": len(self._buckets),
+            "created": self.created,
+            "completed": self.completed,
+            "draws": self.draws,
+            "cancelled": self.cancelled,
+            "conflicts": self.conflicts,
+            "throws": self.throws,
+            "last_throw_ms": round(self.last_throw_ms, 2),
+        }
+
+    async def _fight(self, battle: OpenBattle, user_id: int, telegram_id: int) -> Dict[str, Any]:
+        """
+        Stake, throw both dice and settle; battle is already out of the index
+        The opponent's debit and the claim (waiting -> active) commit together before any die
+        is thrown, so once a result is posted in the dice channel only the payout remains.
+        """
+        bet = battle.bet_amount
+        try:
+            async with self.ledger.transaction() as tx:
+                await self._claim(tx.db, battle.id, status="active", opponent_id=user_id, completed_at=datetime.utcnow())
+                _, balance = await tx.apply(user_id, -bet, "battle_bet", f"Battle {battle.id}")
+        except BattleUnavailable:
+            self.conflicts += 1
+            raise
+        except BaseException:
+            self._index(battle, front=True)  # keeps its place in the queue
+            raise
+
+        # Both dice in flight at once; repeat on a tie, then call it a draw
+        last = None  # both throws of the latest complete round
+        posted = False  # a die may be showing in the dice channel
+        try:
+            for _ in range(BATTLE_MAX_THROWS):
+                started = perf_counter()
+                posted = True  # until gather tells otherwise
+                throws = await asyncio.gather(self.roll(), self.roll(), return_exceptions=True)
+                self.last_throw_ms = (perf_counter() - started) * 1000
+                failed = [throw for throw in throws if isinstance(throw, BaseException)]
+                posted = last is not None or len(failed) < len(throws)
+                if failed:
+                    raise failed[0]
+                self.throws += 1
+                last = throws
+                if throws[0][0] != throws[1][0]:
+                    break
+        except Exception:
+            if last is None:
+                if posted:
+                    # One die is public but the round has no result: both stakes go back
+                    await self._abandon_fight(battle, user_id)
+                else:
+                    await self._reopen(battle, user_id)
+                raise
+            # The tie thrown before stands as a draw
+            logger.warning(f"Battle {battle.id}: throw after a tie failed, settling as a draw", exc_info=True)
+        except BaseException:
+            # Cancelled: with no die out the battle can be fought again, else recovery refunds it
+            if not posted:
+                await self._reopen(battle, user_id)
+            raise
+        (creator_value, creator_msg), (opponent_value, opponent_msg) = last
+        creator_result = {"value": creator_value, "messageId": creator_msg}
+        opponent_result = {"value": opponent_value, "messageId": opponent_msg}
+        if creator_value == opponent_value:
+            winner_id = None
+            changes = [(battle.creator_id, bet, "battle_refund"), (user_id, bet, "battle_refund")]
+        else:
+            winner_id = battle.creator_id if creator_value > opponent_value else user_id
+            changes = [(winner_id, 2 * bet, "battle_win")]
+        # Row locks in users.id order, so two battles between the same players cannot deadlock on PostgreSQL
+        changes.sort(key=lambda change: change[0])
+
+        completed_at = datetime.utcnow()
+        async with self.ledger.transaction() as settle:
+            await self._claim(
+                settle.db, battle.id, expect="active",
+                status="completed", winner_id=winner_id,
+                creator_result=creator_result, opponent_result=opponent_result, completed_at=completed_at,
+            )
+            for change_user, amount, transaction_type in changes:
+                await settle.apply(change_user, amount, transaction_type, f"Battle {battle.id}")
+
+        self._publish(f"closed:{battle.id}")
+        self.completed += 1
+        if winner_id is None:
+            self.draws += 1
+        return {
+            **self._describe(battle, status="completed", completed_at=completed_at),
+            "opponentId": telegram_id,
+            "winnerId": None if winner_id is None else (battle.creator_telegram_id if winner_id == battle.creator_id else telegram_id),
+            "creatorResult": creator_result,
+            "opponentResult": opponent_result,
+            "balance": settle.balances.get(user_id, balance),
+        }
+
+    async def _abandon(self, battle_id: int, bet_amount: int, creator_id: int, opponent_id: int):
+        """Cancel an active battle, refunding both stakes; BattleUnavailable when it is no longer active"""
+        async with self.ledger.transaction() as tx:
+            await self._claim(tx.db, battle_id, expect="active", status="cancelled", completed_at=datetime.utcnow())
+            for user_id in sorted((creator_id, opponent_id)):
+                await tx.apply(user_id, bet_amount, "battle_refund", f"Battle {battle_id} abandoned")
+        self._publish(f"closed:{battle_id}")
+        self.cancelled += 1
+
+    async def _abandon_fight(self, battle: OpenBattle, user_id: int):
+        try:
+            await self._abandon(battle.id, battle.bet_amount, battle.creator_id, user_id)
+        except Exception:
+            logger.exception(f"Battle {battle.id} stays active; it is refunded on the next startup")
+
+    async def _reopen(self, battle: OpenBattle, user_id: int):
+        """No die was thrown (the roll failed): refund the opponent and put the battle back in the queue"""
+        try:
+            async with self.ledger.transaction() as tx:
+                await self._claim(tx.db, battle.id, expect="active", status="waiting", opponent_id=None, completed_at=None)
+                await tx.apply(user_id, battle.bet_amount, "battle_refund", f"Battle {battle.id} not fought")
+        except Exception:
+            logger.exception(f"Battle {battle.id} stays active; it is refunded on the next startup")
+            return
+        self._index(battle, front=True)
+
+    @staticmethod
+    async def _claim(db, battle_id: int, expect: str = "waiting", **values):
+        """Move a battle on from expect; BattleUnavailable (rolling back the transaction) when it is not in expect"""
+        claimed = await db.execute(
+            update(Battle).where(Battle.id == battle_id, Battle.status == expect).values(**values)
+        )
+        if claimed.rowcount != 1:
+            raise BattleUnavailable(battle_id)
+
+    def _take(self, bet_amount: int, exclude: int) -> Optional[OpenBattle]:
+        """Oldest open battle at bet_amount not created by exclude, removed from the index"""
+        bucket = self._buckets.get(bet_amount)
+        if not bucket:
+            return None
+        # Skips at most max_open of the player's own battles
+        for battle in bucket.values():
+            if battle.creator_id != exclude:
+                self._unindex(battle)
+                return battle
+        return None
+
+    def _index(self, battle: OpenBattle, front: bool = False):
+        if battle.id in self._open:
+            return
+        bucket = self._buckets.setdefault(battle.bet_amount, OrderedDict())
+        bucket[battle.id] = battle
+        if front:
+            bucket.move_to_end(battle.id, last=False)
+        self._open[battle.id] = battle
+        self._by_creator.setdefault(battle.creator_id, set()).add(battle.id)
+
+    def _unindex(self, battle: OpenBattle):
+        if self._open.pop(battle.id, None) is None:
+            return
+        bucket = self._buckets[battle.bet_amount]
+        del bucket[battle.id]
+        if not bucket:
+            del self._buckets[battle.bet_amount]
+        mine = self._by_creator[battle.creator_id]
+        mine.discard(battle.id)
+        if not mine:
+            del self._by_creator[battle.creator_id]
+
+    def _publish(self, key: str):
+        if self.bus is not None:
+            self.bus.publish("battle", key)
+
+    def _on_event(self, key: str):
+        """Battles opened / closed by another worker"""
+        kind, _, rest = key.partition(":")
+        if kind == "open":
+            battle_id, bet_amount, creator_id, telegram_id, created_at = rest.split(":", 4)
+            self._index(OpenBattle(int(battle_id), int(bet_amount), int(creator_id), int(telegram_id), datetime.fromisoformat(created_at)))
+        elif kind == "closed":
+            battle = self._open.get(int(rest))
+            if battle is not None:
+                self._unindex(battle)
+
+    @staticmethod
+    def _describe(battle: OpenBattle, status: str = "waiting", completed_at: Optional[datetime] = None) -> Dict[str, Any]:
+        return {
+            "id": battle.id,
+            "betAmount": battle.bet_amount,
+            "status": status,
+            "creatorId": battle.creator_telegram_id,
+            "opponentId": None,
+            "winnerId": None,
+            "creatorResult": None,
+            "opponentResult": None,
+            "createdAt": battle.created_at.isoformat() if battle.created_at else None,
+            "completedAt": completed_at.isoformat() if completed_at else None,
+        }
+
+    @staticmethod
+    def _describe_row(battle: Battle, creator_tg: int, opponent_tg: Optional[int]) -> Dict[str, Any]:
+        if battle.winner_id is None:
+            winner = None
+        else:
+            winner = creator_tg if battle.winner_id == battle.creator_id else opponent_tg
+        return {
+            "id": battle.id,
+            "betAmount": int(battle.bet_amount),
+            "status": battle.status,
+            "creatorId": creator_tg,
+            "opponentId": opponent_tg,
+            "winnerId": winner,
+            "creatorResult": battle.creator_result,
+            "opponentResult": battle.opponent_result,
+            "createdAt": battle.created_at.isoformat() if battle.created_at else None,
+            "completedAt": battle.completed_at.isoformat() if battle.completed_at else None,
+        }
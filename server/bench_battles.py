@@ -0,0 +1,132 @@
+"""
+Benchmark: PvP battle matchmaking
+index:   matching and id lookups with --open battles waiting, against a linear scan of a list
+service: concurrent BattleService.match() against a temporary SQLite database, with dice
+         that take --throw-ms to come back (both sides thrown concurrently)
+
+    python bench_battles.py --open 10000
+    python bench_battles.py --matches 2000 --users 500 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+
+def bench_index(open_battles: int, operations: int, bet_amounts: int):
+    from battles import BattleService, OpenBattle
+
+    rng = random.Random(1)
+    bets = [10 * (i + 1) for i in range(bet_amounts)]
+    battles = [
+        OpenBattle(i, rng.choice(bets), rng.randint(1, open_battles), 0, datetime.utcnow())
+        for i in range(1, open_battles + 1)
+    ]
+    service = BattleService(ledger=None, roll=None)
+    started = time.perf_counter()
+    for battle in battles:
+        service._index(battle)
+    elapsed = time.perf_counter() - started
+    print(f"index                 {open_battles / elapsed:12,.0f} battles/s  ({open_battles:,} open in {len(bets)} buckets)")
+
+    wanted = [(rng.choice(bets), rng.randint(1, open_battles)) for _ in range(operations)]
+    started = time.perf_counter()
+    for bet, user_id in wanted:
+        battle = service._take(bet, exclude=user_id)
+        service._index(battle)  # put it back so the size stays the same
+    indexed_us = (time.perf_counter() - started) / operations * 1e6
+
+    # What a flat list of open battles needs: find the oldest one at the bet, then remove it
+    flat = list(battles)
+    scans = max(1, min(operations, 2_000))
+    started = time.perf_counter()
+    for bet, user_id in wanted[:scans]:
+        for position, battle in enumerate(flat):
+            if battle.bet_amount == bet and battle.creator_id != user_id:
+                flat.append(flat.pop(position))
+                break
+    linear_us = (time.perf_counter() - started) / scans * 1e6
+    print(f"take (bucket index)   {indexed_us:12.2f}µs/match")
+    print(f"take (linear scan)    {linear_us:12.2f}µs/match")
+
+    ids = [rng.randint(1, open_battles) for _ in range(operations)]
+    started = time.perf_counter()
+    for battle_id in ids:
+        service._open.get(battle_id)
+    indexed_us = (time.perf_counter() - started) / operations * 1e6
+    started = time.perf_counter()
+    for battle_id in ids[:scans]:
+        next(battle for battle in flat if battle.id == battle_id)
+    linear_us = (time.perf_counter() - started) / scans * 1e6
+    print(f"join by id (index)    {indexed_us:12.2f}µs/lookup")
+    print(f"join by id (scan)     {linear_us:12.2f}µs/lookup")
+
+
+async def bench_service(matches: int, users: int, concurrency: int, throw_ms: float):
+    from sqlalchemy import insert
+    from database import AsyncSessionLocal, close_async_db, init_async_db
+    from battles import BattleService
+    from ledger import Ledger
+    from models import User
+
+    await init_async_db()
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [{"telegram_id": 1000 + i, "balance": 10 ** 9} for i in range(users)])
+        await db.commit()
+
+    async def throw():
+        await asyncio.sleep(throw_ms / 1000)
+        return random.randint(1, 6), 0
+
+    service = BattleService(Ledger(), throw)
+    await service.start()
+    rng = random.Random(2)
+    queue = [(rng.randint(1, users), rng.choice([10, 25, 50, 100])) for _ in range(matches)]
+
+    async def worker():
+        while queue:
+            user_id, bet = queue.pop()
+            try:
+                await service.match(user_id, 1000 + user_id, bet)
+            except ValueError:
+                pass  # too many open battles for this player
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stats = service.stats()
+    print(f"match (dice + ledger) {matches / elapsed:12,.0f} requests/s  ({stats['completed']:,} battles fought, "
+          f"{stats['created']:,} opened, {stats['open']:,} still open, {concurrency} concurrent)")
+    print(f"throw (both dice)     {stats['last_throw_ms']:12.2f}ms  (one die takes {throw_ms:.0f}ms)")
+    await close_async_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--open", type=int, default=10_000)
+    parser.add_argument("--operations", type=int, default=100_000)
+    parser.add_argument("--bet-amounts", type=int, default=20, help="distinct bet amounts among the open battles")
+    parser.add_argument("--matches", type=int, default=2_000, help="service requests; 0 skips the database benchmark")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--throw-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before anything imports database.py
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/battles.db"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+
+        print("index")
+        bench_index(args.open, args.operations, args.bet_amounts)
+        if args.matches:
+            print("service (SQLite)")
+            asyncio.run(bench_service(args.matches, args.users, args.concurrency, args.throw_ms))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark: live feed fan-out
+in-process: --subscribers local subscriptions reading concurrently while --events events are
+            published; reports the publish (fan-out) cost and publish-to-delivery latency
+live:       --url attaches --subscribers WebSocket (or --sse) clients to a running server and
+            counts the events they receive for --duration seconds (spins drive the feed)
+
+    python bench_feed.py --subscribers 5000 --events 200
+    python bench_feed.py --url ws://localhost:5174/ws/feed --subscribers 2000 --duration 30
+    python bench_feed.py --url http://localhost:5174/api/feed --sse --subscribers 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+
+async def bench_local(subscribers: int, events: int, interval: float, client_buffer: int):
+    import orjson
+    from feed import FeedBroadcaster
+
+    feed = FeedBroadcaster(client_buffer=client_buffer, history=50)
+    latencies: List[float] = []
+    received = [0]
+
+    async def reader(subscription):
+        async for message in subscription:
+            received[0] += 1
+            latencies.append(time.perf_counter() - orjson.loads(message)["t"])
+
+    tasks = [asyncio.create_task(reader(feed.subscribe(replay=False))) for _ in range(subscribers)]
+    await asyncio.sleep(0)
+
+    publish_times = []
+    for _ in range(events):
+        started = time.perf_counter()
+        feed.publish({"t": started})
+        publish_times.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+    await asyncio.sleep(0.1)
+    feed.close()
+    await asyncio.gather(*tasks)
+
+    latencies.sort()
+    stats = feed.stats()
+    print(f"publish (fan-out)     {statistics.mean(publish_times) * 1e6:12.1f}µs/event  ({subscribers:,} subscribers)")
+    print(f"delivery p50 / p99    {latencies[len(latencies) // 2] * 1000:12.2f}ms / "
+          f"{latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms")
+    print(f"delivered             {received[0]:12,}  of {subscribers * events:,} (dropped subscribers: {stats['dropped']})")
+
+
+async def bench_live(url: str, subscribers: int, duration: float, sse: bool):
+    received = [0]
+    connected = [0]
+    failed = [0]
+
+    async def ws_client():
+        import websockets
+        try:
+            async with websockets.connect(url, max_queue=None) as websocket:
+                connected[0] += 1
+                async for _ in websocket:
+                    received[0] += 1
+        except Exception:
+            failed[0] += 1
+
+    async def sse_client(client):
+        try:
+            async with client.stream("GET", url) as response:
+                connected[0] += 1
+                async for line in response.aiter_lines():
+                    if line.startswith("data: "):
+                        received[0] += 1
+        except Exception:
+            failed[0] += 1
+
+    if sse:
+        import httpx
+        limits = httpx.Limits(max_connections=subscribers)
+        async with httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(None)) as client:
+            tasks = [asyncio.create_task(sse_client(client)) for _ in range(subscribers)]
+            await _report(tasks, duration, received, connected, failed)
+    else:
+        tasks = [asyncio.create_task(ws_client()) for _ in range(subscribers)]
+        await _report(tasks, duration, received, connected, failed)
+
+
+async def _report(tasks, duration: float, received, connected, failed):
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        await asyncio.sleep(1)
+        print(f"  {time.perf_counter() - started:5.0f}s  connected {connected[0]:,}  events received {received[0]:,}  failed {failed[0]}")
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=5_000)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between local events")
+    parser.add_argument("--client-buffer", type=int, default=100)
+    parser.add_argument("--url", help="ws://.../ws/feed or http://.../api/feed of a running server")
+    parser.add_argument("--sse", action="store_true", help="connect to --url with server-sent events")
+    parser.add_argument("--duration", type=float, default=10)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(bench_live(args.url, args.subscribers, args.duration, args.sse))
+    else:
+        asyncio.run(bench_local(args.subscribers, args.events, args.interval, args.client_buffer))
+
+
+if __name__ == "__main__":
+    main()
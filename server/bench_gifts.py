@@ -0,0 +1,69 @@
+"""
+Benchmark: prize gift assignment from the in-memory price index
+Takes a gift in a random prize range from --gifts gifts in stock, against the linear scan the
+Node server's assignGift does over gifts.json (first available gift in the range)
+
+    python bench_gifts.py --gifts 100000
+"""
+
+import argparse
+import random
+import time
+
+from gift_inventory import DEFAULT_PRIZE_RANGES, RARITIES, GiftInventory, parse_prize_ranges
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gifts", type=int, default=100_000)
+    parser.add_argument("--takes", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    ranges = list(parse_prize_ranges(DEFAULT_PRIZE_RANGES).values())
+    stock = [(gift_id, rng.randint(100, 2000), rng.choice(RARITIES)) for gift_id in range(1, args.gifts + 1)]
+
+    inventory = GiftInventory(prize_ranges={})
+    started = time.perf_counter()
+    for gift_id, price, rarity in stock:
+        inventory._index(gift_id, price, rarity)
+    elapsed = time.perf_counter() - started
+    print(f"index                 {args.gifts / elapsed:12,.0f} gifts/s  ({args.gifts:,} in stock)")
+
+    prizes = [rng.choice(ranges) for _ in range(args.takes)]
+    started = time.perf_counter()
+    for prize in prizes:
+        taken = inventory._take(prize)
+        if taken is not None:
+            inventory._index(*taken)  # back in stock so every take sees the same size
+    indexed_us = (time.perf_counter() - started) / args.takes * 1e6
+
+    gifts = [{"id": gift_id, "price": price, "status": "available"} for gift_id, price, _ in stock]
+    rng.shuffle(gifts)
+    scans = min(args.takes, 2_000)
+    started = time.perf_counter()
+    for prize in prizes[:scans]:
+        next((g for g in gifts if g["status"] == "available" and prize.low <= g["price"] <= prize.high), None)
+    linear_us = (time.perf_counter() - started) / scans * 1e6
+    print(f"take (price index)    {indexed_us:12.2f}µs/prize")
+    print(f"take (linear scan)    {linear_us:12.2f}µs/prize  (stops at the first match)")
+
+    # Once a range is sold out a scan has to look at every gift before giving up
+    empty = [gift for gift in gifts if not 900 <= gift["price"] <= 1000]
+    prize = ranges[0]
+    started = time.perf_counter()
+    for _ in range(10):
+        next((g for g in empty if g["status"] == "available" and prize.low <= g["price"] <= prize.high), None)
+    print(f"sold-out range (scan) {(time.perf_counter() - started) / 10 * 1e6:12.2f}µs/prize")
+    for gift in gifts:
+        if prize.low <= gift["price"] <= prize.high:
+            for index in inventory._indexes.values():
+                index.remove(gift["id"])
+    started = time.perf_counter()
+    for _ in range(args.takes):
+        inventory._take(prize)
+    print(f"sold-out range (index){(time.perf_counter() - started) / args.takes * 1e6:12.2f}µs/prize")
+
+
+if __name__ == "__main__":
+    main()
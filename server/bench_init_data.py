@@ -0,0 +1,77 @@
+"""
+Benchmark: initData verification per request vs InitDataVerifier (precomputed key + cache)
+Signs a realistic Mini App init data string and times each mode in a tight loop
+
+    python bench_init_data.py --iterations 100000
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+from urllib.parse import parse_qs, urlencode
+
+from init_data import InitDataVerifier, webapp_secret_key
+
+TOKEN = "123456:BENCH"
+
+
+def make_init_data(bot_token: str, user_id: int = 123456789) -> str:
+    fields = {
+        "query_id": "AAHdF6IQAAAAAN0XohDhrOrc",
+        "user": json.dumps({
+            "id": user_id,
+            "first_name": "Bench",
+            "last_name": "User",
+            "username": "bench_user",
+            "language_code": "en",
+            "photo_url": "https://t.me/i/userpic/320/bench.jpg",
+        }, separators=(",", ":")),
+        "auth_date": str(int(time.time())),
+    }
+    data_check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    fields["hash"] = hmac.new(webapp_secret_key(bot_token), data_check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+
+def verify_per_request(init_data: str) -> Optional[Dict[str, Any]]:
+    """The previous main.verify_telegram_init_data + user JSON parsing"""
+    parsed = parse_qs(init_data)
+    hash_value = parsed.get('hash', [None])[0]
+    data_check_string = '\n'.join(sorted(f"{k}={v[0]}" for k, v in parsed.items() if k != 'hash'))
+    secret_key = hmac.new("WebAppData".encode(), TOKEN.encode(), hashlib.sha256).digest()
+    computed_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if computed_hash != hash_value:
+        return None
+    result: Dict[str, Any] = dict(parsed)
+    result['user'] = json.loads(parsed['user'][0])
+    return result
+
+
+def _time(name: str, fn: Callable[[str], Any], init_data: str, iterations: int):
+    assert fn(init_data) is not None, f"{name} rejected the test init data"
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(init_data)
+    elapsed = time.perf_counter() - started
+    print(f"{name:<28} {elapsed / iterations * 1e6:8.2f}µs/call  {iterations / elapsed:12,.0f} calls/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    init_data = make_init_data(TOKEN)
+    uncached = InitDataVerifier(TOKEN, cache_size=0)
+    cached = InitDataVerifier(TOKEN)
+
+    _time("per request (old)", verify_per_request, init_data, args.iterations)
+    _time("precomputed key, no cache", uncached.verify, init_data, args.iterations)
+    _time("precomputed key + cache", cached.verify, init_data, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: jackpot ticket pool and round engine
+pool:    Fenwick tree ingest and draw at --players players, against a linear cumulative scan
+service: concurrent JackpotService.enter() against a temporary SQLite database, then the close
+
+    python bench_jackpot.py --players 100000
+    python bench_jackpot.py --entries 5000 --users 1000 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import tempfile
+import time
+from typing import List
+
+
+def linear_find(weights: List[int], ticket: int) -> int:
+    """Owner of ticket by walking the cumulative sums (what a plain list would need)"""
+    for slot, weight in enumerate(weights):
+        if ticket < weight:
+            return slot
+        ticket -= weight
+    raise IndexError(ticket)
+
+
+def bench_pool(players: int, draws: int):
+    from jackpot import FenwickTree
+
+    rng = random.Random(1)
+    weights = [rng.randint(1, 500) for _ in range(players)]
+
+    tree = FenwickTree()
+    started = time.perf_counter()
+    for weight in weights:
+        tree.append(weight)
+    elapsed = time.perf_counter() - started
+    print(f"ingest (new players)    {players / elapsed:12,.0f} entries/s  ({elapsed * 1000:.1f}ms for {players:,})")
+
+    slots = [rng.randrange(players) for _ in range(players)]
+    started = time.perf_counter()
+    for slot in slots:
+        tree.add(slot, 10)
+        weights[slot] += 10
+    elapsed = time.perf_counter() - started
+    print(f"ingest (repeat players) {players / elapsed:12,.0f} entries/s")
+
+    tickets = [secrets.randbelow(tree.total) for _ in range(draws)]
+    started = time.perf_counter()
+    for ticket in tickets:
+        tree.find(ticket)
+    fenwick_us = (time.perf_counter() - started) / draws * 1e6
+
+    linear_draws = max(1, min(draws, 200))
+    started = time.perf_counter()
+    for ticket in tickets[:linear_draws]:
+        assert linear_find(weights, ticket) == tree.find(ticket)
+    linear_us = (time.perf_counter() - started) / linear_draws * 1e6
+    print(f"draw (Fenwick)          {fenwick_us:12.2f}µs/draw  ({tree.total:,} tickets)")
+    print(f"draw (linear scan)      {linear_us:12.2f}µs/draw")
+
+
+async def bench_service(entries: int, users: int, concurrency: int):
+    from sqlalchemy import insert
+    from database import AsyncSessionLocal, close_async_db, init_async_db
+    from jackpot import JackpotService
+    from ledger import Ledger
+    from models import User
+
+    await init_async_db()
+    async with AsyncSessionLocal() as db:
+        await db.execute(insert(User), [{"telegram_id": 1000 + i, "balance": 10 ** 9} for i in range(users)])
+        await db.commit()
+
+    service = JackpotService(Ledger(), round_seconds=3600)
+    await service.start()
+    rng = random.Random(2)
+    queue = [(rng.randint(1, users), rng.randint(1, 100)) for _ in range(entries)]
+
+    async def worker():
+        while queue:
+            user_id, amount = queue.pop()
+            await service.enter(user_id, amount)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    print(f"enter (ledger + row)    {entries / elapsed:12,.0f} entries/s  ({entries:,} entries, {concurrency} concurrent)")
+
+    result = await service.close_round()
+    stats = service.stats()
+    print(f"close round             {stats['last_close_ms']:12.2f}ms  (draw {stats['last_draw_us']:.2f}µs, "
+          f"{result['players']:,} players, {result['tickets']:,} tickets)")
+    await service.stop()
+    await close_async_db()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--players", type=int, default=100_000)
+    parser.add_argument("--draws", type=int, default=10_000)
+    parser.add_argument("--entries", type=int, default=2_000, help="service entries; 0 skips the database benchmark")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before anything imports database.py
+        os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/jackpot.db"
+        os.environ.pop("ASYNC_DATABASE_URL", None)
+
+        print("pool")
+        bench_pool(args.players, args.draws)
+        if args.entries:
+            print("service (SQLite)")
+            asyncio.run(bench_service(args.entries, args.users, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
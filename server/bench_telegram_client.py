@@ -0,0 +1,111 @@
+"""
+Benchmark: fresh httpx.AsyncClient per call vs the shared pooled TelegramClient
+Starts fake_telegram.py locally and reports per-call latency for both modes
+
+    python bench_telegram_client.py --calls 500 --concurrency 20
+    python bench_telegram_client.py --certfile cert.pem --keyfile key.pem   # include TLS handshakes
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+import httpx
+
+from telegram_client import TelegramClient
+
+BASE_DIR = Path(__file__).parent
+TOKEN = "123456:BENCH"
+
+
+def _report(name: str, samples: List[float], wall: float):
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    print(
+        f"{name:<28} calls={len(samples):<6} mean={statistics.mean(samples) * 1000:7.2f}ms "
+        f"p50={p(0.50):7.2f}ms p95={p(0.95):7.2f}ms p99={p(0.99):7.2f}ms "
+        f"throughput={len(samples) / wall:8.1f}/s"
+    )
+
+
+async def _run(call: Callable[[], Awaitable[None]], calls: int, concurrency: int):
+    samples: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            await call()
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(calls)))
+    return samples, time.perf_counter() - start
+
+
+async def bench(api_url: str, calls: int, concurrency: int, verify: bool):
+    payload = {"chat_id": "@bench", "emoji": "🎰"}
+
+    async def fresh_client_call():
+        # Previous behaviour: new client (and TCP/TLS handshake) per call
+        async with httpx.AsyncClient(verify=verify) as client:
+            response = await client.post(f"{api_url}/bot{TOKEN}/sendDice", json=payload, timeout=30.0)
+            response.json()
+
+    client = TelegramClient(token=TOKEN, api_url=api_url, verify=verify)
+
+    async def pooled_call():
+        await client.call("sendDice", payload)
+
+    try:
+        # Warm up the stub itself so neither mode pays for its first request
+        await pooled_call()
+        for name, call in (("fresh client per call", fresh_client_call), ("shared pooled client", pooled_call)):
+            samples, wall = await _run(call, calls, concurrency)
+            _report(name, samples, wall)
+    finally:
+        await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--certfile", help="Serve the stub over TLS with this certificate")
+    parser.add_argument("--keyfile", help="Private key for --certfile")
+    args = parser.parse_args()
+
+    tls = bool(args.certfile and args.keyfile)
+    scheme = "https" if tls else "http"
+    command = [
+        sys.executable, "-m", "uvicorn", "fake_telegram:app",
+        "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning",
+    ]
+    if tls:
+        command += ["--ssl-certfile", args.certfile, "--ssl-keyfile", args.keyfile]
+
+    stub = subprocess.Popen(command, cwd=BASE_DIR, env=os.environ.copy())
+    try:
+        api_url = f"{scheme}://127.0.0.1:{args.port}"
+        for _ in range(100):
+            try:
+                httpx.post(f"{api_url}/bot{TOKEN}/getMe", verify=False)
+                break
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        print(f"Stub Bot API at {api_url} (calls={args.calls}, concurrency={args.concurrency})")
+        asyncio.run(bench(api_url, args.calls, args.concurrency, verify=not tls))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: webhook update decoding, previous dict probing vs pydantic vs msgspec structs
+Times a successful_payment update, a pre_checkout_query and an unrelated message update
+
+    python bench_webhook_decode.py --iterations 100000
+"""
+
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+from telegram_updates import decode_update, parse_invoice_payload
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class PydanticPayment(BaseModel):
+    total_amount: int
+    telegram_payment_charge_id: str
+    invoice_payload: str = ""
+
+
+class PydanticMessage(BaseModel):
+    message_id: int
+    from_user: Optional[Dict[str, Any]] = Field(default=None, alias="from")
+    chat: Dict[str, Any]
+    successful_payment: Optional[PydanticPayment] = None
+
+
+class PydanticPreCheckout(BaseModel):
+    id: str
+
+
+class PydanticUpdate(BaseModel):
+    update_id: int
+    message: Optional[PydanticMessage] = None
+    pre_checkout_query: Optional[PydanticPreCheckout] = None
+
+
+PAYMENT = {
+    "update_id": 100000001,
+    "message": {
+        "message_id": 4242,
+        "from": {"id": 123456789, "is_bot": False, "first_name": "Bench", "username": "bench_user", "language_code": "en"},
+        "chat": {"id": 123456789, "first_name": "Bench", "username": "bench_user", "type": "private"},
+        "date": 1760000000,
+        "successful_payment": {
+            "currency": "XTR",
+            "total_amount": 10,
+            "invoice_payload": json.dumps({"userId": 123456789, "betAmount": 10}),
+            "telegram_payment_charge_id": "stxAbCdEfGhIjKlMnOpQrStUvWxYz0123456789",
+            "provider_payment_charge_id": "",
+        },
+    },
+}
+PRE_CHECKOUT = {
+    "update_id": 100000000,
+    "pre_checkout_query": {
+        "id": "1234567890123456789",
+        "from": {"id": 123456789, "is_bot": False, "first_name": "Bench", "language_code": "en"},
+        "currency": "XTR",
+        "total_amount": 10,
+        "invoice_payload": json.dumps({"userId": 123456789, "betAmount": 10}),
+    },
+}
+OTHER = {
+    "update_id": 100000002,
+    "message": {
+        "message_id": 4243,
+        "from": {"id": 123456789, "is_bot": False, "first_name": "Bench", "language_code": "en"},
+        "chat": {"id": -1001234567890, "title": "Slots", "type": "supergroup"},
+        "date": 1760000001,
+        "text": "gl everyone, spinning again " * 4,
+        "entities": [{"offset": 0, "length": 2, "type": "bold"}],
+    },
+}
+
+
+def decode_dicts(body: bytes) -> Any:
+    """The previous webhook path: request.json() then key probing and payload parsing"""
+    update = json.loads(body)
+    if "pre_checkout_query" in update:
+        update["pre_checkout_query"]["id"]
+    if "message" in update and "successful_payment" in update["message"]:
+        payment = update["message"]["successful_payment"]
+        payment.get("telegram_payment_charge_id")
+        payload = payment.get("invoice_payload", "")
+        if payload.strip().startswith('{'):
+            json.loads(payload)
+    return update
+
+
+def decode_pydantic(body: bytes) -> Any:
+    """The same Update subset as pydantic models, for comparison"""
+    update = PydanticUpdate.model_validate(orjson.loads(body) if orjson else json.loads(body))
+    if update.message and update.message.successful_payment:
+        json.loads(update.message.successful_payment.invoice_payload)
+    return update
+
+
+def decode_typed(body: bytes) -> Any:
+    """The current webhook path (plus the payload parse done by the worker)"""
+    update = decode_update(body)
+    if update is not None and update.message and update.message.successful_payment:
+        parse_invoice_payload(update.message.successful_payment.invoice_payload)
+    return update
+
+
+def _time(name: str, fn: Callable[[bytes], Any], body: bytes, iterations: int):
+    fn(body)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        fn(body)
+    elapsed = time.perf_counter() - started
+    print(f"  {name:<28} {elapsed / iterations * 1e6:8.2f}µs/update  {iterations / elapsed:12,.0f} updates/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    for label, update in (("successful_payment", PAYMENT), ("pre_checkout_query", PRE_CHECKOUT), ("unhandled message", OTHER)):
+        body = json.dumps(update).encode()
+        print(f"{label} ({len(body)} bytes)")
+        _time("json.loads + dict probing", decode_dicts, body, args.iterations)
+        _time("pydantic models", decode_pydantic, body, args.iterations)
+        _time("decode_update (msgspec)", decode_typed, body, args.iterations)
+
+
+if __name__ == "__main__":
+    main()
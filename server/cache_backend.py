@@ -0,0 +1,210 @@
+"""
+Pluggable cache backends for hot lookups (balances, first history pages)
+CACHE_BACKEND=memory keeps an LRU/TTL cache per process; CACHE_BACKEND=redis shares one
+cache between processes and nodes through any Redis-protocol server (Redis, Valkey, KeyDB).
+Misses are single-flight: concurrent loads of one key in a process share one loader call.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+import asyncio
+import json
+import logging
+import math
+import os
+
+from cache import TTLCache
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional: pip install redis
+    redis_asyncio = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+CACHE_KEY_PREFIX = os.getenv("CACHE_KEY_PREFIX", "phs")
+
+
+class SingleFlight:
+    """Runs one call per key at a time; callers arriving meanwhile await its result"""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            future = self._calls.get(key)
+            if future is None:
+                break
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise  # we were cancelled, not the leader
+                # The leader was cancelled: retry, possibly as the new leader
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved: waiters are optional
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+class CacheBackend:
+    """
+    Async key/value cache; values must be JSON-serializable for shared backends
+    None is never cached, so a loader returning None is retried on the next call
+    """
+
+    name = "base"
+    shared = False  # True when every process sees the same entries
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._flight = SingleFlight()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get(self, key: Hashable) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete(self, key: Hashable):
+        raise NotImplementedError
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Any:
+        """Cached value, or loader() stored under key; one loader call per key at a time"""
+        value = await self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        async def load():
+            value = await loader()
+            if value is not None:
+                await self.set(key, value, ttl)
+            return value
+
+        return await self._flight.do(key, load)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self._flight.coalesced,
+            "errors": self.errors,
+        }
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU with optional expiry"""
+
+    name = "memory"
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, maxsize: int = 10000):
+        super().__init__(namespace, ttl)
+        self._cache = TTLCache(maxsize, ttl or math.inf)
+
+    async def get(self, key: Hashable) -> Any:
+        return self._cache.get(key)
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._cache.set(key, value, ttl)
+
+    async def delete(self, key: Hashable):
+        self._cache.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "size": len(self._cache)}
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Shared cache on a Redis-protocol server; keys are "<prefix>:<namespace>:<key>"
+    Server errors are logged and treated as misses so the database stays the fallback
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, client: Any, namespace: str, ttl: Optional[float] = None, prefix: str = CACHE_KEY_PREFIX):
+        super().__init__(namespace, ttl)
+        self.client = client
+        self.prefix = f"{prefix}:{namespace}:"
+
+    async def get(self, key: Hashable) -> Any:
+        try:
+            raw = await self.client.get(self.prefix + str(key))
+        except Exception as e:
+            self._error("get", e)
+            return None
+        return None if raw is None else json.loads(raw)
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        try:
+            await self.client.set(
+                self.prefix + str(key),
+                json.dumps(value, separators=(",", ":")),
+                px=int(ttl * 1000) if ttl else None,
+            )
+        except Exception as e:
+            self._error("set", e)
+
+    async def delete(self, key: Hashable):
+        try:
+            await self.client.delete(self.prefix + str(key))
+        except Exception as e:
+            self._error("delete", e)
+
+    def _error(self, op: str, error: Exception):
+        self.errors += 1
+        logger.warning(f"Cache {op} on {self.namespace} failed: {error}")
+
+
+_redis_client = None
+
+
+def create_cache_backend(namespace: str, ttl: Optional[float] = None, maxsize: int = 10000, backend: str = CACHE_BACKEND) -> CacheBackend:
+    """Backend selected by CACHE_BACKEND; redis backends share one connection pool"""
+    global _redis_client
+    if backend == "memory":
+        return MemoryCacheBackend(namespace, ttl, maxsize)
+    if backend == "redis":
+        if redis_asyncio is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package (pip install redis)")
+        if _redis_client is None:
+            _redis_client = redis_asyncio.from_url(CACHE_REDIS_URL)
+        return RedisCacheBackend(_redis_client, namespace, ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+async def close_cache_backends():
+    """Close the shared Redis connection pool (FastAPI shutdown)"""
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.aclose()
+        _redis_client = None
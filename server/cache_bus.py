@@ -0,0 +1,150 @@
+"""
+Cross-process cache invalidation over the database
+Workers append (topic, key) rows to cache_events and poll for rows from other workers,
+so per-process caches (balances, sessions, dice mapping) stay coherent under --workers N
+without extra infrastructure. Disabled (no-op) in single-process mode.
+"""
+
+from sqlalchemy import delete, func, insert, select
+from datetime import datetime, timedelta
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import inspect
+import logging
+import os
+import uuid
+
+from database import AsyncSessionLocal
+from models import CacheEvent
+
+logger = logging.getLogger(__name__)
+
+CACHE_BUS_ENABLED = os.getenv("CACHE_BUS_ENABLED", "0") not in ("0", "false", "False")
+CACHE_BUS_INTERVAL = float(os.getenv("CACHE_BUS_INTERVAL", "0.5"))
+CACHE_BUS_RETENTION = float(os.getenv("CACHE_BUS_RETENTION", "300"))
+
+# Ids are re-scanned this far back: on PostgreSQL a lower id can commit after a higher one
+POLL_OVERLAP = 100
+
+
+class CacheBus:
+    """
+    publish() only queues the event; one task per process flushes queued events and
+    polls for new ones every interval, so invalidation lags by at most ~2 intervals
+    """
+
+    def __init__(self, enabled: bool = CACHE_BUS_ENABLED, interval: float = CACHE_BUS_INTERVAL, retention: float = CACHE_BUS_RETENTION):
+        self.enabled = enabled
+        self.interval = interval
+        self.retention = retention
+        self.origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._subscribers: Dict[str, List[Callable[[str], Any]]] = defaultdict(list)
+        self._pending: List[Tuple[str, str]] = []
+        self._last_id = 0
+        self._seen: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.published = 0
+        self.received = 0
+
+    def subscribe(self, topic: str, callback: Callable[[str], Any]):
+        """callback(key) (sync or async) runs for events on topic published by other processes"""
+        self._subscribers[topic].append(callback)
+
+    def publish(self, topic: str, key: Any = ""):
+        if self.enabled:
+            self._pending.append((topic, str(key)))
+
+    async def start(self):
+        """Skip events from before this process started, then start polling (FastAPI startup)"""
+        if not self.enabled or self._task is not None:
+            return
+        async with AsyncSessionLocal() as db:
+            self._last_id = (await db.execute(select(func.max(CacheEvent.id)))).scalar() or 0
+            self._seen = set((await db.execute(
+                select(CacheEvent.id).where(CacheEvent.id > self._last_id - POLL_OVERLAP)
+            )).scalars())
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Cache bus started ({self.origin}, every {self.interval}s)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "origin": self.origin,
+            "pending": len(self._pending),
+            "published": self.published,
+            "received": self.received,
+        }
+
+    async def _flush(self):
+        if not self._pending:
+            return
+        events, self._pending = self._pending, []
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(CacheEvent), [
+                    {"topic": topic, "key": key, "origin": self.origin} for topic, key in events
+                ])
+                await db.commit()
+        except Exception:
+            self._pending[:0] = events
+            raise
+        self.published += len(events)
+
+    async def _poll(self):
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(CacheEvent.id, CacheEvent.topic, CacheEvent.key, CacheEvent.origin)
+                .where(CacheEvent.id > self._last_id - POLL_OVERLAP)
+                .order_by(CacheEvent.id)
+            )).all()
+        for event_id, topic, key, origin in rows:
+            if event_id in self._seen:
+                continue
+            self._seen.add(event_id)
+            self._last_id = max(self._last_id, event_id)
+            if origin == self.origin:
+                continue
+            self.received += 1
+            for callback in self._subscribers.get(topic, ()):
+                try:
+                    result = callback(key)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"Cache bus handler for {topic} failed: {e}")
+        floor = self._last_id - POLL_OVERLAP
+        self._seen = {event_id for event_id in self._seen if event_id > floor}
+
+    async def _cleanup(self):
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(CacheEvent).where(CacheEvent.created_at < cutoff))
+            await db.commit()
+
+    async def _run(self):
+        ticks = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self._flush()
+                await self._poll()
+                ticks += 1
+                if ticks * self.interval >= 60:
+                    ticks = 0
+                    await self._cleanup()
+            except Exception as e:
+                logger.error(f"Cache bus poll failed: {e}")
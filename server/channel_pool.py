@@ -0,0 +1,107 @@
+"""
+Pool of dice channels with least-loaded / round-robin selection and health tracking
+Each channel has its own Telegram rate limit, so spin throughput scales with the pool
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_FAILURE_THRESHOLD = int(os.getenv("CHANNEL_FAILURE_THRESHOLD", "3"))
+CHANNEL_COOLDOWN = float(os.getenv("CHANNEL_COOLDOWN", "30"))
+
+
+def parse_channel_list(value: str) -> List[str]:
+    """Comma/whitespace separated chat ids -> list without duplicates"""
+    channels: List[str] = []
+    for item in value.replace(",", " ").split():
+        if item not in channels:
+            channels.append(item)
+    return channels
+
+
+class _ChannelState:
+    __slots__ = ("in_flight", "failures", "unhealthy_until", "sent", "errors")
+
+    def __init__(self):
+        self.in_flight = 0
+        self.failures = 0
+        self.unhealthy_until = 0.0
+        self.sent = 0
+        self.errors = 0
+
+
+class ChannelPool:
+    """
+    select() picks the healthy channel with the fewest in-flight sends,
+    breaking ties round-robin; channels failing repeatedly sit out a cooldown
+    """
+
+    def __init__(
+        self,
+        channels: Iterable[str],
+        failure_threshold: int = CHANNEL_FAILURE_THRESHOLD,
+        cooldown: float = CHANNEL_COOLDOWN,
+    ):
+        self.channels = list(channels)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state: Dict[str, _ChannelState] = {c: _ChannelState() for c in self.channels}
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.channels)
+
+    def is_healthy(self, channel: str, now: Optional[float] = None) -> bool:
+        return self._state[channel].unhealthy_until <= (now or time.monotonic())
+
+    def select(self, exclude: Iterable[str] = ()) -> Optional[str]:
+        """Least-loaded healthy channel; if none is healthy, the one recovering first"""
+        now = time.monotonic()
+        count = len(self.channels)
+        candidates = [
+            self.channels[(self._next + i) % count]
+            for i in range(count)
+            if self.channels[(self._next + i) % count] not in exclude
+        ]
+        if not candidates:
+            return None
+        self._next = (self._next + 1) % count
+
+        healthy = [c for c in candidates if self.is_healthy(c, now)]
+        if healthy:
+            # min() keeps the first of equals, so ties rotate with self._next
+            return min(healthy, key=lambda c: self._state[c].in_flight)
+        return min(candidates, key=lambda c: self._state[c].unhealthy_until)
+
+    def started(self, channel: str):
+        self._state[channel].in_flight += 1
+
+    def finished(self, channel: str, ok: bool):
+        state = self._state[channel]
+        state.in_flight -= 1
+        if ok:
+            state.sent += 1
+            state.failures = 0
+            return
+        state.errors += 1
+        state.failures += 1
+        if state.failures >= self.failure_threshold:
+            state.unhealthy_until = time.monotonic() + self.cooldown
+            state.failures = 0
+            logger.warning(f"Dice channel {channel} marked unhealthy for {self.cooldown}s")
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            channel: {
+                "healthy": self.is_healthy(channel, now),
+                "in_flight": state.in_flight,
+                "sent": state.sent,
+                "errors": state.errors,
+            }
+            for channel, state in self._state.items()
+        }
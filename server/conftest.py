@@ -0,0 +1,53 @@
+"""
+Shared pytest setup: the database-backed tests run against a temporary SQLite file
+(TEST_DATABASE_URL overrides it, e.g. a throwaway PostgreSQL database)
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+_TEST_DIR = tempfile.mkdtemp(prefix="phs-test-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_TEST_DIR}/test.db")
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+
+@pytest.fixture
+def run_db():
+    """
+    run_db(main) runs the coroutine function main on a fresh schema; pooled connections are
+    disposed on the same event loop, since every test starts its own with asyncio.run
+    """
+    from database import async_engine
+    from models import Base
+
+    def run(main):
+        async def wrapper():
+            async with async_engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                return await main()
+            finally:
+                await async_engine.dispose()
+
+        return asyncio.run(wrapper())
+
+    return run
+
+
+async def create_user(telegram_id: int, balance: int = 0) -> int:
+    """Insert a users row; returns its users.id (import it: from conftest import create_user)"""
+    from sqlalchemy import insert
+
+    from database import AsyncSessionLocal
+    from models import User
+
+    async with AsyncSessionLocal() as db:
+        user_id = (await db.execute(
+            insert(User).values(telegram_id=telegram_id, balance=balance).returning(User.id)
+        )).scalar_one()
+        await db.commit()
+    return user_id
@@ -0,0 +1,174 @@
+"""
+Precomputed dice outcome table
+mapping.json is compiled once into an immutable 64-entry tuple indexed by dice value,
+so a spin is a single lookup; the table can be swapped at runtime without a restart
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import json
+import logging
+
+from paytable import PayTable, load_paytable
+
+logger = logging.getLogger(__name__)
+
+DICE_VALUES = 64
+JACKPOT_VALUE = 64
+
+EMOJI = {
+    "777": "7️⃣",
+    "lemon": "🍋",
+    "grape": "🍇",
+    "bar": "🎰",
+}
+
+# Order Telegram encodes the 🎰 reels in: value - 1 = first + 4 * second + 16 * third
+TELEGRAM_REEL_ORDER = ("bar", "grape", "lemon", "777")
+
+RULE = "━━━━━━━━━━━━━━"
+
+
+class DiceOutcome(NamedTuple):
+    value: int
+    symbols: Tuple[str, str, str]
+    is_win: bool
+    is_jackpot: bool
+    symbol_type: Optional[str]  # the symbol of a three-of-a-kind, else None
+    emoji: str                  # "🍋 🍋 🍋"
+    status: str                 # "✅ WIN"
+    multiplier: float           # x bet, from the pay-table
+    text_tail: str              # result message from the value line down
+
+
+def _normalize(symbol: str) -> str:
+    symbol = symbol.lower()
+    return "777" if symbol == "seven" else symbol
+
+
+def build_outcome(value: int, symbols: Tuple[str, str, str], paytable: PayTable) -> DiceOutcome:
+    """Precompute everything a spin needs for one dice value"""
+    is_win = len(set(symbols)) == 1
+    is_jackpot = value == JACKPOT_VALUE
+    symbol_type = symbols[0] if is_win else None
+    emoji = " ".join(EMOJI[s] for s in symbols)
+    status = "🎰💰 JACKPOT! 💰🎰" if is_jackpot else ("✅ WIN" if is_win else "❌ Lose")
+    return DiceOutcome(
+        value=value,
+        symbols=symbols,
+        is_win=is_win,
+        is_jackpot=is_jackpot,
+        symbol_type=symbol_type,
+        emoji=emoji,
+        status=status,
+        multiplier=paytable.multiplier(symbols),
+        text_tail=(
+            f"🎲 Value: {value}/{DICE_VALUES}\n"
+            f"🎯 Result: {emoji}\n"
+            f"{RULE}\n"
+            f"{status}\n"
+            f"{RULE}"
+        ),
+    )
+
+
+class DiceTable:
+    """Immutable table of 64 outcomes; outcomes[value - 1]"""
+
+    def __init__(self, outcomes: Tuple[DiceOutcome, ...], source: str):
+        self.outcomes = outcomes
+        self.source = source
+
+    def lookup(self, value: int) -> DiceOutcome:
+        if not 1 <= value <= DICE_VALUES:
+            raise ValueError(f"Dice value out of range: {value}")
+        return self.outcomes[value - 1]
+
+    @classmethod
+    def from_entries(cls, entries: List[Dict[str, Any]], source: str, paytable: PayTable) -> "DiceTable":
+        """Validate mapping.json entries: exactly values 1..64, known symbols only"""
+        if not isinstance(entries, list):
+            raise ValueError("Mapping must be a JSON array")
+
+        symbols_by_value: Dict[int, Tuple[str, str, str]] = {}
+        for entry in entries:
+            value = entry["value"]
+            if not isinstance(value, int) or not 1 <= value <= DICE_VALUES:
+                raise ValueError(f"Invalid dice value: {value!r}")
+            if value in symbols_by_value:
+                raise ValueError(f"Duplicate dice value: {value}")
+            symbols = tuple(_normalize(entry[reel]) for reel in ("first", "second", "third"))
+            unknown = [s for s in symbols if s not in EMOJI]
+            if unknown:
+                raise ValueError(f"Unknown symbols for value {value}: {unknown}")
+            symbols_by_value[value] = symbols
+
+        if len(symbols_by_value) != DICE_VALUES:
+            missing = sorted(set(range(1, DICE_VALUES + 1)) - set(symbols_by_value))
+            raise ValueError(f"Mapping must contain {DICE_VALUES} values, missing {missing}")
+
+        return cls(
+            tuple(build_outcome(v, symbols_by_value[v], paytable) for v in range(1, DICE_VALUES + 1)),
+            source,
+        )
+
+    @classmethod
+    def from_file(cls, path: Path, paytable: PayTable) -> "DiceTable":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_entries(json.load(f), str(path), paytable)
+
+    @classmethod
+    def builtin(cls, paytable: PayTable) -> "DiceTable":
+        """Telegram's own reel encoding, used when mapping.json is missing or invalid"""
+        order = TELEGRAM_REEL_ORDER
+        return cls(
+            tuple(
+                build_outcome(
+                    v,
+                    (order[(v - 1) % 4], order[(v - 1) // 4 % 4], order[(v - 1) // 16]),
+                    paytable,
+                )
+                for v in range(1, DICE_VALUES + 1)
+            ),
+            "builtin",
+        )
+
+
+class DiceMapping:
+    """Holds the current DiceTable; reload() swaps it in one assignment"""
+
+    def __init__(self, path: Path, paytable_path: Optional[Path] = None):
+        self.path = path
+        self.paytable_path = paytable_path
+        self.reloads = 0
+        try:
+            self.paytable = load_paytable(paytable_path)
+        except Exception as e:
+            logger.error(f"Failed to load pay-table: {e}, using default rules")
+            self.paytable = PayTable()
+        try:
+            self.table = DiceTable.from_file(path, self.paytable)
+            logger.info(f"Dice mapping loaded: {DICE_VALUES} values from {path}")
+        except FileNotFoundError:
+            logger.warning(f"Mapping file not found: {path}, using Telegram's reel order")
+            self.table = DiceTable.builtin(self.paytable)
+        except Exception as e:
+            logger.error(f"Failed to load mapping: {e}, using Telegram's reel order")
+            self.table = DiceTable.builtin(self.paytable)
+
+    def lookup(self, value: int) -> DiceOutcome:
+        return self.table.lookup(value)
+
+    def reload(self, *_) -> bool:
+        """Re-read the mapping and pay-table files; an invalid file keeps the current table"""
+        try:
+            paytable = load_paytable(self.paytable_path)
+            table = DiceTable.from_file(self.path, paytable)
+        except Exception as e:
+            logger.error(f"Dice mapping reload failed, keeping {self.table.source}: {e}")
+            return False
+        self.paytable = paytable
+        self.table = table
+        self.reloads += 1
+        logger.info(f"Dice mapping reloaded from {self.path}")
+        return True
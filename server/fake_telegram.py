@@ -0,0 +1,115 @@
+"""
+Local stub of the Telegram Bot API for benchmarks, load tests and offline testing
+Point the backend at it with TELEGRAM_API_URL=http://localhost:8081
+
+Behaviour is configured from the environment, or at runtime with
+POST /_fake/config {"latency_ms": 50, "rate_limit_ratio": 0.05, ...}:
+
+    FAKE_TELEGRAM_LATENCY_MS      added delay per call (default: 0)
+    FAKE_TELEGRAM_JITTER_MS       uniform +/- jitter on that delay (default: 0)
+    FAKE_TELEGRAM_429_RATIO       share of calls answered with 429 (default: 0)
+    FAKE_TELEGRAM_RETRY_AFTER     retry_after of injected 429s in seconds (default: 1)
+    FAKE_TELEGRAM_DICE            random | cycle (1..64 in order) | a fixed value (default: random)
+    FAKE_TELEGRAM_SEED            seed for latency jitter, 429s and random dice
+"""
+
+from fastapi import FastAPI, Request
+from collections import Counter
+from typing import Any, Dict
+import asyncio
+import itertools
+import os
+import random
+
+FAKE_TELEGRAM_PORT = int(os.getenv("FAKE_TELEGRAM_PORT", "8081"))
+
+app = FastAPI(title="Fake Telegram Bot API")
+
+config: Dict[str, Any] = {
+    "latency_ms": float(os.getenv("FAKE_TELEGRAM_LATENCY_MS", "0")),
+    "jitter_ms": float(os.getenv("FAKE_TELEGRAM_JITTER_MS", "0")),
+    "rate_limit_ratio": float(os.getenv("FAKE_TELEGRAM_429_RATIO", "0")),
+    "retry_after": int(os.getenv("FAKE_TELEGRAM_RETRY_AFTER", "1")),
+    "dice": os.getenv("FAKE_TELEGRAM_DICE", "random"),
+}
+
+_random = random.Random(os.getenv("FAKE_TELEGRAM_SEED"))
+_message_ids = itertools.count(1)
+_dice_cycle = itertools.cycle(range(1, 65))
+calls: Counter = Counter()
+rate_limited: Counter = Counter()
+
+
+def _message(chat_id: Any = None, **extra) -> dict:
+    return {"message_id": next(_message_ids), "chat": {"id": chat_id}, **extra}
+
+
+def _dice_value() -> int:
+    mode = str(config["dice"])
+    if mode == "cycle":
+        return next(_dice_cycle)
+    if mode.isdigit():
+        return int(mode)
+    return _random.randint(1, 64)
+
+
+@app.post("/_fake/config")
+async def set_config(request: Request):
+    """Change latency / 429 injection / dice mode of the running stub"""
+    config.update({key: value for key, value in (await request.json()).items() if key in config})
+    return config
+
+
+@app.get("/_fake/stats")
+async def get_stats():
+    return {"config": config, "calls": dict(calls), "rate_limited": dict(rate_limited)}
+
+
+@app.post("/_fake/reset")
+async def reset_stats():
+    calls.clear()
+    rate_limited.clear()
+    return {"ok": True}
+
+
+@app.post("/bot{token}/{method}")
+async def bot_method(token: str, method: str, request: Request):
+    """Answer the handful of Bot API methods the backend uses"""
+    try:
+        params = await request.json()
+    except Exception:
+        params = {}
+    calls[method] += 1
+
+    delay = config["latency_ms"] + _random.uniform(-config["jitter_ms"], config["jitter_ms"])
+    if delay > 0:
+        await asyncio.sleep(delay / 1000)
+
+    if config["rate_limit_ratio"] and _random.random() < config["rate_limit_ratio"]:
+        rate_limited[method] += 1
+        return {
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {config['retry_after']}",
+            "parameters": {"retry_after": config["retry_after"]},
+        }
+
+    if method == "sendDice":
+        result = _message(params.get("chat_id"), dice={"emoji": params.get("emoji", "🎰"), "value": _dice_value()})
+    elif method == "sendMessage":
+        result = _message(params.get("chat_id"), text=params.get("text", ""))
+    elif method == "createInvoiceLink":
+        result = f"https://t.me/$fake-invoice-{next(_message_ids)}"
+    elif method in ("answerPreCheckoutQuery", "refundStarPayment", "setWebhook", "deleteWebhook"):
+        result = True
+    elif method == "getMe":
+        result = {"id": int(token.split(":")[0]) if token.split(":")[0].isdigit() else 1, "is_bot": True, "first_name": "Fake"}
+    else:
+        return {"ok": False, "error_code": 404, "description": f"Not Found: method {method} not supported"}
+
+    return {"ok": True, "result": result}
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="127.0.0.1", port=FAKE_TELEGRAM_PORT, log_level="warning")
@@ -0,0 +1,151 @@
+"""
+Live activity feed: one in-process broadcaster fanning events out to WebSocket / SSE clients
+Each event is serialized once and the same string is queued for every subscriber. Queues are
+bounded per client; a client that falls that far behind is dropped (it reconnects and catches
+up from the ring buffer of recent events every new subscriber starts with).
+"""
+
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterable, Optional, Set
+import asyncio
+import logging
+import os
+
+import orjson
+
+from cache_bus import CacheBus
+
+logger = logging.getLogger(__name__)
+
+FEED_CLIENT_BUFFER = int(os.getenv("FEED_CLIENT_BUFFER", "100"))
+FEED_HISTORY = int(os.getenv("FEED_HISTORY", "50"))
+FEED_KEEPALIVE = float(os.getenv("FEED_KEEPALIVE", "15"))
+
+
+class Subscription:
+    """One client's bounded queue of serialized events; iterate it to receive them"""
+
+    def __init__(self, limit: int, backlog: Iterable[str] = ()):
+        self.limit = limit
+        self._messages: Deque[str] = deque(backlog)
+        self._waiter: Optional[asyncio.Future] = None  # set while the reader waits for a message
+        self.closed = False
+        self.dropped = False
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def push(self, message: str) -> bool:
+        """Queue a message; False when the queue is full"""
+        if self.closed:
+            return True
+        if len(self._messages) >= self.limit:
+            return False
+        self._messages.append(message)
+        self._wake()
+        return True
+
+    def close(self, dropped: bool = False):
+        """End the subscription; a dropped one discards what it had not sent yet"""
+        self.closed = True
+        if dropped:
+            self.dropped = True
+            self._messages.clear()
+        self._wake()
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[str]:
+        """Next message, None once closed; raises asyncio.TimeoutError after timeout seconds without one"""
+        while not self._messages:
+            if self.closed:
+                return None
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                if timeout is None:
+                    await self._waiter
+                else:
+                    await asyncio.wait_for(self._waiter, timeout)
+            finally:
+                self._waiter = None
+        return self._messages.popleft()
+
+    def _wake(self):
+        # A bare future rather than an asyncio.Event: one set_result per publish and subscriber
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            message = await self.next()
+            if message is None:
+                return
+            yield message
+
+
+class FeedBroadcaster:
+    """
+    publish() serializes an event once and queues it for every subscriber (O(subscribers),
+    no awaits, so the publisher never waits on a client). The last `history` events are
+    kept for new subscribers. With several workers, events are forwarded on the cache bus
+    so every worker's clients see every spin (about one bus interval late).
+    """
+
+    def __init__(self, bus: Optional[CacheBus] = None, client_buffer: int = FEED_CLIENT_BUFFER, history: int = FEED_HISTORY):
+        self.client_buffer = client_buffer
+        self._recent: Deque[str] = deque(maxlen=history)
+        self._subscribers: Set[Subscription] = set()
+        self.bus = bus
+        if bus is not None:
+            bus.subscribe("feed", self._fan_out)
+
+        # Metrics
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.peak_subscribers = 0
+
+    def publish(self, event: Dict[str, Any]):
+        message = orjson.dumps(event).decode()
+        self._fan_out(message)
+        if self.bus is not None:
+            self.bus.publish("feed", message)
+
+    def subscribe(self, replay: bool = True) -> Subscription:
+        """New subscription, starting with the recent events unless replay is False"""
+        backlog = list(self._recent)[-self.client_buffer:] if replay else ()
+        subscription = Subscription(self.client_buffer, backlog)
+        self._subscribers.add(subscription)
+        self.peak_subscribers = max(self.peak_subscribers, len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        subscription.close()
+
+    def close(self):
+        """End every subscription (FastAPI shutdown), so open streams finish"""
+        for subscription in self._subscribers:
+            subscription.close()
+        self._subscribers.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "peak_subscribers": self.peak_subscribers,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "recent": len(self._recent),
+        }
+
+    def _fan_out(self, message: str):
+        self._recent.append(message)
+        self.published += 1
+        slow = [subscription for subscription in self._subscribers if not subscription.push(message)]
+        self.delivered += len(self._subscribers) - len(slow)
+        for subscription in slow:
+            # A full queue means the client stopped reading; it is dropped rather than buffered without bound
+            self._subscribers.discard(subscription)
+            subscription.close(dropped=True)
+            self.dropped += 1
+        if slow:
+            logger.info(f"Dropped {len(slow)} slow feed subscribers")
@@ -0,0 +1,65 @@
+"""
+Polling file watcher used for hot reload (no extra dependencies)
+"""
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+FILE_WATCH_INTERVAL = float(os.getenv("FILE_WATCH_INTERVAL", "2"))
+
+
+def _mtime(path: Path) -> Optional[float]:
+    try:
+        return path.stat().st_mtime
+    except OSError:
+        return None
+
+
+class FileWatcher:
+    """Calls callback(path) when a watched file's mtime changes"""
+
+    def __init__(self, interval: float = FILE_WATCH_INTERVAL):
+        self.interval = interval
+        self._watched: Dict[Path, Tuple[Optional[float], List[Callable[[Path], None]]]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def watch(self, path: Path, callback: Callable[[Path], None]):
+        mtime, callbacks = self._watched.get(path, (_mtime(path), []))
+        callbacks.append(callback)
+        self._watched[path] = (mtime, callbacks)
+
+    def start(self):
+        if self._task is None and self._watched:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def check(self):
+        """Run one poll; call callbacks for files whose mtime changed"""
+        for path, (mtime, callbacks) in list(self._watched.items()):
+            current = _mtime(path)
+            if current == mtime:
+                continue
+            self._watched[path] = (current, callbacks)
+            for callback in callbacks:
+                try:
+                    callback(path)
+                except Exception as e:
+                    logger.error(f"File watch callback for {path} failed: {e}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.check()
@@ -0,0 +1,425 @@
+"""
+Gift inventory: prize gifts in stock and the gifts players own
+Gifts in stock are indexed in memory by rarity and price (sorted distinct prices, a FIFO of
+gift ids per price), so finding a gift for a prize range is a binary search instead of a scan
+over the stock. A win reserves its gift with UPDATE ... WHERE status = 'available' and confirms
+it once the spin is recorded, so concurrent wins (in any worker) never get the same gift.
+"""
+
+from sqlalchemy import insert, select, tuple_, update
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from time import perf_counter
+import asyncio
+import json
+import logging
+import os
+
+from cache_bus import CacheBus
+from database import AsyncSessionLocal, SessionLocal
+from metrics import ERRORS
+from models import Gift
+from spin_store import MAX_PAGE_SIZE, decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+GIFT_PRIZE_FILE = os.getenv("GIFT_PRIZE_FILE", "")
+GIFT_RESERVATION_TTL = float(os.getenv("GIFT_RESERVATION_TTL", "300"))
+
+RARITIES = ("common", "rare", "epic", "legendary")
+
+# Stars value of the gift won per bet and three-of-a-kind symbol (from the Node server's PRIZE_RANGES)
+DEFAULT_PRIZE_RANGES: Dict[str, Dict[str, Any]] = {
+    "50": {"777": [900, 1000], "lemon": [700, 800], "grape": [400, 450], "bar": [290, 330]},
+    "100": {"777": [1200, 1400], "lemon": [800, 900], "grape": [400, 600], "bar": [290, 330]},
+}
+
+
+class PrizeRange(NamedTuple):
+    low: int
+    high: int
+    rarity: Optional[str] = None  # any rarity when None
+
+
+class GiftReservation(NamedTuple):
+    gift_id: int
+    user_id: int  # users.id
+    price: int
+    rarity: str
+
+
+def parse_prize_ranges(data: Dict[str, Any]) -> Dict[Tuple[int, str], PrizeRange]:
+    """
+    {bet: {symbol: [low, high]}} (or {"min", "max", "rarity"} instead of the pair)
+    into (bet, symbol) -> PrizeRange; raises ValueError for malformed ranges
+    """
+    ranges: Dict[Tuple[int, str], PrizeRange] = {}
+    for bet, symbols in data.items():
+        for symbol, spec in symbols.items():
+            if isinstance(spec, dict):
+                prize = PrizeRange(int(spec["min"]), int(spec["max"]), spec.get("rarity"))
+            else:
+                low, high = spec
+                prize = PrizeRange(int(low), int(high))
+            if prize.low > prize.high or (prize.rarity is not None and prize.rarity not in RARITIES):
+                raise ValueError(f"Invalid prize range for bet {bet}, {symbol}: {spec}")
+            ranges[(int(bet), symbol.lower())] = prize
+    return ranges
+
+
+def load_prize_ranges(path: str = GIFT_PRIZE_FILE) -> Dict[Tuple[int, str], PrizeRange]:
+    if not path:
+        return parse_prize_ranges(DEFAULT_PRIZE_RANGES)
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_prize_ranges(json.load(f))
+
+
+class PriceIndex:
+    """Gift ids by price; the cheapest gift in a range is found by binary search over distinct prices"""
+
+    def __init__(self):
+        self._prices: List[int] = []  # sorted, only prices with stock
+        self._stock: Dict[int, "OrderedDict[int, None]"] = {}  # price -> gift ids, oldest first
+        self._price_of: Dict[int, int] = {}  # gift id -> price
+
+    def __len__(self) -> int:
+        return len(self._price_of)
+
+    def add(self, gift_id: int, price: int):
+        if gift_id in self._price_of:
+            return
+        bucket = self._stock.get(price)
+        if bucket is None:
+            bucket = self._stock[price] = OrderedDict()
+            insort(self._prices, price)
+        bucket[gift_id] = None
+        self._price_of[gift_id] = price
+
+    def remove(self, gift_id: int) -> bool:
+        price = self._price_of.pop(gift_id, None)
+        if price is None:
+            return False
+        bucket = self._stock[price]
+        del bucket[gift_id]
+        if not bucket:
+            self._drop_price(price)
+        return True
+
+    def peek(self, low: int, high: int) -> Optional[int]:
+        """Cheapest price in [low, high] with stock"""
+        i = bisect_left(self._prices, low)
+        if i < len(self._prices) and self._prices[i] <= high:
+            return self._prices[i]
+        return None
+
+    def take(self, low: int, high: int) -> Optional[Tuple[int, int]]:
+        """Remove and return (gift id, price) of the oldest gift at the cheapest price in [low, high]"""
+        price = self.peek(low, high)
+        if price is None:
+            return None
+        bucket = self._stock[price]
+        gift_id, _ = bucket.popitem(last=False)
+        del self._price_of[gift_id]
+        if not bucket:
+            self._drop_price(price)
+        return gift_id, price
+
+    def _drop_price(self, price: int):
+        del self._stock[price]
+        del self._prices[bisect_left(self._prices, price)]
+
+
+class GiftInventory:
+    """
+    Prize gifts in stock (status 'available', no owner) indexed per rarity and price
+    reserve() takes a gift out of the index and marks its row 'reserved' for the winner;
+    confirm() makes it 'owned', release() puts it back in stock. Reservations older than
+    reservation_ttl (e.g. from a worker that died mid-spin) are released by a background sweep.
+    With several workers, gifts taken and returned are announced on the cache bus; a gift a
+    worker still indexes after another took it fails the conditional update and is skipped.
+    """
+
+    def __init__(
+        self,
+        bus: Optional[CacheBus] = None,
+        prize_ranges: Optional[Dict[Tuple[int, str], PrizeRange]] = None,
+        reservation_ttl: float = GIFT_RESERVATION_TTL,
+    ):
+        self.bus = bus
+        self.prize_ranges = prize_ranges if prize_ranges is not None else load_prize_ranges()
+        self.reservation_ttl = reservation_ttl
+        self._indexes: Dict[str, PriceIndex] = {rarity: PriceIndex() for rarity in RARITIES}
+        self._task: Optional[asyncio.Task] = None
+        if bus is not None:
+            bus.subscribe("gift", self._on_event)
+
+        # Metrics
+        self.reserved = 0
+        self.confirmed = 0
+        self.released = 0
+        self.expired = 0
+        self.conflicts = 0
+        self.misses = 0
+        self.last_take_us = 0.0
+
+    async def start(self):
+        """Return stale reservations to stock, index the stock and start the sweep (FastAPI startup)"""
+        if self._task is not None:
+            return
+        await self.release_expired()
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Gift.id, Gift.price, Gift.rarity)
+                .where(Gift.status == "available", Gift.price.is_not(None))
+                .order_by(Gift.id)
+            )).all()
+        self._indexes = {rarity: PriceIndex() for rarity in RARITIES}
+        for gift_id, price, rarity in rows:
+            self._index(gift_id, price, rarity)
+        logger.info(f"🎁 {len(rows)} gifts in stock")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def prize_range(self, bet_amount: int, symbol_type: Optional[str]) -> Optional[PrizeRange]:
+        if symbol_type is None:
+            return None
+        return self.prize_ranges.get((int(bet_amount), symbol_type))
+
+    async def reserve_prize(self, user_id: int, bet_amount: int, symbol_type: Optional[str]) -> Optional[GiftReservation]:
+        """Reserve the prize gift for a three-of-a-kind; None when the combination has no prize or none is in stock"""
+        prize = self.prize_range(bet_amount, symbol_type)
+        if prize is None:
+            return None
+        return await self.reserve(user_id, prize)
+
+    async def reserve(self, user_id: int, prize: PrizeRange) -> Optional[GiftReservation]:
+        """Reserve the cheapest gift in stock within the range for users.id"""
+        while True:
+            started = perf_counter()
+            taken = self._take(prize)
+            self.last_take_us = (perf_counter() - started) * 1e6
+            if taken is None:
+                self.misses += 1
+                logger.warning(f"No gift in stock for {prize.low}-{prize.high} Stars ({prize.rarity or 'any rarity'})")
+                return None
+
+            gift_id, price, rarity = taken
+            try:
+                async with AsyncSessionLocal() as db:
+                    claimed = await db.execute(
+                        update(Gift)
+                        .where(Gift.id == gift_id, Gift.status == "available")
+                        .values(status="reserved", user_id=user_id, reserved_at=datetime.utcnow())
+                    )
+                    await db.commit()
+            except BaseException:
+                self._index(gift_id, price, rarity)
+                raise
+            if claimed.rowcount == 1:
+                self._publish(f"take:{gift_id}")
+                self.reserved += 1
+                return GiftReservation(gift_id, user_id, price, rarity)
+            self.conflicts += 1  # taken by another worker; try the next one
+
+    async def confirm(self, reservation: GiftReservation) -> Optional[Dict[str, Any]]:
+        """Hand the reserved gift over; None when the reservation expired meanwhile"""
+        async with AsyncSessionLocal() as db:
+            gift = (await db.execute(
+                update(Gift)
+                .where(Gift.id == reservation.gift_id, Gift.status == "reserved", Gift.user_id == reservation.user_id)
+                .values(status="owned", assigned_at=datetime.utcnow())
+                .returning(Gift)
+            )).scalar_one_or_none()
+            await db.commit()
+        if gift is None:
+            logger.warning(f"Gift {reservation.gift_id} reservation for user {reservation.user_id} expired before confirming")
+            return None
+        self.confirmed += 1
+        return serialize_gift(gift)
+
+    async def release(self, reservation: GiftReservation):
+        """Put a reserved gift back in stock"""
+        async with AsyncSessionLocal() as db:
+            released = await db.execute(
+                update(Gift)
+                .where(Gift.id == reservation.gift_id, Gift.status == "reserved", Gift.user_id == reservation.user_id)
+                .values(status="available", user_id=None, reserved_at=None)
+            )
+            await db.commit()
+        if released.rowcount == 1:
+            self._restock(reservation.gift_id, reservation.price, reservation.rarity)
+            self.released += 1
+
+    async def release_expired(self) -> int:
+        """Return reservations older than reservation_ttl to stock"""
+        cutoff = datetime.utcnow() - timedelta(seconds=self.reservation_ttl)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                update(Gift)
+                .where(Gift.status == "reserved", Gift.reserved_at < cutoff)
+                .values(status="available", user_id=None, reserved_at=None)
+                .returning(Gift.id, Gift.price, Gift.rarity)
+            )).all()
+            await db.commit()
+        for gift_id, price, rarity in rows:
+            self._restock(gift_id, price, rarity)
+        if rows:
+            self.expired += len(rows)
+            logger.warning(f"Returned {len(rows)} expired gift reservations to stock")
+        return len(rows)
+
+    async def owned(self, user_id: int, cursor: Optional[str] = None, limit: int = 20) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of the gifts users.id owns, newest first, keyset-paginated on (assigned_at, id)
+        Returns (gifts, next_cursor); raises ValueError for a malformed cursor
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = select(Gift).where(Gift.user_id == user_id, Gift.status == "owned")
+        if cursor:
+            assigned_at, gift_id = decode_cursor(cursor)
+            query = query.where(tuple_(Gift.assigned_at, Gift.id) < tuple_(assigned_at, gift_id))
+        query = query.order_by(Gift.assigned_at.desc(), Gift.id.desc()).limit(limit + 1)
+
+        async with AsyncSessionLocal() as db:
+            gifts = list((await db.execute(query)).scalars())
+        next_cursor = None
+        if len(gifts) > limit:
+            gifts = gifts[:limit]
+            next_cursor = encode_cursor(gifts[-1].assigned_at, gifts[-1].id)
+        return [serialize_gift(gift) for gift in gifts], next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_stock": {rarity: len(index) for rarity, index in self._indexes.items()},
+            "reserved": self.reserved,
+            "confirmed": self.confirmed,
+            "released": self.released,
+            "expired": self.expired,
+            "conflicts": self.conflicts,
+            "misses": self.misses,
+            "last_take_us": round(self.last_take_us, 2),
+        }
+
+    def _take(self, prize: PrizeRange) -> Optional[Tuple[int, int, str]]:
+        """Cheapest gift in range (of the prize's rarity, else of any), removed from the index"""
+        rarity = prize.rarity
+        if rarity is None:
+            cheapest = None
+            for candidate in RARITIES:
+                price = self._indexes[candidate].peek(prize.low, prize.high)
+                if price is not None and (cheapest is None or price < cheapest):
+                    cheapest, rarity = price, candidate
+            if rarity is None:
+                return None
+        taken = self._indexes[rarity].take(prize.low, prize.high)
+        if taken is None:
+            return None
+        return taken[0], taken[1], rarity
+
+    def _index(self, gift_id: int, price: int, rarity: Optional[str]):
+        index = self._indexes.get(rarity or "common")
+        if index is None:
+            logger.warning(f"Gift {gift_id} has unknown rarity {rarity!r}; not offered as a prize")
+            return
+        index.add(gift_id, int(price))
+
+    def _restock(self, gift_id: int, price: int, rarity: Optional[str]):
+        rarity = rarity or "common"  # as _index files a NULL rarity; other workers must agree
+        self._index(gift_id, price, rarity)
+        self._publish(f"add:{gift_id}:{int(price)}:{rarity}")
+
+    def _publish(self, key: str):
+        if self.bus is not None:
+            self.bus.publish("gift", key)
+
+    def _on_event(self, key: str):
+        """Gifts taken from / returned to stock by another worker"""
+        kind, _, rest = key.partition(":")
+        if kind == "add":
+            gift_id, price, rarity = rest.split(":", 2)
+            self._index(int(gift_id), int(price), rarity)
+        elif kind == "take":
+            for index in self._indexes.values():
+                if index.remove(int(rest)):
+                    break
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.reservation_ttl / 2))
+            try:
+                await self.release_expired()
+            except Exception as e:
+                ERRORS.labels("gifts").inc()
+                logger.error(f"Failed to release expired gift reservations: {e}")
+
+
+def serialize_gift(gift: Gift) -> Dict[str, Any]:
+    """Gift row for the client"""
+    return {
+        "id": gift.id,
+        "name": gift.name,
+        "description": gift.description,
+        "imageUrl": gift.image_url,
+        "rarity": gift.rarity,
+        "price": gift.price,
+        "giftType": gift.gift_type,
+        "assignedAt": gift.assigned_at.isoformat() if gift.assigned_at else None,
+    }
+
+
+def import_gifts_file(path: Path) -> int:
+    """
+    Add the available gifts of a Node-style gifts.json ([{name, price, image, status, ...}])
+    to the stock; owned entries are skipped
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        gifts = json.load(f)
+
+    rows = [
+        {
+            "user_id": None,
+            "gift_type": "prize",
+            "name": gift["name"],
+            "description": gift.get("description"),
+            "image_url": gift.get("image_url") or gift.get("image"),
+            "rarity": gift.get("rarity", "common"),
+            "price": int(gift["price"]),
+            "status": "available",
+            "assigned_at": None,
+        }
+        for gift in gifts
+        if gift.get("status", "available") == "available"
+    ]
+    db = SessionLocal()
+    try:
+        if rows:
+            db.execute(insert(Gift), rows)
+        db.commit()
+    finally:
+        db.close()
+
+    logger.info(f"Imported {len(rows)} of {len(gifts)} gifts from {path}")
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # Usage: python gift_inventory.py path/to/gifts.json
+    import sys
+    from database import init_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    count = import_gifts_file(Path(sys.argv[1]))
+    print(f"✅ Imported {count} gifts into stock")
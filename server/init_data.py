@@ -0,0 +1,109 @@
+"""
+Telegram WebApp initData verification
+The HMAC secret is derived once per bot token; verified init data strings are cached
+until they expire, so repeat calls with the same Authorization header skip all crypto
+"""
+
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl
+import hashlib
+import hmac
+import json
+import logging
+import os
+import time
+
+from cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+INIT_DATA_MAX_AGE = int(os.getenv("INIT_DATA_MAX_AGE", "86400"))
+INIT_DATA_CACHE_SIZE = int(os.getenv("INIT_DATA_CACHE_SIZE", "10000"))
+INIT_DATA_CACHE_TTL = float(os.getenv("INIT_DATA_CACHE_TTL", "300"))
+
+
+def webapp_secret_key(bot_token: str) -> bytes:
+    """HMAC_SHA256("WebAppData", bot_token), the key initData hashes are signed with"""
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
+class InitDataVerifier:
+    """
+    verify(init_data) -> parsed fields (with "user" decoded from JSON), or None
+    Only valid, unexpired strings are cached; the key is the whole string, not its
+    hash field, so a tampered payload never hits the cache
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        max_age: int = INIT_DATA_MAX_AGE,
+        cache_size: int = INIT_DATA_CACHE_SIZE,
+        cache_ttl: float = INIT_DATA_CACHE_TTL,
+    ):
+        self._secret_key = webapp_secret_key(bot_token) if bot_token else None
+        self.max_age = max_age
+        self.cache_ttl = cache_ttl
+        self._cache = TTLCache(cache_size, cache_ttl)
+
+        # Metrics
+        self.cache_hits = 0
+        self.verified = 0
+        self.rejected = 0
+
+    def verify(self, init_data: str) -> Optional[Dict[str, Any]]:
+        if self._secret_key is None or not init_data:
+            return None
+
+        cached = self._cache.get(init_data)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+
+        try:
+            parsed = self._verify_uncached(init_data)
+        except Exception as e:
+            logger.error(f"Error verifying init data: {e}")
+            parsed = None
+        if parsed is None:
+            self.rejected += 1
+            return None
+
+        self.verified += 1
+        ttl = self.cache_ttl
+        if self.max_age:
+            # Never serve a cached entry past its auth_date expiry
+            ttl = min(ttl, int(parsed.get("auth_date", 0)) + self.max_age - time.time())
+        if ttl > 0:
+            self._cache.set(init_data, parsed, ttl=ttl)
+        return parsed
+
+    def _verify_uncached(self, init_data: str) -> Optional[Dict[str, Any]]:
+        fields = dict(parse_qsl(init_data, keep_blank_values=True))
+        hash_value = fields.pop("hash", None)
+        if not hash_value:
+            return None
+
+        data_check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+        computed_hash = hmac.new(self._secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(computed_hash, hash_value):
+            return None
+
+        if self.max_age:
+            auth_date = int(fields.get("auth_date", 0))
+            if time.time() - auth_date > self.max_age:
+                logger.info("Rejected expired init data")
+                return None
+
+        parsed: Dict[str, Any] = dict(fields)
+        if "user" in parsed:
+            parsed["user"] = json.loads(parsed["user"])
+        return parsed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
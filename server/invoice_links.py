@@ -0,0 +1,214 @@
+"""
+Pre-created Telegram Stars invoice links for the standard bet tiers
+createInvoiceLink is called ahead of time in the background, so a spin click is served
+from a pool instead of waiting on a Bot API round trip. Each link carries a signed,
+single-use nonce in its payload; the invoice_nonces table maps it back to the user who was
+handed the link, so the webhook (in any worker) can attribute the payment.
+"""
+
+from sqlalchemy import delete, insert
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
+from typing import Any, Deque, Dict, NamedTuple, Optional, Sequence
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+
+from database import AsyncSessionLocal
+from models import InvoiceNonce
+from telegram_client import get_telegram_client
+
+logger = logging.getLogger(__name__)
+
+INVOICE_BET_TIERS = [int(bet) for bet in os.getenv("INVOICE_BET_TIERS", "50,100,200").split(",") if bet.strip()]
+INVOICE_POOL_SIZE = int(os.getenv("INVOICE_POOL_SIZE", "5"))
+INVOICE_LINK_TTL = float(os.getenv("INVOICE_LINK_TTL", "3600"))
+INVOICE_NONCE_TTL = float(os.getenv("INVOICE_NONCE_TTL", "86400"))
+
+# Expired nonces are deleted by the background refills at most this often
+NONCE_PURGE_INTERVAL = 600.0
+
+
+class InvoiceLinkError(Exception):
+    """createInvoiceLink answered with an error"""
+
+
+class PooledLink(NamedTuple):
+    url: str
+    nonce: str
+    created_at: float
+
+
+def invoice_params(bet_amount: int, payload: str) -> Dict[str, Any]:
+    """createInvoiceLink parameters for one slot spin"""
+    return {
+        "title": f"🎰 Slot Spin - {bet_amount} Stars",
+        "description": f"Spin the slot machine for {bet_amount} Telegram Stars",
+        "payload": payload,
+        "provider_token": "",  # Empty for Stars
+        "currency": "XTR",  # Telegram Stars currency
+        "prices": [{"label": f"Spin for {bet_amount} Stars", "amount": bet_amount}],
+    }
+
+
+class InvoiceLinkPool:
+    """
+    Per-tier pools of unissued links, topped up in the background after every take
+    Pooled links older than link_ttl are discarded; other bet amounts are created on demand
+    Issued nonces are stored in the database, so they resolve to their user for nonce_ttl
+    seconds in every worker; payments with an unknown nonce are attributed to the payer
+    """
+
+    def __init__(
+        self,
+        bot_token: str,
+        tiers: Sequence[int] = INVOICE_BET_TIERS,
+        pool_size: int = INVOICE_POOL_SIZE,
+        link_ttl: float = INVOICE_LINK_TTL,
+        nonce_ttl: float = INVOICE_NONCE_TTL,
+    ):
+        self.tiers = tuple(tiers)
+        self.pool_size = pool_size
+        self.link_ttl = link_ttl
+        self.nonce_ttl = nonce_ttl
+        self._secret = hmac.new(b"InvoiceNonce", bot_token.encode(), hashlib.sha256).digest()
+        self._pools: Dict[int, Deque[PooledLink]] = defaultdict(deque)
+        self._refills: Dict[int, asyncio.Task] = {}
+        self._running = False
+        self._purged_at = 0.0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.expired = 0
+        self.failed = 0
+        self.resolved = 0
+        self.unresolved = 0
+
+    def start(self):
+        """Pre-warm every tier in the background (FastAPI startup)"""
+        self._running = True
+        for bet_amount in self.tiers:
+            self._refill_soon(bet_amount)
+
+    async def stop(self):
+        self._running = False
+        tasks = list(self._refills.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._refills.clear()
+
+    async def issue(self, bet_amount: int, user_id: Optional[int] = None) -> str:
+        """
+        Invoice link for one spin, pooled when possible
+        Raises InvoiceLinkError / httpx.HTTPError when a link has to be created and that fails
+        """
+        link = self._take(bet_amount)
+        if link is None:
+            self.misses += 1
+            link = await self._create(bet_amount)
+        else:
+            self.hits += 1
+        if user_id is not None:
+            async with AsyncSessionLocal() as db:
+                await db.execute(insert(InvoiceNonce).values(nonce=link.nonce, user_id=user_id))
+                await db.commit()
+        self._refill_soon(bet_amount)
+        return link.url
+
+    async def resolve(self, nonce: str, sig: str, bet_amount: int) -> Optional[int]:
+        """
+        User an issued nonce was handed to, consuming the nonce (DELETE ... RETURNING, so
+        only one resolve in any worker gets it); None when unknown, used, expired or not ours
+        """
+        if not hmac.compare_digest(sig, self._sign(nonce, bet_amount)):
+            logger.warning(f"Invoice nonce {nonce} has a bad signature")
+            return None
+        async with AsyncSessionLocal() as db:
+            user_id = (await db.execute(
+                delete(InvoiceNonce).where(
+                    InvoiceNonce.nonce == nonce,
+                    InvoiceNonce.created_at >= datetime.utcnow() - timedelta(seconds=self.nonce_ttl),
+                ).returning(InvoiceNonce.user_id)
+            )).scalar_one_or_none()
+            await db.commit()
+        if user_id is None:
+            self.unresolved += 1
+        else:
+            self.resolved += 1
+        return user_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pooled": {bet_amount: len(self._pools[bet_amount]) for bet_amount in self.tiers},
+            "hits": self.hits,
+            "misses": self.misses,
+            "created": self.created,
+            "expired": self.expired,
+            "failed": self.failed,
+            "resolved": self.resolved,
+            "unresolved": self.unresolved,
+        }
+
+    def _sign(self, nonce: str, bet_amount: int) -> str:
+        return hmac.new(self._secret, f"{nonce}:{bet_amount}".encode(), hashlib.sha256).hexdigest()[:32]
+
+    def _take(self, bet_amount: int) -> Optional[PooledLink]:
+        pool = self._pools.get(bet_amount)
+        cutoff = time.monotonic() - self.link_ttl
+        while pool:
+            link = pool.popleft()
+            if link.created_at >= cutoff:
+                return link
+            self.expired += 1
+        return None
+
+    async def _create(self, bet_amount: int) -> PooledLink:
+        nonce = secrets.token_hex(8)
+        payload = json.dumps(
+            {"betAmount": bet_amount, "nonce": nonce, "sig": self._sign(nonce, bet_amount)},
+            separators=(",", ":"),
+        )
+        data = await get_telegram_client().call("createInvoiceLink", invoice_params(bet_amount, payload))
+        if not data.get("ok"):
+            self.failed += 1
+            raise InvoiceLinkError(f"Failed to create invoice: {data}")
+        self.created += 1
+        return PooledLink(data["result"], nonce, time.monotonic())
+
+    def _refill_soon(self, bet_amount: int):
+        if not self._running or bet_amount not in self.tiers or bet_amount in self._refills:
+            return
+        task = asyncio.create_task(self._refill(bet_amount))
+        self._refills[bet_amount] = task
+        task.add_done_callback(lambda _: self._refills.pop(bet_amount, None))
+
+    async def _refill(self, bet_amount: int):
+        if time.monotonic() - self._purged_at >= NONCE_PURGE_INTERVAL:
+            self._purged_at = time.monotonic()
+            try:
+                await self._purge_nonces()
+            except Exception as e:
+                logger.warning(f"Failed to delete expired invoice nonces: {e}")
+        pool = self._pools[bet_amount]
+        while len(pool) < self.pool_size:
+            try:
+                pool.append(await self._create(bet_amount))
+            except Exception as e:
+                # Callers fall back to creating links on demand until the next refill
+                logger.warning(f"Invoice pool refill for {bet_amount} Stars failed: {e}")
+                return
+
+    async def _purge_nonces(self):
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(InvoiceNonce).where(
+                InvoiceNonce.created_at < datetime.utcnow() - timedelta(seconds=self.nonce_ttl)
+            ))
+            await db.commit()
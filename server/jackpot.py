@@ -0,0 +1,338 @@
+"""
+Jackpot rounds: players buy tickets with their balance and one ticket takes the whole pool
+Each player's tickets are one weight in a Fenwick tree, so entering and finding the owner of
+the winning ticket are O(log n) for n players. A round closes JACKPOT_ROUND_SECONDS after its
+first entry; the draw, the payout and the next round are committed in one transaction.
+"""
+
+from sqlalchemy import func, insert, select, update
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from time import perf_counter
+import asyncio
+import logging
+import os
+import secrets
+import time
+
+from database import AsyncSessionLocal, async_engine
+from ledger import Ledger
+from metrics import ERRORS
+from models import JackpotEntry, JackpotRound, User
+
+logger = logging.getLogger(__name__)
+
+JACKPOT_ROUND_SECONDS = float(os.getenv("JACKPOT_ROUND_SECONDS", "60"))
+JACKPOT_TICKET_PRICE = int(os.getenv("JACKPOT_TICKET_PRICE", "1"))
+
+
+class FenwickTree:
+    """Growable binary indexed tree over non-negative integer weights (slots are 0-based)"""
+
+    def __init__(self):
+        self._tree = [0]  # 1-based; node i sums the slots in (i - lowbit(i), i]
+        self.total = 0
+
+    def __len__(self) -> int:
+        return len(self._tree) - 1
+
+    def append(self, weight: int) -> int:
+        """Add a slot at the end; returns its index"""
+        i = len(self._tree)
+        value = weight
+        child = i - 1
+        while child > i - (i & -i):
+            value += self._tree[child]
+            child -= child & -child
+        self._tree.append(value)
+        self.total += weight
+        return i - 1
+
+    def add(self, index: int, weight: int):
+        """Increase one slot's weight"""
+        i = index + 1
+        while i < len(self._tree):
+            self._tree[i] += weight
+            i += i & -i
+        self.total += weight
+
+    def prefix(self, index: int) -> int:
+        """Sum of slots [0, index)"""
+        total = 0
+        while index > 0:
+            total += self._tree[index]
+            index -= index & -index
+        return total
+
+    def weight(self, index: int) -> int:
+        return self.prefix(index + 1) - self.prefix(index)
+
+    def find(self, ticket: int) -> int:
+        """Slot holding ticket, where slot k owns tickets [prefix(k), prefix(k + 1))"""
+        if not 0 <= ticket < self.total:
+            raise IndexError(f"Ticket {ticket} outside 0..{self.total - 1}")
+        pos = 0
+        step = 1 << (len(self).bit_length() - 1)
+        while step:
+            node = pos + step
+            if node < len(self._tree) and self._tree[node] <= ticket:
+                pos = node
+                ticket -= self._tree[node]
+            step >>= 1
+        return pos
+
+
+class RoundClosed(Exception):
+    """The round an entry was meant for has already been drawn"""
+
+
+class JackpotService:
+    """
+    In-memory ticket pool of the active round, backed by jackpot_rounds / jackpot_entries
+    Entries debit the ledger and insert their row in one transaction; total_pool is written
+    when the round is drawn. With several workers every process tracks its own entries; the
+    closing worker notices the ticket count differs from the database and draws from the
+    persisted entries instead.
+    """
+
+    def __init__(self, ledger: Ledger, round_seconds: float = JACKPOT_ROUND_SECONDS, ticket_price: int = JACKPOT_TICKET_PRICE):
+        self.ledger = ledger
+        self.round_seconds = round_seconds
+        self.ticket_price = ticket_price
+        self._sqlite = async_engine.dialect.name == "sqlite"
+        self._round_id: Optional[int] = None
+        self._tree = FenwickTree()
+        self._players: List[int] = []  # slot -> users.id
+        self._slots: Dict[int, int] = {}  # users.id -> slot
+        self._pool = 0
+        self._closes_at: Optional[float] = None
+        self._has_entries = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+
+        # Metrics
+        self.entries = 0
+        self.rounds_closed = 0
+        self.last_draw_us = 0.0
+        self.last_close_ms = 0.0
+
+    async def start(self):
+        """Load (or open) the active round and start the round timer (FastAPI startup)"""
+        if self._task is None:
+            await self._load_round()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def enter(self, user_id: int, amount: int) -> Dict[str, Any]:
+        """
+        Buy amount // ticket_price tickets in the active round for users.id
+        Raises InsufficientFunds, or ValueError when amount buys no ticket
+        """
+        amount = int(amount)
+        tickets = amount // self.ticket_price
+        if tickets < 1:
+            raise ValueError(f"Minimum jackpot entry is {self.ticket_price} Stars")
+
+        for _ in range(3):
+            round_id = self._round_id
+            try:
+                async with self.ledger.transaction() as tx:
+                    # PostgreSQL locks the round before the user row, like close_round does;
+                    # SQLite has to start with the ledger's UPDATE to take the write lock first
+                    if not self._sqlite:
+                        await self._check_open(tx.db, round_id)
+                    _, balance = await tx.apply(user_id, -amount, "jackpot_bet", f"Jackpot round {round_id}")
+                    if self._sqlite:
+                        await self._check_open(tx.db, round_id)
+                    await tx.db.execute(insert(JackpotEntry).values(
+                        user_id=user_id, jackpot_round_id=round_id, bet_amount=amount, tickets=tickets,
+                    ))
+            except RoundClosed:
+                # Drawn by another worker (or just now); the debit was rolled back
+                await self._load_round()
+                continue
+
+            self._add(round_id, user_id, amount, tickets)
+            self.entries += 1
+            return {**self.snapshot(user_id), "tickets": tickets, "balance": balance}
+        raise RuntimeError("Jackpot round kept closing during entry")
+
+    async def close_round(self) -> Optional[Dict[str, Any]]:
+        """Draw the active round, pay the winner and open the next round; None when nobody entered"""
+        round_id = self._round_id
+        started = perf_counter()
+        result = None
+        async with self.ledger.transaction() as tx:
+            db = tx.db
+            claimed = await db.execute(
+                update(JackpotRound)
+                .where(JackpotRound.id == round_id, JackpotRound.status == "active")
+                .values(status="drawing")
+            )
+            if claimed.rowcount == 1:
+                tree, players, pool = self._tree, self._players, self._pool
+                persisted = (await db.execute(
+                    select(func.coalesce(func.sum(JackpotEntry.tickets), 0))
+                    .where(JackpotEntry.jackpot_round_id == round_id)
+                )).scalar_one()
+                if int(persisted) != tree.total:
+                    tree, players, pool, _ = await self._load_pool(db, round_id)
+
+                if tree.total:
+                    draw_started = perf_counter()
+                    ticket = secrets.randbelow(tree.total)
+                    winner = players[tree.find(ticket)]
+                    self.last_draw_us = (perf_counter() - draw_started) * 1e6
+
+                    await tx.apply(winner, pool, "jackpot_win", f"Jackpot round {round_id} (ticket {ticket})")
+                    await db.execute(update(JackpotRound).where(JackpotRound.id == round_id).values(
+                        status="completed", winner_id=winner, winning_ticket=ticket,
+                        total_pool=pool, completed_at=datetime.utcnow(),
+                    ))
+                    next_id = (await db.execute(
+                        insert(JackpotRound).values(status="active", total_pool=0).returning(JackpotRound.id)
+                    )).scalar_one()
+                    result = {
+                        "roundId": round_id,
+                        "pool": pool,
+                        "tickets": tree.total,
+                        "players": len(players),
+                        "winningTicket": ticket,
+                        "winnerId": (await db.execute(
+                            select(User.telegram_id).where(User.id == winner)
+                        )).scalar_one(),
+                    }
+                else:
+                    await db.execute(update(JackpotRound).where(JackpotRound.id == round_id).values(status="active"))
+
+        if result is None:
+            await self._load_round()
+            return None
+
+        self._reset(next_id)
+        self.last_result = result
+        self.rounds_closed += 1
+        self.last_close_ms = (perf_counter() - started) * 1000
+        logger.info(f"🏆 Jackpot round {round_id}: ticket {result['winningTicket']} of {result['tickets']} wins {result['pool']} Stars")
+        return result
+
+    def snapshot(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Active round state for the client; myTickets for users.id when given"""
+        slot = self._slots.get(user_id) if user_id is not None else None
+        return {
+            "roundId": self._round_id,
+            "pool": self._pool,
+            "totalTickets": self._tree.total,
+            "players": len(self._players),
+            "ticketPrice": self.ticket_price,
+            "closesIn": round(max(0.0, self._closes_at - time.monotonic()), 1) if self._closes_at else None,
+            "myTickets": self._tree.weight(slot) if slot is not None else 0,
+            "lastRound": self.last_result,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "round_id": self._round_id,
+            "players": len(self._players),
+            "tickets": self._tree.total,
+            "entries": self.entries,
+            "rounds_closed": self.rounds_closed,
+            "last_draw_us": round(self.last_draw_us, 2),
+            "last_close_ms": round(self.last_close_ms, 2),
+        }
+
+    @staticmethod
+    async def _check_open(db, round_id: int):
+        """Shared row lock: entries run side by side while the close waits for them"""
+        status = (await db.execute(
+            select(JackpotRound.status).where(JackpotRound.id == round_id).with_for_update(read=True)
+        )).scalar_one_or_none()
+        if status != "active":
+            raise RoundClosed(round_id)
+
+    def _add(self, round_id: int, user_id: int, amount: int, tickets: int):
+        if round_id != self._round_id:
+            return  # drawn meanwhile; the close counted this entry from the database
+        slot = self._slots.get(user_id)
+        if slot is None:
+            self._slots[user_id] = self._tree.append(tickets)
+            self._players.append(user_id)
+        else:
+            self._tree.add(slot, tickets)
+        self._pool += amount
+        if self._closes_at is None:
+            self._closes_at = time.monotonic() + self.round_seconds
+            self._has_entries.set()
+
+    def _reset(self, round_id: int, pool: Optional[Tuple[FenwickTree, List[int], int, Optional[datetime]]] = None):
+        tree, players, stars, first_entry_at = pool or (FenwickTree(), [], 0, None)
+        self._round_id = round_id
+        self._tree = tree
+        self._players = players
+        self._slots = {user_id: slot for slot, user_id in enumerate(players)}
+        self._pool = stars
+        self._closes_at = None
+        self._has_entries.clear()
+        if first_entry_at is not None:
+            elapsed = (datetime.utcnow() - first_entry_at).total_seconds()
+            self._closes_at = time.monotonic() + self.round_seconds - elapsed
+            self._has_entries.set()
+
+    async def _load_round(self):
+        """Pick up the active round from the database, opening one if there is none"""
+        async with AsyncSessionLocal() as db:
+            active = select(JackpotRound.id).where(JackpotRound.status == "active").order_by(JackpotRound.id).limit(1)
+            round_id = (await db.execute(active)).scalar_one_or_none()
+            if round_id is None:
+                await db.execute(insert(JackpotRound).values(status="active", total_pool=0))
+                await db.commit()
+                # Another worker may have opened one at the same time; all agree on the lowest id
+                round_id = (await db.execute(active)).scalar_one()
+            pool = await self._load_pool(db, round_id)
+        self._reset(round_id, pool)
+
+    @staticmethod
+    async def _load_pool(db, round_id: int) -> Tuple[FenwickTree, List[int], int, Optional[datetime]]:
+        """Ticket pool of a round from its persisted entries, players in order of first entry"""
+        rows = (await db.execute(
+            select(
+                JackpotEntry.user_id,
+                func.sum(JackpotEntry.tickets),
+                func.sum(JackpotEntry.bet_amount),
+                func.min(JackpotEntry.created_at),
+            )
+            .where(JackpotEntry.jackpot_round_id == round_id)
+            .group_by(JackpotEntry.user_id)
+            .order_by(func.min(JackpotEntry.id))
+        )).all()
+        tree = FenwickTree()
+        players = []
+        for user_id, tickets, _, _ in rows:
+            tree.append(int(tickets))
+            players.append(user_id)
+        stars = int(sum(amount for _, _, amount, _ in rows))
+        first_entry_at = min((created for _, _, _, created in rows), default=None)
+        return tree, players, stars, first_entry_at
+
+    async def _run(self):
+        while True:
+            await self._has_entries.wait()
+            delay = self._closes_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue  # the round may have changed while sleeping
+            try:
+                await self.close_round()
+            except Exception as e:
+                ERRORS.labels("jackpot").inc()
+                logger.error(f"Failed to close jackpot round {self._round_id}: {e}")
+                await asyncio.sleep(1)
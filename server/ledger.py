@@ -0,0 +1,257 @@
+"""
+Balance ledger over users.balance and the transactions table
+Every debit/credit updates the balance and appends a completed transaction in one
+database transaction; balances are whole Stars
+"""
+
+from sqlalchemy import insert, select, update
+from contextlib import asynccontextmanager, nullcontext
+from itertools import count
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import logging
+import os
+
+from cache_backend import CacheBackend, create_cache_backend
+from cache_bus import CacheBus
+from database import AsyncSessionLocal, async_engine
+from models import Transaction, User
+
+logger = logging.getLogger(__name__)
+
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+
+
+class InsufficientFunds(Exception):
+    """A debit would take the balance below zero"""
+
+    def __init__(self, user_id: int, balance: int, amount: int):
+        super().__init__(f"User {user_id} has {balance} Stars, cannot apply {amount}")
+        self.user_id = user_id
+        self.balance = balance
+        self.amount = amount
+
+
+class Ledger:
+    """
+    Atomic balance changes with a write-through balance cache (users.id -> Stars)
+    Postgres locks the user row with SELECT ... FOR UPDATE; SQLite has a single
+    writer, so changes are serialized in process instead of fighting over busy_timeout,
+    and start with the UPDATE so other worker processes wait for the write lock.
+    With a per-process cache, changes are published on the cache bus so other workers
+    drop their cached balance; a shared cache (CACHE_BACKEND=redis) is dropped directly.
+    A balance load that a change overtook is read again, so it never caches the older value.
+    Changes are numbered in row-lock (= commit) order per process and only the latest change
+    to a user writes its balance through, so a transaction resuming late after its commit
+    cannot replace a newer cached balance with its own.
+    """
+
+    def __init__(self, bus: Optional[CacheBus] = None, cache: Optional[CacheBackend] = None):
+        self._balances = cache or create_cache_backend("balance", maxsize=BALANCE_CACHE_SIZE)
+        self._sqlite = async_engine.dialect.name == "sqlite"
+        self._write_lock = asyncio.Lock() if self._sqlite else nullcontext()
+        self.bus = bus if not self._balances.shared else None
+        if self.bus is not None:
+            self.bus.subscribe("balance", lambda key: self.invalidate(int(key)))
+        self._loading: Dict[int, int] = {}  # users.id -> changes seen while its balance is being loaded
+        self._versions = count(1)
+        self._latest: Dict[int, int] = {}  # users.id -> version of its latest change not yet remembered
+
+        # Metrics
+        self.applied = 0
+        self.rejected = 0
+        self.reloads = 0
+        self.superseded = 0
+
+    async def balance(self, user_id: int) -> int:
+        """Current balance, from the cache when possible"""
+        return await self._balances.get_or_load(user_id, lambda: self._load_balance(user_id))
+
+    async def _load_balance(self, user_id: int) -> int:
+        # One load per user at a time (get_or_load is single-flight), so a counter per user suffices
+        while True:
+            self._loading[user_id] = 0
+            try:
+                async with AsyncSessionLocal() as db:
+                    balance = (await db.execute(
+                        select(User.balance).where(User.id == user_id)
+                    )).scalar_one_or_none()
+                changed = self._loading[user_id]
+            finally:
+                del self._loading[user_id]
+            if not changed:
+                return int(balance or 0)
+            # A change committed while we read: our value may predate it
+            self.reloads += 1
+
+    def _changed(self, user_id: int):
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+
+    async def apply(
+        self,
+        user_id: int,
+        amount: int,
+        transaction_type: str,
+        description: Optional[str] = None,
+        allow_negative: bool = False,
+    ) -> Tuple[int, int]:
+        """
+        Add amount (negative for a debit) to the user's balance and record it
+        Returns (transaction id, new balance); raises InsufficientFunds / LookupError
+        """
+        async with self.transaction() as tx:
+            return await tx.apply(user_id, amount, transaction_type, description, allow_negative)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator["LedgerTransaction"]:
+        """
+        One database transaction for balance changes plus the caller's own statements (tx.db)
+        Commits when the block exits cleanly; caches and other workers see the new balances after that
+        """
+        async with self._write_lock:
+            async with AsyncSessionLocal() as db:
+                tx = LedgerTransaction(self, db)
+                try:
+                    yield tx
+                    await db.commit()
+                except BaseException:
+                    for user_id, version in tx.versions.items():
+                        if self._latest.get(user_id) == version:
+                            del self._latest[user_id]
+                    raise
+
+        for user_id, new_balance in tx.balances.items():
+            await self._remember(user_id, new_balance, tx.versions[user_id])
+            if self.bus is not None:
+                self.bus.publish("balance", user_id)
+        self.applied += tx.applied
+
+    async def _apply_in(
+        self,
+        db,
+        user_id: int,
+        amount: int,
+        transaction_type: str,
+        description: Optional[str],
+        allow_negative: bool,
+    ) -> Tuple[int, int, int]:
+        """(transaction id, new balance, version); the user's row stays locked until the commit"""
+        amount = int(amount)
+        if self._sqlite:
+            new_balance = await self._apply_sqlite(db, user_id, amount, allow_negative)
+        else:
+            balance = (await db.execute(
+                select(User.balance).where(User.id == user_id).with_for_update()
+            )).scalar_one_or_none()
+            if balance is None:
+                raise LookupError(f"Unknown user {user_id}")
+
+            balance = int(balance)
+            new_balance = balance + amount
+            if new_balance < 0 and not allow_negative:
+                await self._reject(user_id, balance, amount)
+
+            await db.execute(update(User).where(User.id == user_id).values(balance=new_balance))
+        transaction_id = (await db.execute(
+            insert(Transaction).values(
+                user_id=user_id,
+                transaction_type=transaction_type,
+                amount=amount,
+                description=description,
+                status="completed",
+            ).returning(Transaction.id)
+        )).scalar_one()
+        return transaction_id, new_balance, self._next_version(user_id)
+
+    async def _apply_sqlite(self, db, user_id: int, amount: int, allow_negative: bool) -> int:
+        """Conditional UPDATE ... RETURNING: takes the write lock before reading the balance"""
+        stmt = update(User).where(User.id == user_id)
+        if not allow_negative:
+            stmt = stmt.where(User.balance + amount >= 0)
+        new_balance = (await db.execute(
+            stmt.values(balance=User.balance + amount).returning(User.balance)
+        )).scalar_one_or_none()
+        if new_balance is not None:
+            return int(new_balance)
+
+        balance = (await db.execute(select(User.balance).where(User.id == user_id))).scalar_one_or_none()
+        if balance is None:
+            raise LookupError(f"Unknown user {user_id}")
+        await self._reject(user_id, int(balance), amount)
+
+    async def _reject(self, user_id: int, balance: int, amount: int):
+        self.rejected += 1
+        await self._remember(user_id, balance, self._next_version(user_id))  # read under the row lock
+        raise InsufficientFunds(user_id, balance, amount)
+
+    def _next_version(self, user_id: int) -> int:
+        version = self._latest[user_id] = next(self._versions)
+        return version
+
+    async def _remember(self, user_id: int, balance: int, version: int):
+        """
+        Write through locally when this is the user's latest change; otherwise the balance may
+        already be older than the cached one, so it is cleared instead. A shared cache is always
+        cleared, since writers on other nodes could overwrite a newer balance with an older one
+        """
+        self._changed(user_id)
+        latest = self._latest.get(user_id) == version
+        if latest:
+            del self._latest[user_id]
+        else:
+            self.superseded += 1
+        if latest and not self._balances.shared:
+            await self._balances.set(user_id, balance)  # checked and set without yielding (in-memory cache)
+        else:
+            await self._balances.delete(user_id)
+
+    async def credit(self, user_id: int, amount: int, transaction_type: str = "win", description: Optional[str] = None) -> int:
+        """Add Stars; returns the new balance"""
+        return (await self.apply(user_id, abs(int(amount)), transaction_type, description))[1]
+
+    async def debit(self, user_id: int, amount: int, transaction_type: str = "bet", description: Optional[str] = None) -> int:
+        """Remove Stars, refusing to go below zero; returns the new balance"""
+        return (await self.apply(user_id, -abs(int(amount)), transaction_type, description))[1]
+
+    async def invalidate(self, user_id: int):
+        """Drop a cached balance changed outside the ledger"""
+        self._changed(user_id)
+        await self._balances.delete(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "applied": self.applied,
+            "rejected": self.rejected,
+            "reloads": self.reloads,
+            "superseded": self.superseded,
+            "cache": self._balances.stats(),
+        }
+
+
+class LedgerTransaction:
+    """Balance changes inside Ledger.transaction(); db is the open session"""
+
+    def __init__(self, ledger: Ledger, db):
+        self.ledger = ledger
+        self.db = db
+        self.balances: Dict[int, int] = {}
+        self.versions: Dict[int, int] = {}  # users.id -> version of its last change here
+        self.applied = 0
+
+    async def apply(
+        self,
+        user_id: int,
+        amount: int,
+        transaction_type: str,
+        description: Optional[str] = None,
+        allow_negative: bool = False,
+    ) -> Tuple[int, int]:
+        """Same as Ledger.apply, committed with the rest of the transaction"""
+        transaction_id, new_balance, version = await self.ledger._apply_in(
+            self.db, user_id, amount, transaction_type, description, allow_negative
+        )
+        self.balances[user_id] = new_balance
+        self.versions[user_id] = version
+        self.applied += 1
+        return transaction_id, new_balance
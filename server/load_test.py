@@ -0,0 +1,299 @@
+"""
+Load generator for the backend: open-loop requests at a target RPS per scenario,
+reporting p50/p95/p99 latency, errors and achieved throughput
+
+Scenarios (comma-separated, run concurrently):
+    spin      POST /slots/spin
+    webhook   pre_checkout_query + successful_payment updates to /api/telegram-webhook
+    auth      POST /api/auth/telegram + GET /api/users/me with signed initData
+
+    # self-contained: starts fake_telegram.py and the server against a temp database
+    python load_test.py --spawn --scenarios spin,webhook,auth --rps 50 --duration 20
+
+    # against a running server (needs the same bot token to sign initData)
+    python load_test.py --base-url http://localhost:5174 --bot-token 1:test --rps 100
+
+    # regression check: save a run, compare the next one with it
+    python load_test.py --spawn --save baseline.json
+    python load_test.py --spawn --baseline baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from bench_init_data import make_init_data
+
+BASE_DIR = Path(__file__).parent
+SPAWN_TOKEN = "123456:LOADTEST"
+SCENARIOS = ("spin", "webhook", "auth")
+
+
+class Recorder:
+    """Latency samples and error counts of one scenario"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.samples: List[float] = []
+        self.errors = 0
+        self.dropped = 0
+        self.status_codes: Dict[int, int] = {}
+
+    def record(self, seconds: float, status: int):
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if 200 <= status < 300:
+            self.samples.append(seconds)
+        else:
+            self.errors += 1
+
+    def summary(self, wall: float) -> Dict[str, Any]:
+        samples = sorted(self.samples)
+        p = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2) if samples else None
+        return {
+            "ok": len(samples),
+            "errors": self.errors,
+            "dropped": self.dropped,
+            "throughput": round(len(samples) / wall, 1) if wall else 0.0,
+            "p50_ms": p(0.50),
+            "p95_ms": p(0.95),
+            "p99_ms": p(0.99),
+            "max_ms": round(samples[-1] * 1000, 2) if samples else None,
+            "status_codes": {str(k): v for k, v in sorted(self.status_codes.items())},
+        }
+
+
+async def _timed(recorder: Recorder, request: Awaitable[httpx.Response]):
+    started = time.perf_counter()
+    try:
+        response = await request
+        status = response.status_code
+    except httpx.HTTPError:
+        status = 0
+    recorder.record(time.perf_counter() - started, status)
+
+
+def _user_id(i: int, users: int) -> int:
+    return 900_000_000 + i % users
+
+
+def spin_request(client: httpx.AsyncClient, i: int, args) -> List[Awaitable[httpx.Response]]:
+    return [client.post("/slots/spin", json={"userId": _user_id(i, args.users), "betAmount": 10})]
+
+
+def webhook_requests(client: httpx.AsyncClient, i: int, args) -> List[Awaitable[httpx.Response]]:
+    """The two updates of a Stars payment, sent back to back like Telegram does"""
+    user_id = _user_id(i, args.users)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.webhook_secret} if args.webhook_secret else {}
+    payload = json.dumps({"userId": user_id, "betAmount": 10})
+
+    async def flow():
+        await client.post("/api/telegram-webhook", headers=headers, json={
+            "update_id": i * 2,
+            "pre_checkout_query": {
+                "id": str(uuid.uuid4()), "from": {"id": user_id}, "currency": "XTR",
+                "total_amount": 10, "invoice_payload": payload,
+            },
+        })
+        return await client.post("/api/telegram-webhook", headers=headers, json={
+            "update_id": i * 2 + 1,
+            "message": {
+                "message_id": i, "date": int(time.time()),
+                "from": {"id": user_id}, "chat": {"id": user_id, "type": "private"},
+                "successful_payment": {
+                    "currency": "XTR", "total_amount": 10, "invoice_payload": payload,
+                    "telegram_payment_charge_id": f"load-{uuid.uuid4()}",
+                    "provider_payment_charge_id": "",
+                },
+            },
+        })
+
+    return [flow()]
+
+
+def auth_requests(client: httpx.AsyncClient, i: int, args) -> List[Awaitable[httpx.Response]]:
+    index = i % len(args.init_data)
+    user_id = _user_id(index, args.users)
+    init_data = args.init_data[index]
+
+    async def flow():
+        await client.post("/api/auth/telegram", json={"profile": {"id": user_id, "first_name": "Load"}})
+        return await client.get("/api/users/me", headers={"Authorization": f"tma {init_data}"})
+
+    return [flow()]
+
+
+REQUESTS: Dict[str, Callable[[httpx.AsyncClient, int, Any], List[Awaitable[httpx.Response]]]] = {
+    "spin": spin_request,
+    "webhook": webhook_requests,
+    "auth": auth_requests,
+}
+
+
+async def drive(client: httpx.AsyncClient, scenario: str, args) -> Recorder:
+    """Open loop: request i starts at i / rps regardless of how slow earlier ones are"""
+    recorder = Recorder(scenario)
+    make = REQUESTS[scenario]
+    in_flight: set = set()
+    started = time.perf_counter()
+    total = int(args.rps * args.duration)
+
+    for i in range(total):
+        delay = started + i / args.rps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= args.max_in_flight:
+            recorder.dropped += 1
+            continue
+        for request in make(client, i, args):
+            task = asyncio.create_task(_timed(recorder, request))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return recorder
+
+
+async def run(args) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=args.max_in_flight * len(args.scenarios))
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        started = time.perf_counter()
+        recorders = await asyncio.gather(*(drive(client, s, args) for s in args.scenarios))
+        wall = time.perf_counter() - started
+        try:
+            server_status = (await client.get("/status")).json()
+        except (httpx.HTTPError, ValueError):
+            server_status = None
+
+    return {
+        "rps": args.rps,
+        "duration": args.duration,
+        "scenarios": {r.name: r.summary(wall) for r in recorders},
+        "webhook_queue": (server_status or {}).get("webhook_queue"),
+    }
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    print(f"\nTarget {report['rps']} rps per scenario for {report['duration']}s")
+    print(f"{'scenario':<10}{'ok':>8}{'err':>6}{'drop':>6}{'rps':>9}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for name, s in report["scenarios"].items():
+        fmt = lambda v: f"{v:.1f}ms" if v is not None else "-"
+        print(
+            f"{name:<10}{s['ok']:>8}{s['errors']:>6}{s['dropped']:>6}{s['throughput']:>9}"
+            f"{fmt(s['p50_ms']):>10}{fmt(s['p95_ms']):>10}{fmt(s['p99_ms']):>10}{fmt(s['max_ms']):>10}"
+        )
+        if s["errors"]:
+            print(f"{'':<10}status codes: {s['status_codes']}")
+        base = (baseline or {}).get("scenarios", {}).get(name)
+        if base and base.get("p95_ms") and s["p95_ms"]:
+            change = (s["p95_ms"] - base["p95_ms"]) / base["p95_ms"]
+            print(f"{'':<10}p95 vs baseline: {base['p95_ms']:.1f}ms -> {s['p95_ms']:.1f}ms ({change:+.0%})")
+    if report.get("webhook_queue"):
+        queue = report["webhook_queue"]
+        print(f"\nWebhook queue: processed={queue.get('processed')} failed={queue.get('failed')} depth={queue.get('queue_depth')}")
+
+
+def _wait_for(url: str, attempts: int = 100):
+    for _ in range(attempts):
+        try:
+            httpx.get(url)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def spawn(args) -> List[subprocess.Popen]:
+    """Start fake_telegram.py and the server with limits opened up for the fake API"""
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    fake_env = {**os.environ, "FAKE_TELEGRAM_LATENCY_MS": str(args.fake_latency_ms), "FAKE_TELEGRAM_429_RATIO": str(args.fake_429_ratio)}
+    server_env = {
+        **os.environ,
+        "TELEGRAM_BOT_TOKEN": SPAWN_TOKEN,
+        "CHANNEL_ID": "@loadtest",
+        "TELEGRAM_API_URL": fake_url,
+        "DATABASE_URL": f"sqlite:///{workdir}/loadtest.db",
+        "TELEGRAM_GLOBAL_RATE": "100000",
+        "TELEGRAM_GROUP_RATE_PER_MIN": "6000000",
+        "TELEGRAM_GROUP_BURST": "100000",
+        "TELEGRAM_PRIVATE_RATE": "100000",
+        "TELEGRAM_WEBHOOK_SECRET": args.webhook_secret,
+    }
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "fake_telegram:app", "--port", str(args.fake_port), "--log-level", "warning"],
+            cwd=BASE_DIR, env=fake_env,
+        ),
+    ]
+    _wait_for(f"{fake_url}/_fake/stats")
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port), "--log-level", "warning"],
+        cwd=BASE_DIR, env=server_env,
+    ))
+    _wait_for(f"http://127.0.0.1:{args.port}/status")
+    print(f"Spawned fake Bot API at {fake_url} and server at http://127.0.0.1:{args.port} (db in {workdir})")
+    return processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:5174")
+    parser.add_argument("--scenarios", default="spin,webhook,auth")
+    parser.add_argument("--rps", type=float, default=20, help="target requests per second, per scenario")
+    parser.add_argument("--duration", type=float, default=10, help="seconds")
+    parser.add_argument("--users", type=int, default=1000, help="distinct simulated users")
+    parser.add_argument("--max-in-flight", type=int, default=500, help="per scenario; later requests are dropped")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--bot-token", default=os.getenv("TELEGRAM_BOT_TOKEN", ""), help="signs initData for the auth scenario")
+    parser.add_argument("--webhook-secret", default=os.getenv("TELEGRAM_WEBHOOK_SECRET", os.getenv("WEBHOOK_SECRET", "")))
+    parser.add_argument("--spawn", action="store_true", help="start fake_telegram.py and the server locally")
+    parser.add_argument("--port", type=int, default=8095, help="server port with --spawn")
+    parser.add_argument("--fake-port", type=int, default=8096, help="fake Bot API port with --spawn")
+    parser.add_argument("--fake-latency-ms", type=float, default=0, help="Bot API latency with --spawn")
+    parser.add_argument("--fake-429-ratio", type=float, default=0, help="share of 429 answers with --spawn")
+    parser.add_argument("--save", type=Path, help="write the report as JSON")
+    parser.add_argument("--baseline", type=Path, help="compare p95 with a saved report")
+    args = parser.parse_args()
+
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios {sorted(unknown)}, choose from {SCENARIOS}")
+
+    processes: List[subprocess.Popen] = []
+    if args.spawn:
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        args.bot_token = SPAWN_TOKEN
+        processes = spawn(args)
+    if "auth" in args.scenarios:
+        if not args.bot_token:
+            parser.error("the auth scenario needs --bot-token (the server's TELEGRAM_BOT_TOKEN)")
+        args.init_data = [make_init_data(args.bot_token, _user_id(i, args.users)) for i in range(min(args.users, 1000))]
+
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        for process in reversed(processes):  # server first, so it drains against the fake API
+            process.terminate()
+            process.wait()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else None
+    print_report(report, baseline)
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2))
+        print(f"\nSaved report to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,26 +3,54 @@ FastAPI Backend for PremiumHatStore Telegram Bot Integration
 Handles Telegram Bot API, payments, slot spins, and user management
 """
 
-from fastapi import FastAPI, HTTPException, Request, Header, Depends
-from fastapi.responses import JSONResponse, HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, Header, Depends, WebSocket
+from fastapi.responses import ORJSONResponse, HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import httpx
-import json
+import msgspec
 import os
 from pathlib import Path
 from datetime import datetime
-import hmac
-import hashlib
-from urllib.parse import parse_qs
 import logging
+import asyncio
+import signal
+from time import perf_counter
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Local modules read their configuration from the environment at import time
+from telegram_client import init_telegram_client, get_telegram_client, close_telegram_client
+from send_scheduler import SendScheduler, PRIORITY_DICE, PRIORITY_MESSAGE
+from channel_pool import ChannelPool, parse_channel_list
+from result_sender import ResultSender
+from dice_table import DiceMapping, RULE
+from file_watch import FileWatcher
+from cache_bus import CacheBus
+from cache_backend import create_cache_backend, close_cache_backends
+from static_files import IndexPage, PrecompressedStaticFiles, IMMUTABLE_CACHE_CONTROL
+from database import init_async_db, close_async_db
+from session_store import SessionStore
+from spin_store import fetch_spins_cached, SPIN_HISTORY_CACHE_TTL
+from write_behind import WriteBehindBuffer
+from update_queue import UpdateQueue
+from models import Spin
+from payment_dedup import PaymentDeduplicator
+from ledger import Ledger, InsufficientFunds
+from jackpot import JackpotService
+from battles import BattleService, BattleUnavailable, BATTLE_DICE_EMOJI
+from gift_inventory import GiftInventory
+from feed import FeedBroadcaster, Subscription, FEED_KEEPALIVE
+from init_data import InitDataVerifier
+from telegram_updates import Update, decode_update, parse_invoice_payload
+from invoice_links import InvoiceLinkPool, InvoiceLinkError
+from metrics import REGISTRY, METRICS_ENABLED, METRICS_MULTIPROC_DIR, MultiprocessSnapshots, SPIN_PHASE_SECONDS, ERRORS
+from database import get_async_db
+from sqlalchemy.ext.asyncio import AsyncSession
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -31,7 +59,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="PremiumHatStore API",
     description="Telegram Bot API integration for slot game with Telegram Stars payments",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -46,19 +75,16 @@ app.add_middleware(
 # Environment variables
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
 CHANNEL_ID = os.getenv("CHANNEL_ID", "")
+DICE_CHANNEL_IDS = parse_channel_list(os.getenv("DICE_CHANNEL_IDS", CHANNEL_ID))
 WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", os.getenv("WEBHOOK_SECRET", ""))
 PORT = int(os.getenv("PORT", "5174"))
 
 # Paths
 BASE_DIR = Path(__file__).parent
 MAPPING_FILE = BASE_DIR / "mapping.json"
-SESSIONS_FILE = BASE_DIR / "sessions.json"
-LAST_SPIN_FILE = BASE_DIR / "last-spin.json"
+PAYTABLE_FILE = Path(os.getenv("PAYTABLE_FILE")) if os.getenv("PAYTABLE_FILE") else None
 STATIC_DIR = BASE_DIR.parent / "app" / "static"
 
-# Telegram API URL
-TELEGRAM_API = f"https://api.telegram.org/bot{BOT_TOKEN}"
-
 # ==================== Pydantic Models ====================
 
 class TelegramProfile(BaseModel):
@@ -90,6 +116,7 @@ class SpinResult(BaseModel):
     diceValue: int
     isWin: bool
     isJackpot: bool
+    winAmount: int = 0
     text: Optional[str] = None
     diceMessageId: Optional[int] = None
 
@@ -100,238 +127,233 @@ class User(BaseModel):
     last_name: Optional[str] = None
     username: Optional[str] = None
     photo_url: Optional[str] = None
+    balance: Optional[int] = None
+
+
+class JackpotEntryRequest(BaseModel):
+    amount: int = Field(ge=1)
+
+
+class BattleRequest(BaseModel):
+    betAmount: int = Field(ge=1)
 
 
 # ==================== Dice Mapping ====================
 
-def load_dice_mapping() -> Dict[int, List[str]]:
-    """Load dice value to symbols mapping from JSON file"""
-    try:
-        if MAPPING_FILE.exists():
-            with open(MAPPING_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            mapping = {}
-            for entry in data:
-                value = entry["value"]
-                first = entry["first"].lower()
-                second = entry["second"].lower()
-                third = entry["third"].lower()
-                
-                # Normalize "seven" to "777"
-                normalize = lambda s: "777" if s == "seven" else s
-                mapping[value] = [normalize(first), normalize(second), normalize(third)]
-            
-            if len(mapping) != 64:
-                logger.error(f"Mapping file does not contain 64 values (found {len(mapping)})")
-                raise ValueError("Invalid mapping file")
-            
-            logger.info(f"Dice mapping loaded: {len(mapping)} values")
-            return mapping
-        else:
-            logger.warning(f"Mapping file not found: {MAPPING_FILE}")
-            # Fallback mapping
-            return {
-                1: ["bar", "bar", "bar"],
-                22: ["grape", "grape", "grape"],
-                43: ["lemon", "lemon", "lemon"],
-                64: ["777", "777", "777"],
-            }
-    except Exception as e:
-        logger.error(f"Failed to load mapping: {e}")
-        return {
-            1: ["bar", "bar", "bar"],
-            22: ["grape", "grape", "grape"],
-            43: ["lemon", "lemon", "lemon"],
-            64: ["777", "777", "777"],
-        }
+# Keeps per-process caches coherent when running several workers (see serve.py)
+cache_bus = CacheBus()
 
+# Compiled 64-entry outcome table; reloaded when mapping.json or the pay-table changes, or on SIGHUP
+dice_mapping = DiceMapping(MAPPING_FILE, PAYTABLE_FILE)
+file_watcher = FileWatcher()
+file_watcher.watch(MAPPING_FILE, dice_mapping.reload)
+if PAYTABLE_FILE:
+    file_watcher.watch(PAYTABLE_FILE, dice_mapping.reload)
+cache_bus.subscribe("dice_mapping", dice_mapping.reload)
 
-DICE_MAPPING = load_dice_mapping()
 
+def reload_dice_mapping(*_):
+    """SIGHUP: reload here and tell the other workers to reload too"""
+    if dice_mapping.reload():
+        cache_bus.publish("dice_mapping")
 
-def dice_value_to_symbols(value: int) -> List[str]:
-    """Convert dice value to slot symbols"""
-    if value not in DICE_MAPPING:
-        logger.warning(f"Missing dice value mapping for {value}")
-        return ["bar", "lemon", "grape"]
-    return DICE_MAPPING[value]
+
+# ==================== Session Management ====================
+
+session_store = SessionStore(cache_bus)
+write_buffer = WriteBehindBuffer()
+payment_dedup = PaymentDeduplicator()
+ledger = Ledger(cache_bus)
+jackpot = JackpotService(ledger)
+spin_history_cache = create_cache_backend("spins", ttl=SPIN_HISTORY_CACHE_TTL)
+invoice_links = InvoiceLinkPool(BOT_TOKEN)
+gifts = GiftInventory(cache_bus)
+feed = FeedBroadcaster(cache_bus)
+# With several workers, /metrics adds up every worker's values (serve.py sets the directory)
+metrics_snapshots = MultiprocessSnapshots(REGISTRY, METRICS_MULTIPROC_DIR) if METRICS_ENABLED and METRICS_MULTIPROC_DIR else None
+
+
+def parse_telegram_id(value: Any) -> Optional[int]:
+    """Telegram user id from an int or digit string, None for anonymous callers"""
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+        return int(value)
+    return None
 
 
 # ==================== Telegram Bot Functions ====================
 
-async def send_dice_to_telegram() -> Dict[str, Any]:
-    """Send slot machine dice to Telegram channel"""
-    if not BOT_TOKEN or not CHANNEL_ID:
-        raise HTTPException(status_code=500, detail="Telegram bot not configured")
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{TELEGRAM_API}/sendDice",
-            json={"chat_id": CHANNEL_ID, "emoji": "🎰"},
-            timeout=30.0
-        )
-        data = response.json()
-        
-        if not data.get("ok"):
-            raise HTTPException(status_code=500, detail=f"Telegram failed to send dice: {data}")
-        
-        return data["result"]
+# Chat messages go through the scheduler so per-chat/global rate limits are respected
+send_scheduler = SendScheduler()
+dice_channels = ChannelPool(DICE_CHANNEL_IDS)
+result_sender = ResultSender(send_scheduler)
 
+# perform_spin phase timers, bound once
+_spin_send_dice = SPIN_PHASE_SECONDS.labels("send_dice")
+_spin_mapping = SPIN_PHASE_SECONDS.labels("mapping")
+_spin_result_send = SPIN_PHASE_SECONDS.labels("result_send")
+_spin_persist = SPIN_PHASE_SECONDS.labels("persist")
+_spin_total = SPIN_PHASE_SECONDS.labels("total")
 
-async def send_result_message(dice_message_id: int, text: str):
-    """Send result message to Telegram channel"""
-    try:
-        async with httpx.AsyncClient() as client:
-            await client.post(
-                f"{TELEGRAM_API}/sendMessage",
-                json={
-                    "chat_id": CHANNEL_ID,
-                    "text": text,
-                    "reply_to_message_id": dice_message_id
-                },
-                timeout=30.0
+
+async def send_dice_to_telegram(emoji: str = "🎰") -> Tuple[str, Dict[str, Any]]:
+    """
+    Send dice (slot machine by default) to the least-loaded healthy dice channel
+    Fails over to the other channels; returns (channel, dice message)
+    """
+    if not BOT_TOKEN or not len(dice_channels):
+        raise HTTPException(status_code=500, detail="Telegram bot not configured")
+    
+    tried: List[str] = []
+    data: Dict[str, Any] = {}
+    while len(tried) < len(dice_channels):
+        channel = dice_channels.select(exclude=tried)
+        tried.append(channel)
+        dice_channels.started(channel)
+        try:
+            data = await send_scheduler.send(
+                "sendDice",
+                {"chat_id": channel, "emoji": emoji},
+                chat_id=channel,
+                priority=PRIORITY_DICE
             )
-    except Exception as e:
-        logger.warning(f"Failed to send result message: {e}")
+        except Exception as e:
+            dice_channels.finished(channel, ok=False)
+            if len(tried) == len(dice_channels):
+                raise
+            logger.warning(f"sendDice to {channel} failed, trying next channel: {e}")
+            continue
+        
+        dice_channels.finished(channel, ok=bool(data.get("ok")))
+        if data.get("ok"):
+            return channel, data["result"]
+        logger.warning(f"sendDice to {channel} failed: {data}")
+    
+    if data.get("error_code") == 429:
+        retry_after = (data.get("parameters") or {}).get("retry_after", 1)
+        raise HTTPException(
+            status_code=503,
+            detail="Telegram rate limit reached, retry later",
+            headers={"Retry-After": str(retry_after)}
+        )
+    raise HTTPException(status_code=500, detail=f"Telegram failed to send dice: {data}")
 
 
 async def perform_spin(user_id: Any, bet_amount: Any) -> SpinResult:
     """
     Perform a complete spin:
-    1. Send dice to Telegram
-    2. Map dice value to symbols
-    3. Send result message
+    1. Send dice to a Telegram dice channel
+    2. Look up the precomputed outcome for the dice value and its payout
+    3. Send (or queue) result message
     4. Return spin result
     """
     # 1. Send dice
-    dice_result = await send_dice_to_telegram()
+    started = perf_counter()
+    channel, dice_result = await send_dice_to_telegram()
     dice_value = dice_result["dice"]["value"]
     dice_message_id = dice_result["message_id"]
+    sent_at = perf_counter()
+    _spin_send_dice.observe(sent_at - started)
     
-    # 2. Convert using mapping
-    symbols = dice_value_to_symbols(dice_value)
-    is_win = len(set(symbols)) == 1
-    is_jackpot = dice_value == 64
+    # 2. Look up the precomputed outcome
+    outcome = dice_mapping.lookup(dice_value)
+    win_amount = dice_mapping.paytable.win_amount(outcome.symbols, bet_amount or 0)
     
     # 3. Format message
-    emoji_map = {
-        "777": "7️⃣",
-        "lemon": "🍋",
-        "grape": "🍇",
-        "bar": "🎰",
-    }
-    
-    pretty = " ".join([emoji_map.get(s, s) for s in symbols])
-    status = "🎰💰 JACKPOT! 💰🎰" if is_jackpot else ("✅ WIN" if is_win else "❌ Lose")
-    
     text = (
-        "━━━━━━━━━━━━━━\n"
+        f"{RULE}\n"
         f"👤 User: {user_id}\n"
         f"💰 Bet: {bet_amount}\n"
-        "━━━━━━━━━━━━━━\n"
-        f"🎲 Value: {dice_value}/64\n"
-        f"🎯 Result: {pretty}\n"
-        "━━━━━━━━━━━━━━\n"
-        f"{status}\n"
-        "━━━━━━━━━━━━━━"
+        f"{RULE}\n"
+        f"{outcome.text_tail}"
     )
+    if win_amount:
+        text += f"\n🏆 Won: {win_amount} Stars"
     
-    # 4. Send result message
-    await send_result_message(dice_message_id, text)
+    # 4. Send result message (inline, background or digest, see RESULT_MESSAGE_MODE)
+    summary = f"👤 {user_id} · 💰 {bet_amount} · 🎲 {dice_value} {outcome.emoji} {outcome.status}"
+    mapped_at = perf_counter()
+    _spin_mapping.observe(mapped_at - sent_at)
+    await result_sender.submit(channel, dice_message_id, text, summary)
+    result_sent_at = perf_counter()
+    _spin_result_send.observe(result_sent_at - mapped_at)
     
-    # 5. Persist last spin
     result = SpinResult(
-        symbols=symbols,
+        symbols=list(outcome.symbols),
         diceValue=dice_value,
-        isWin=is_win,
-        isJackpot=is_jackpot,
+        isWin=outcome.is_win,
+        isJackpot=outcome.is_jackpot,
+        winAmount=win_amount,
         text=text,
         diceMessageId=dice_message_id
     )
     
-    try:
-        with open(LAST_SPIN_FILE, 'w', encoding='utf-8') as f:
-            json.dump({
-                "ts": datetime.now().isoformat(),
-                "userId": str(user_id),
-                "betAmount": bet_amount,
-                "result": result.dict()
-            }, f, indent=2)
-    except Exception as e:
-        logger.warning(f"Failed to persist last spin: {e}")
+    # 5. Announce the spin on the live feed (same shape as /api/spins entries, without an id yet)
+    telegram_id = parse_telegram_id(user_id)
+    created_at = datetime.utcnow()  # the feed's createdAt and the row's, not the time of its batch insert
+    feed.publish({
+        "type": "spin",
+        "userId": telegram_id,
+        "betAmount": bet_amount,
+        "result": {
+            "symbols": result.symbols,
+            "diceValue": dice_value,
+            "isWin": outcome.is_win,
+            "isJackpot": outcome.is_jackpot,
+            "win_amount": win_amount,
+            "diceMessageId": dice_message_id,
+            "diceChatId": str(channel),
+        },
+        "createdAt": created_at.isoformat(),
+    })
+    
+    # 6. Queue spin for persistence (anonymous spins have no user row to attach to)
+    if telegram_id is not None:
+        try:
+            await write_buffer.put(Spin, {
+                "user_id": await session_store.user_pk(telegram_id),
+                "bet_amount": float(bet_amount or 0),
+                "dice_value": dice_value,
+                "symbols": list(outcome.symbols),
+                "is_win": outcome.is_win,
+                "is_jackpot": outcome.is_jackpot,
+                "win_amount": float(win_amount),
+                "telegram_message_id": dice_message_id,
+                "telegram_chat_id": str(channel),
+                "created_at": created_at,
+            })
+        except Exception as e:
+            ERRORS.labels("persist").inc()
+            logger.warning(f"Failed to queue spin: {e}")
     
+    finished = perf_counter()
+    _spin_persist.observe(finished - result_sent_at)
+    _spin_total.observe(finished - started)
     return result
 
 
-# ==================== Session Management ====================
+async def throw_battle_die() -> Tuple[int, int]:
+    """One die of a PvP battle, thrown in a dice channel; (value, message id)"""
+    _, dice_result = await send_dice_to_telegram(BATTLE_DICE_EMOJI)
+    return dice_result["dice"]["value"], dice_result["message_id"]
 
-def load_sessions() -> Dict[str, Any]:
-    """Load user sessions from file"""
-    try:
-        if SESSIONS_FILE.exists():
-            with open(SESSIONS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        logger.warning(f"Failed to read sessions file: {e}")
-    return {}
 
-
-def save_sessions(sessions: Dict[str, Any]):
-    """Save user sessions to file"""
-    try:
-        with open(SESSIONS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(sessions, f, indent=2)
-    except Exception as e:
-        logger.warning(f"Failed to write sessions file: {e}")
+battles = BattleService(ledger, throw_battle_die, cache_bus)
 
 
 # ==================== Authentication ====================
 
+# HMAC secret derived once; verified Authorization headers are cached until expiry
+init_data_verifier = InitDataVerifier(BOT_TOKEN)
+
+
 def verify_telegram_init_data(init_data: str) -> Optional[Dict[str, Any]]:
     """
-    Verify Telegram WebApp init data signature
-    Returns parsed data if valid, None otherwise
+    Verify Telegram WebApp init data signature and auth_date
+    Returns parsed data (user decoded) if valid, None otherwise
     """
-    if not BOT_TOKEN or not init_data:
-        return None
-    
-    try:
-        # Parse init data
-        parsed = parse_qs(init_data)
-        hash_value = parsed.get('hash', [None])[0]
-        
-        if not hash_value:
-            return None
-        
-        # Create data check string
-        data_check_arr = []
-        for key, values in parsed.items():
-            if key != 'hash':
-                data_check_arr.append(f"{key}={values[0]}")
-        data_check_arr.sort()
-        data_check_string = '\n'.join(data_check_arr)
-        
-        # Compute hash
-        secret_key = hmac.new(
-            "WebAppData".encode(),
-            BOT_TOKEN.encode(),
-            hashlib.sha256
-        ).digest()
-        
-        computed_hash = hmac.new(
-            secret_key,
-            data_check_string.encode(),
-            hashlib.sha256
-        ).hexdigest()
-        
-        if computed_hash == hash_value:
-            return dict(parsed)
-        
-    except Exception as e:
-        logger.error(f"Error verifying init data: {e}")
-    
-    return None
+    return init_data_verifier.verify(init_data)
 
 
 async def get_current_user(authorization: Optional[str] = Header(None)) -> Optional[User]:
@@ -343,29 +365,190 @@ async def get_current_user(authorization: Optional[str] = Header(None)) -> Optio
     verified = verify_telegram_init_data(init_data)
     
     if verified and 'user' in verified:
+        user_data = verified['user']
+        return User(
+            id=str(user_data.get('id')),
+            first_name=user_data.get('first_name'),
+            last_name=user_data.get('last_name'),
+            username=user_data.get('username'),
+            photo_url=user_data.get('photo_url')
+        )
+    
+    return None
+
+
+# ==================== Webhook Processing ====================
+
+async def claim_payment(update: Update) -> Optional[int]:
+    """
+    Record a successful_payment as a pending transaction before the webhook acknowledges it
+    Returns the transaction id, or None when the charge id was already claimed
+    """
+    msg = update.message
+    payment = msg.successful_payment
+    payer_id = msg.from_user.id if msg.from_user else msg.chat.id
+    invoice = parse_invoice_payload(payment.invoice_payload)
+    return await payment_dedup.claim({
+        "user_id": await session_store.user_pk(payer_id),
+        "transaction_type": "bet",
+        "amount": payment.total_amount,
+        "currency": payment.currency,
+        "description": f"Slot spin ({invoice.betAmount} Stars)",
+        "telegram_payment_id": payment.telegram_payment_charge_id,
+    })
+
+
+async def process_payment_update(job: Tuple[int, Update]):
+    """
+    Handle a claimed successful_payment update off the request path:
+    perform the spin, complete the payment, notify the payer
+    """
+    transaction_id, update = job
+    msg = update.message
+    payment = msg.successful_payment
+    chat_id = msg.chat.id
+    payer_id = msg.from_user.id if msg.from_user else chat_id
+    
+    # betAmount and the user come from the payload set by /slots/create-invoice
+    invoice = parse_invoice_payload(payment.invoice_payload)
+    user_id = invoice.userId if invoice.userId is not None else payer_id
+    if invoice.nonce:
+        user_id = await invoice_links.resolve(invoice.nonce, invoice.sig or "", invoice.betAmount) or payer_id
+    bet_amount = invoice.betAmount
+    
+    # Perform spin (failures are logged and counted by the update queue; the failed payment is refunded by recovery)
+    try:
+        spin_result = await perform_spin(user_id, bet_amount)
+    except Exception:
+        await payment_dedup.finish(transaction_id, "failed")
+        raise
+    
+    # Hold the gift prize of a three-of-a-kind until the spin is recorded as completed
+    reservation = None
+    if spin_result.isWin:
         try:
-            user_data = json.loads(verified['user'][0])
-            return User(
-                id=str(user_data.get('id')),
-                first_name=user_data.get('first_name'),
-                last_name=user_data.get('last_name'),
-                username=user_data.get('username'),
-                photo_url=user_data.get('photo_url')
+            reservation = await gifts.reserve_prize(
+                await session_store.user_pk(payer_id), bet_amount, spin_result.symbols[0]
             )
         except Exception as e:
-            logger.error(f"Error parsing user data: {e}")
+            logger.error(f"Failed to reserve a gift for {payer_id}: {e}")
+    try:
+        completed = await payment_dedup.finish(transaction_id, "completed")
+    except Exception:
+        if reservation:
+            await gifts.release(reservation)
+        raise
+    if not completed:
+        # Recovery refunded the payment while it waited; the spin stands but pays nothing
+        if reservation:
+            await gifts.release(reservation)
+        return
+    won_gift = await gifts.confirm(reservation) if reservation else None
     
-    return None
+    # A win pays one prize: the gift when one was handed over, else the Stars to the payer's balance
+    if spin_result.winAmount and won_gift is None:
+        try:
+            await ledger.credit(
+                await session_store.user_pk(payer_id),
+                spin_result.winAmount,
+                description=f"Slot win (dice {spin_result.diceValue})"
+            )
+        except Exception as e:
+            logger.error(f"Failed to credit win of {spin_result.winAmount} to {payer_id}: {e}")
+    
+    # Send private notification to payer
+    try:
+        await send_scheduler.send(
+            "sendMessage",
+            {
+                "chat_id": chat_id,
+                "text": f"Your spin result:\n{spin_result.text}"
+                        + (f"\n🎁 Gift: {won_gift['name']} (instead of the Stars)" if won_gift else "")
+            },
+            chat_id=chat_id,
+            priority=PRIORITY_MESSAGE
+        )
+    except Exception as e:
+        logger.warning(f"Failed to send private notification: {e}")
+
+
+async def refund_star_payment(telegram_id: int, charge_id: str):
+    """Refund a Stars payment (payment recovery); a charge refunded before counts as done"""
+    data = await get_telegram_client().call(
+        "refundStarPayment",
+        {"user_id": telegram_id, "telegram_payment_charge_id": charge_id}
+    )
+    if not data.get("ok") and "CHARGE_ALREADY_REFUNDED" not in str(data.get("description", "")):
+        raise RuntimeError(f"refundStarPayment failed: {data.get('description')}")
+
+
+update_queue = UpdateQueue(
+    process_payment_update,
+    describe=lambda job: job[1].message.successful_payment.telegram_payment_charge_id,
+)
+
+
+# ==================== Lifecycle ====================
+
+@app.on_event("startup")
+async def on_startup():
+    """Create application-lifetime resources"""
+    await init_async_db()
+    await cache_bus.start()
+    init_telegram_client()
+    if BOT_TOKEN:
+        invoice_links.start()
+    write_buffer.start()
+    if metrics_snapshots:
+        metrics_snapshots.start()
+    send_scheduler.start()
+    result_sender.start()
+    file_watcher.start()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_dice_mapping)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        pass  # no SIGHUP on Windows; the file watcher still reloads
+    update_queue.start()
+    if BOT_TOKEN:
+        payment_dedup.start(refund_star_payment)
+    await jackpot.start()
+    await battles.start()
+    await gifts.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """Release application-lifetime resources"""
+    feed.close()
+    await file_watcher.stop()
+    await jackpot.stop()
+    await gifts.stop()
+    await update_queue.stop()
+    await payment_dedup.stop()
+    await result_sender.stop()
+    await send_scheduler.stop()
+    await write_buffer.stop()
+    await invoice_links.stop()
+    await cache_bus.stop()
+    if metrics_snapshots:
+        await metrics_snapshots.stop()
+    await close_cache_backends()
+    await close_telegram_client()
+    await close_async_db()
 
 
 # ==================== API Routes ====================
 
+# Built client index.html, served from memory; reloaded when a new build lands
+index_page = IndexPage(STATIC_DIR / "index.html")
+file_watcher.watch(index_page.path, index_page.load)
+
+
 @app.get("/", response_class=HTMLResponse)
-async def root():
+async def root(request: Request):
     """Root endpoint - serves frontend if available, else API info"""
-    index_path = STATIC_DIR / "index.html"
-    if index_path.exists():
-        return HTMLResponse(content=index_path.read_text(encoding='utf-8'), status_code=200)
+    if index_page.available:
+        return index_page.response(request)
     
     return """
     <html>
@@ -377,6 +560,7 @@ async def root():
           <li><a href="/docs">/docs</a> - Interactive API documentation (Swagger UI)</li>
           <li><a href="/redoc">/redoc</a> - Alternative API documentation (ReDoc)</li>
           <li><a href="/status">/status</a> - Server status</li>
+          <li><a href="/metrics">/metrics</a> - Prometheus metrics</li>
           <li>/api/send-slot-dice (POST) - Send slot dice</li>
           <li>/api/telegram-webhook (POST) - Telegram webhook endpoint</li>
           <li>/api/auth/telegram (POST) - Telegram authentication</li>
@@ -392,25 +576,55 @@ async def root():
 
 @app.get("/status")
 async def status():
-    """Server status endpoint"""
+    """Server status endpoint; the stats are those of the worker that answered (env.pid)"""
     return {
         "ok": True,
         "ts": datetime.now().isoformat(),
         "env": {
             "port": PORT,
+            "pid": os.getpid(),
             "bot_configured": bool(BOT_TOKEN),
-            "channel_configured": bool(CHANNEL_ID)
-        }
+            "channel_configured": bool(DICE_CHANNEL_IDS),
+            "dice_channels": len(DICE_CHANNEL_IDS)
+        },
+        "write_behind": write_buffer.stats(),
+        "webhook_queue": update_queue.stats(),
+        "payments": {
+            "duplicates": payment_dedup.duplicates,
+            "refunded": payment_dedup.refunded,
+            "refund_failures": payment_dedup.refund_failures,
+        },
+        "ledger": ledger.stats(),
+        "spin_history_cache": spin_history_cache.stats(),
+        "invoice_links": invoice_links.stats(),
+        "jackpot": jackpot.stats(),
+        "battles": battles.stats(),
+        "gifts": gifts.stats(),
+        "feed": feed.stats(),
+        "init_data": init_data_verifier.stats(),
+        "cache_bus": cache_bus.stats(),
+        "telegram_scheduler": send_scheduler.stats(),
+        "dice_channels": dice_channels.stats(),
+        "result_messages": result_sender.stats()
     }
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of latency histograms and error counters"""
+    if not METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    text = metrics_snapshots.render() if metrics_snapshots else REGISTRY.render()
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/send-slot-dice")
 async def send_slot_dice(request: SpinRequest):
     """
     Send slot machine dice to Telegram channel
     Returns the spin result with symbols
     """
-    if not BOT_TOKEN or not CHANNEL_ID:
+    if not BOT_TOKEN or not DICE_CHANNEL_IDS:
         raise HTTPException(status_code=500, detail="Telegram bot not configured")
     
     try:
@@ -422,6 +636,7 @@ async def send_slot_dice(request: SpinRequest):
     except HTTPException as e:
         raise e
     except Exception as e:
+        ERRORS.labels("spin").inc()
         logger.error(f"Slot dice send error: {e}")
         raise HTTPException(status_code=500, detail=f"Dice send failed: {str(e)}")
 
@@ -430,27 +645,12 @@ async def send_slot_dice(request: SpinRequest):
 async def telegram_auth(auth_request: TelegramAuthRequest):
     """
     Authenticate user via Telegram WebApp
-    Stores session information in file-based storage
+    Upserts the user row keyed by telegram_id
     """
     if not auth_request.profile or not auth_request.profile.id:
         raise HTTPException(status_code=400, detail="profile.id is required")
     
-    sessions = load_sessions()
-    
-    # Store user session
-    user_id = str(auth_request.profile.id)
-    sessions[user_id] = {
-        "id": auth_request.profile.id,
-        "first_name": auth_request.profile.first_name,
-        "last_name": auth_request.profile.last_name,
-        "username": auth_request.profile.username,
-        "photo_url": auth_request.profile.photo_url,
-        "language_code": auth_request.profile.language_code,
-        "received_at": datetime.now().isoformat(),
-        "init_data": auth_request.init_data
-    }
-    
-    save_sessions(sessions)
+    await session_store.login(auth_request.profile.id, auth_request.profile.dict())
     
     return {"ok": True, "userId": auth_request.profile.id}
 
@@ -464,37 +664,13 @@ async def create_slot_invoice(invoice_request: InvoiceRequest):
     if not BOT_TOKEN:
         raise HTTPException(status_code=500, detail="Telegram bot not configured")
     
-    bet_amount = invoice_request.bet_amount
-    user_id = invoice_request.user_id or "unknown"
-    
-    # Create invoice payload
-    payload = json.dumps({"userId": user_id, "betAmount": bet_amount})
-    
-    # Telegram invoice parameters
-    invoice_params = {
-        "title": f"🎰 Slot Spin - {bet_amount} Stars",
-        "description": f"Spin the slot machine for {bet_amount} Telegram Stars",
-        "payload": payload,
-        "provider_token": "",  # Empty for Stars
-        "currency": "XTR",  # Telegram Stars currency
-        "prices": [{"label": f"Spin for {bet_amount} Stars", "amount": bet_amount}]
-    }
-    
+    # Standard bet tiers are served from the pre-created link pool
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{TELEGRAM_API}/createInvoiceLink",
-                json=invoice_params,
-                timeout=30.0
-            )
-            data = response.json()
-            
-            if not data.get("ok"):
-                raise HTTPException(status_code=500, detail=f"Failed to create invoice: {data}")
-            
-            invoice_url = data["result"]
-            return {"invoice_url": invoice_url}
-            
+        invoice_url = await invoice_links.issue(invoice_request.bet_amount, invoice_request.user_id)
+        return {"invoice_url": invoice_url}
+    
+    except InvoiceLinkError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except httpx.HTTPError as e:
         logger.error(f"HTTP error creating invoice: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to create invoice: {str(e)}")
@@ -512,7 +688,10 @@ async def slots_spin(request: SpinRequest):
             request.betAmount or 0
         )
         return result.dict()
+    except HTTPException:
+        raise
     except Exception as e:
+        ERRORS.labels("spin").inc()
         logger.error(f"Spin error: {e}")
         raise HTTPException(status_code=500, detail=f"Spin failed: {str(e)}")
 
@@ -521,7 +700,7 @@ async def slots_spin(request: SpinRequest):
 async def telegram_webhook(request: Request):
     """
     Telegram bot webhook endpoint
-    Handles pre_checkout_query and successful_payment events
+    Answers pre_checkout_query inline and queues successful_payment for the worker pool
     """
     # Verify webhook secret if configured
     if WEBHOOK_SECRET:
@@ -530,130 +709,323 @@ async def telegram_webhook(request: Request):
             logger.warning(f"Webhook secret mismatch: {received_secret}")
             raise HTTPException(status_code=401, detail="Unauthorized")
     
-    update = await request.json()
+    # Update types we do not handle are acknowledged without being parsed
+    try:
+        update = decode_update(await request.body())
+    except msgspec.DecodeError as e:
+        # Redelivery would not fix a malformed update, so it is acknowledged and dropped
+        ERRORS.labels("webhook").inc()
+        logger.warning(f"Dropping malformed update: {e}")
+        return {"ok": True}
+    if update is None:
+        return {"ok": True}
     
-    # Handle pre_checkout_query
-    if "pre_checkout_query" in update:
-        query = update["pre_checkout_query"]
+    # Fast path: Telegram expects the pre-checkout answer within 10 seconds
+    if update.pre_checkout_query:
         try:
-            async with httpx.AsyncClient() as client:
-                await client.post(
-                    f"{TELEGRAM_API}/answerPreCheckoutQuery",
-                    json={"pre_checkout_query_id": query["id"], "ok": True},
-                    timeout=30.0
-                )
+            await get_telegram_client().call(
+                "answerPreCheckoutQuery",
+                {"pre_checkout_query_id": update.pre_checkout_query.id, "ok": True}
+            )
         except Exception as e:
             logger.error(f"Failed to answer pre_checkout_query: {e}")
     
-    # Handle successful payment
-    if "message" in update and "successful_payment" in update["message"]:
-        msg = update["message"]
-        payment = msg["successful_payment"]
-        chat_id = msg["chat"]["id"]
-        payload = payment.get("invoice_payload", "")
-        
-        # Extract userId and betAmount from payload
-        user_id = msg.get("from", {}).get("id", chat_id)
-        bet_amount = 0
-        
-        if payload:
-            try:
-                if payload.strip().startswith('{'):
-                    parsed = json.loads(payload)
-                    user_id = parsed.get("userId", user_id)
-                    bet_amount = parsed.get("betAmount", 0)
-                else:
-                    # Parse naive key:value format
-                    parts = payload.replace(',', '|').replace(';', '|').split('|')
-                    for part in parts:
-                        if ':' in part:
-                            key, value = part.split(':', 1)
-                            key = key.strip()
-                            value = value.strip()
-                            if key in ['userId', 'uid']:
-                                user_id = int(value) if value.isdigit() else value
-                            elif key in ['betAmount', 'bet']:
-                                bet_amount = int(value) if value.isdigit() else 0
-            except Exception as e:
-                logger.warning(f"Failed to parse invoice payload: {e}")
-        
-        # Perform spin
+    # Handle successful payment in the background
+    if update.message and update.message.successful_payment:
+        charge_id = update.message.successful_payment.telegram_payment_charge_id
+        if not payment_dedup.mark(charge_id):
+            logger.info(f"Duplicate successful_payment {charge_id} short-circuited")
+            return {"ok": True}
+        # The pending transaction is written before the 200, so an accepted payment
+        # survives a restart even if it never reaches a worker
         try:
-            spin_result = await perform_spin(user_id, bet_amount)
-            
-            # Send private notification to payer
-            try:
-                async with httpx.AsyncClient() as client:
-                    await client.post(
-                        f"{TELEGRAM_API}/sendMessage",
-                        json={
-                            "chat_id": chat_id,
-                            "text": f"Your spin result:\n{spin_result.text}"
-                        },
-                        timeout=30.0
-                    )
-            except Exception as e:
-                logger.warning(f"Failed to send private notification: {e}")
-                
+            transaction_id = await claim_payment(update)
         except Exception as e:
-            logger.error(f"Error performing spin after successful payment: {e}")
+            payment_dedup.forget(charge_id)
+            ERRORS.labels("webhook").inc()
+            logger.error(f"Failed to record successful_payment {charge_id}: {e}")
+            raise HTTPException(status_code=503, detail="Payment could not be recorded")
+        if transaction_id is None:
+            return {"ok": True}
+        if not update_queue.submit((transaction_id, update)):
+            # Non-2xx makes Telegram redeliver the update later; the claim is undone for it
+            await payment_dedup.release(transaction_id)
+            payment_dedup.forget(charge_id)
+            logger.warning("Webhook queue full, rejecting successful_payment update")
+            raise HTTPException(status_code=503, detail="Webhook queue full")
     
     return {"ok": True}
 
 
 @app.get("/api/spins")
 async def get_spins(
+    response: Response,
     my: Optional[bool] = False,
     limit: Optional[int] = 10,
-    user: Optional[User] = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    user: Optional[User] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get recent spins (placeholder - implement with database)
+    Get recent spins, newest first (all users, or only mine with my=true)
+    The cursor for the next page is returned in the X-Next-Cursor header
     """
-    # This is a placeholder. In production, implement with a database
     if my and not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    return []
+    try:
+        spins, next_cursor = await fetch_spins_cached(
+            spin_history_cache,
+            db,
+            telegram_id=int(user.id) if my else None,
+            cursor=cursor,
+            limit=limit or 10
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return spins
 
 
 @app.get("/slots/history")
 async def slots_history(
     user_id: Optional[int] = None,
     limit: int = 10,
-    user: Optional[User] = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    user: Optional[User] = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get spin history for user (placeholder - implement with database)
+    Get spin history for user, newest first
+    Pass next_cursor from the previous page as cursor to continue
     """
-    # This is a placeholder. In production, implement with a database
     if not user_id and not user:
         raise HTTPException(status_code=401, detail="Authentication required")
     
-    return {"history": []}
+    try:
+        history, next_cursor = await fetch_spins_cached(
+            spin_history_cache,
+            db,
+            telegram_id=user_id or int(user.id),
+            cursor=cursor,
+            limit=limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"history": history, "next_cursor": next_cursor}
 
 
 @app.get("/api/users/me")
 async def get_current_user_info(user: Optional[User] = Depends(get_current_user)):
-    """Get current authenticated user information"""
+    """Get current authenticated user information with the cached balance"""
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
+    user.balance = await ledger.balance(await session_store.user_pk(int(user.id)))
     return user
 
 
+async def _send_feed(websocket: WebSocket, subscription: Subscription):
+    async for message in subscription:
+        await websocket.send_text(message)
+
+
+async def _wait_disconnect(websocket: WebSocket):
+    # Clients have nothing to send; receiving is only how a closed connection shows up
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@app.websocket("/ws/feed")
+async def feed_websocket(websocket: WebSocket):
+    """Live spin feed: the recent events, then every new one, as JSON text frames"""
+    await websocket.accept()
+    subscription = feed.subscribe()
+    sender = asyncio.create_task(_send_feed(websocket, subscription))
+    receiver = asyncio.create_task(_wait_disconnect(websocket))
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        feed.unsubscribe(subscription)
+        sender.cancel()
+        receiver.cancel()
+    if receiver not in done:
+        # Dropped for falling behind (1013: try again later) or server shutdown (1001)
+        try:
+            await websocket.close(code=1013 if subscription.dropped else 1001)
+        except Exception:
+            pass
+
+
+@app.get("/api/feed")
+async def feed_events():
+    """Server-sent events fallback for /ws/feed (text/event-stream)"""
+    subscription = feed.subscribe()
+
+    async def stream():
+        try:
+            while True:
+                try:
+                    message = await subscription.next(timeout=FEED_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"  # keeps proxies from closing an idle stream
+                    continue
+                if message is None:
+                    return  # dropped or shutting down; EventSource reconnects
+                yield f"data: {message}\n\n"
+        finally:
+            feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/api/gifts/my")
+async def get_my_gifts(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    user: Optional[User] = Depends(get_current_user)
+):
+    """
+    Gifts I own, newest first
+    Pass next_cursor from the previous page as cursor to continue
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    try:
+        owned, next_cursor = await gifts.owned(await session_store.user_pk(int(user.id)), cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"gifts": owned, "next_cursor": next_cursor}
+
+
+@app.get("/api/jackpot")
+async def get_jackpot(user: Optional[User] = Depends(get_current_user)):
+    """Active jackpot round (with my tickets when authenticated) and the last result"""
+    return jackpot.snapshot(await session_store.user_pk(int(user.id)) if user else None)
+
+
+@app.post("/api/jackpot/enter")
+async def enter_jackpot(entry: JackpotEntryRequest, user: Optional[User] = Depends(get_current_user)):
+    """Buy jackpot tickets with Stars from the balance"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        return await jackpot.enter(await session_store.user_pk(int(user.id)), entry.amount)
+    except InsufficientFunds as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/battles")
+async def list_battles(
+    betAmount: Optional[int] = None,
+    my: bool = False,
+    limit: int = 50,
+    user: Optional[User] = Depends(get_current_user)
+):
+    """Open battles, oldest first (of one bet amount when given), or with my=true my latest battles"""
+    limit = max(1, min(limit, 100))
+    if my:
+        if not user:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return await battles.history(await session_store.user_pk(int(user.id)), limit)
+    return battles.open_battles(betAmount, limit)
+
+
+@app.get("/api/battles/{battle_id}")
+async def get_battle(battle_id: int):
+    """One battle; poll an open battle to see its result"""
+    battle = await battles.get(battle_id)
+    if battle is None:
+        raise HTTPException(status_code=404, detail="Battle not found")
+    return battle
+
+
+@app.post("/api/battles")
+async def create_battle(request: BattleRequest, user: Optional[User] = Depends(get_current_user)):
+    """Open a battle, staking betAmount Stars from the balance"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        return await battles.create(await session_store.user_pk(int(user.id)), int(user.id), request.betAmount)
+    except InsufficientFunds as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/battles/match")
+async def match_battle(request: BattleRequest, user: Optional[User] = Depends(get_current_user)):
+    """Fight the oldest open battle at betAmount, or open one when nobody is waiting"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        return await battles.match(await session_store.user_pk(int(user.id)), int(user.id), request.betAmount)
+    except InsufficientFunds as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post("/api/battles/{battle_id}/join")
+async def join_battle(battle_id: int, user: Optional[User] = Depends(get_current_user)):
+    """Fight one open battle: both dice are thrown and the winner takes both stakes"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        return await battles.join(battle_id, await session_store.user_pk(int(user.id)), int(user.id))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except BattleUnavailable:
+        raise HTTPException(status_code=409, detail=f"Battle {battle_id} is no longer open")
+    except InsufficientFunds as e:
+        raise HTTPException(status_code=402, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.delete("/api/battles/{battle_id}")
+async def cancel_battle(battle_id: int, user: Optional[User] = Depends(get_current_user)):
+    """Cancel my open battle and get the stake back"""
+    if not user:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        return await battles.cancel(battle_id, await session_store.user_pk(int(user.id)))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except BattleUnavailable:
+        raise HTTPException(status_code=409, detail=f"Battle {battle_id} is no longer open")
+
+
 # ==================== Static Files ====================
 
-# Serve built client if available
+# Serve built client if available (.br/.gz siblings are used when the client accepts them)
 if STATIC_DIR.exists():
     logger.info(f"Serving built client from {STATIC_DIR}")
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+    static_files = PrecompressedStaticFiles(directory=str(STATIC_DIR), check_dir=False)
+    app.mount("/static", static_files, name="static")
+    if (STATIC_DIR / "assets").is_dir():
+        # Content-hashed Vite bundles referenced by index.html as /assets/...
+        app.mount(
+            "/assets",
+            PrecompressedStaticFiles(directory=str(STATIC_DIR / "assets"), cache_control=IMMUTABLE_CACHE_CONTROL),
+            name="assets"
+        )
     
     @app.get("/{full_path:path}")
-    async def serve_spa(full_path: str):
-        """Serve SPA for all unmatched routes"""
-        index_path = STATIC_DIR / "index.html"
-        if index_path.exists():
-            return HTMLResponse(content=index_path.read_text(), status_code=200)
+    async def serve_spa(full_path: str, request: Request):
+        """Serve top-level build files (favicon etc.), else the SPA for all unmatched routes"""
+        if full_path in index_page.files:
+            return await static_files.get_response(full_path, request.scope)
+        if index_page.available:
+            return index_page.response(request)
         raise HTTPException(status_code=404, detail="Not found")
 else:
     logger.info(f"Built client not found at {STATIC_DIR}")
@@ -666,8 +1038,8 @@ if __name__ == "__main__":
     
     if not BOT_TOKEN:
         logger.warning("⚠️  TELEGRAM_BOT_TOKEN is missing!")
-    if not CHANNEL_ID:
-        logger.warning("⚠️  CHANNEL_ID is missing!")
+    if not DICE_CHANNEL_IDS:
+        logger.warning("⚠️  CHANNEL_ID / DICE_CHANNEL_IDS is missing!")
     
     logger.info(f"🚀 Starting FastAPI server on http://localhost:{PORT}")
     uvicorn.run(app, host="0.0.0.0", port=PORT)
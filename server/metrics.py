@@ -0,0 +1,353 @@
+"""
+Minimal Prometheus-style metrics (text exposition format, no extra dependencies)
+Label children are created once and kept, so the hot path is a dict lookup or,
+for pre-bound children, just a bisect and two additions.
+With METRICS_ENABLED=0 every child is a shared no-op.
+With METRICS_MULTIPROC_DIR set (serve.py does for several workers), every process writes
+a snapshot of its values there and a scrape adds up the snapshots of all processes.
+"""
+
+from bisect import bisect_left
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") not in ("0", "false", "False")
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR", "")
+METRICS_SNAPSHOT_INTERVAL = float(os.getenv("METRICS_SNAPSHOT_INTERVAL", "1"))
+
+# {metric name: [[label values, state], ...]}; state is a counter value or [bucket counts, sum]
+Snapshot = Dict[str, List[List[Any]]]
+
+# Seconds; spans a local DB query up to a slow Telegram round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Noop:
+    __slots__ = ()
+
+    def observe(self, value: float):
+        pass
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+
+_NOOP = _Noop()
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), enabled: bool = METRICS_ENABLED):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.enabled = enabled
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """Child for these label values; bind it once where the labels are static"""
+        if not self.enabled:
+            return _NOOP
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _state(self, child) -> Any:
+        """JSON-friendly copy of a child's values"""
+        raise NotImplementedError
+
+    def _add(self, state: Any, other: Any) -> Any:
+        raise NotImplementedError
+
+    def _samples(self, states: Dict[Tuple[str, ...], Any]) -> List[str]:
+        raise NotImplementedError
+
+    def snapshot(self) -> List[List[Any]]:
+        return [[list(values), self._state(child)] for values, child in self._children.items()]
+
+    def render(self, others: Iterable[Snapshot] = ()) -> List[str]:
+        """Exposition lines; others are snapshots of other processes, added to this one's values"""
+        states = {values: self._state(child) for values, child in self._children.items()}
+        for snapshot in others:
+            for values, state in snapshot.get(self.name, ()):
+                values = tuple(values)
+                states[values] = self._add(states[values], state) if values in states else state
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self._samples(states)]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _state(self, child: _CounterChild) -> float:
+        return child.value
+
+    def _add(self, state: float, other: float) -> float:
+        return state + other
+
+    def _samples(self, states: Dict[Tuple[str, ...], float]) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}"
+            for values, value in states.items()
+        ]
+
+
+class Gauge(Counter):
+    """A value that goes up and down; the snapshots of several workers add up"""
+    kind = "gauge"
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _state(self, child: _HistogramChild) -> List[Any]:
+        return [list(child.counts), child.sum]
+
+    def _add(self, state: List[Any], other: List[Any]) -> List[Any]:
+        return [[a + b for a, b in zip(state[0], other[0])], state[1] + other[1]]
+
+    def _samples(self, states: Dict[Tuple[str, ...], List[Any]]) -> List[str]:
+        lines = []
+        for values, (counts, total) in states.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def snapshot(self) -> Snapshot:
+        return {metric.name: metric.snapshot() for metric in self.metrics}
+
+    def render(self, others: Sequence[Snapshot] = ()) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render(others))
+        return "\n".join(lines) + "\n"
+
+
+class MultiprocessSnapshots:
+    """
+    <directory>/<pid>.json holds each process's latest snapshot, rewritten every interval
+    and on stop; render() adds this process's live values to every other snapshot there.
+    Snapshots of exited processes stay, so counters never go backwards; serve.py empties
+    the directory before starting the workers.
+    """
+
+    def __init__(self, registry: Registry, directory: str, interval: float = METRICS_SNAPSHOT_INTERVAL):
+        self.registry = registry
+        self.directory = Path(directory)
+        self.interval = interval
+        self.path = self.directory / f"{os.getpid()}.json"
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self.write()
+
+    def write(self):
+        # Written to a temporary file and renamed, so readers never see half a snapshot
+        temporary = self.path.with_suffix(".tmp")
+        temporary.write_text(json.dumps(self.registry.snapshot(), separators=(",", ":")))
+        os.replace(temporary, self.path)
+
+    def render(self) -> str:
+        others = []
+        for path in self.directory.glob("*.json"):
+            if path == self.path:
+                continue
+            try:
+                others.append(json.loads(path.read_text()))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {path}: {e}")
+        return self.registry.render(others)
+
+    async def _run(self):
+        while True:
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning(f"Failed to write metrics snapshot {self.path}: {e}")
+            await asyncio.sleep(self.interval)
+
+
+REGISTRY = Registry()
+
+# ==================== Application metrics ====================
+
+TELEGRAM_REQUEST_SECONDS = REGISTRY.histogram(
+    "telegram_api_request_seconds", "Bot API call latency by method", ("method",)
+)
+TELEGRAM_ERRORS = REGISTRY.counter(
+    "telegram_api_errors_total", "Bot API calls that failed or returned ok=false", ("method",)
+)
+TELEGRAM_RATE_LIMITED = REGISTRY.counter(
+    "telegram_api_rate_limited_total", "Bot API calls answered with 429", ("method",)
+)
+SPIN_PHASE_SECONDS = REGISTRY.histogram(
+    "spin_phase_seconds", "perform_spin time by phase", ("phase",)
+)
+WEBHOOK_UPDATE_SECONDS = REGISTRY.histogram(
+    "webhook_update_seconds", "Time to process one queued webhook update"
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "db_query_seconds", "Database statement execution time"
+)
+WRITE_BEHIND_PENDING = REGISTRY.gauge(
+    "write_behind_pending_rows", "Rows queued or being flushed by the write-behind buffer"
+)
+WRITE_BEHIND_FLUSH_SECONDS = REGISTRY.histogram(
+    "write_behind_flush_seconds", "Time to insert one write-behind batch"
+)
+WRITE_BEHIND_ROWS = REGISTRY.counter(
+    "write_behind_rows_total", "Write-behind rows by outcome", ("outcome",)
+)
+PAYMENT_DUPLICATES = REGISTRY.counter(
+    "payment_duplicates_total", "Redelivered successful_payment updates ignored", ("layer",)
+)
+PAYMENT_REFUNDS = REGISTRY.counter(
+    "payment_refunds_total", "Stuck payments refunded by recovery, by outcome", ("outcome",)
+)
+ERRORS = REGISTRY.counter(
+    "errors_total", "Errors by source", ("source",)
+)
+
+
+def instrument_engine(sync_engine):
+    """Time every statement of an engine (pass async_engine.sync_engine for async engines)"""
+    if not METRICS_ENABLED:
+        return
+    from sqlalchemy import event
+
+    observe = DB_QUERY_SECONDS.labels().observe
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        observe(perf_counter() - context._metrics_started)
@@ -3,7 +3,7 @@ Database models for PremiumHatStore
 This file provides SQLAlchemy models for future database implementation
 """
 
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, BigInteger, String, Float, Boolean, DateTime, ForeignKey, JSON, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -22,7 +22,7 @@ class User(Base):
     last_name = Column(String, nullable=True)
     photo_url = Column(String, nullable=True)
     language_code = Column(String, nullable=True)
-    balance = Column(Float, default=0.0)
+    balance = Column(Integer, default=0, nullable=False)  # whole Stars, changed only through ledger.py
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -45,10 +45,17 @@ class Spin(Base):
     is_jackpot = Column(Boolean, default=False)
     win_amount = Column(Float, default=0.0)
     telegram_message_id = Column(Integer, nullable=True)
+    telegram_chat_id = Column(String, nullable=True)  # dice channel the message was sent to
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="spins")
+    
+    # Keyset pagination: per-user history and the global feed, newest first
+    __table_args__ = (
+        Index("ix_spins_user_id_created_at", "user_id", "created_at"),
+        Index("ix_spins_created_at", "created_at"),
+    )
 
 
 class Transaction(Base):
@@ -58,11 +65,11 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     transaction_type = Column(String, nullable=False)  # 'deposit', 'withdrawal', 'win', 'bet'
-    amount = Column(Float, nullable=False)
+    amount = Column(Integer, nullable=False)  # whole Stars; negative for debits
     currency = Column(String, default="XTR")  # Telegram Stars
     description = Column(String, nullable=True)
     telegram_payment_id = Column(String, nullable=True, unique=True)
-    status = Column(String, default="pending")  # 'pending', 'completed', 'failed'
+    status = Column(String, default="pending")  # 'pending', 'completed', 'failed', 'refunding', 'refunded'
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
@@ -74,18 +81,28 @@ class Gift(Base):
     __tablename__ = "gifts"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    gift_type = Column(String, nullable=False)  # 'daily', 'achievement', 'purchase'
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # None while a prize is in stock
+    gift_type = Column(String, nullable=False)  # 'daily', 'achievement', 'purchase', 'prize'
     name = Column(String, nullable=False)
     description = Column(String, nullable=True)
     image_url = Column(String, nullable=True)
     rarity = Column(String, default="common")  # 'common', 'rare', 'epic', 'legendary'
+    price = Column(Integer, nullable=True)  # Stars value of a prize gift
+    status = Column(String, default="owned")  # 'available', 'reserved', 'owned'
+    reserved_at = Column(DateTime, nullable=True)
+    assigned_at = Column(DateTime, nullable=True, default=datetime.utcnow)
     claimed = Column(Boolean, default=False)
     claimed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationships
     user = relationship("User", back_populates="gifts")
+    
+    # Indexing the stock on startup and keyset pages of a player's gifts (see gift_inventory.py)
+    __table_args__ = (
+        Index("ix_gifts_status_price", "status", "price"),
+        Index("ix_gifts_user_id_assigned_at", "user_id", "assigned_at", "id"),
+    )
 
 
 class Battle(Base):
@@ -102,6 +119,13 @@ class Battle(Base):
     opponent_result = Column(JSON, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+    
+    # Indexing open battles on startup and a player's battle history (see battles.py)
+    __table_args__ = (
+        Index("ix_battles_status_bet_amount", "status", "bet_amount", "id"),
+        Index("ix_battles_creator_id", "creator_id", "id"),
+        Index("ix_battles_opponent_id", "opponent_id", "id"),
+    )
 
 
 class JackpotEntry(Base):
@@ -114,6 +138,11 @@ class JackpotEntry(Base):
     bet_amount = Column(Float, nullable=False)
     tickets = Column(Integer, nullable=False)  # Number of tickets based on bet
     created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Rebuilding a round's ticket pool (see jackpot.py)
+    __table_args__ = (
+        Index("ix_jackpot_entries_round_id", "jackpot_round_id", "id"),
+    )
 
 
 class JackpotRound(Base):
@@ -127,3 +156,23 @@ class JackpotRound(Base):
     winning_ticket = Column(Integer, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
+
+
+class CacheEvent(Base):
+    """Cross-process cache invalidation message (see cache_bus.py)"""
+    __tablename__ = "cache_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    topic = Column(String, nullable=False)  # 'balance', 'session', 'dice_mapping'
+    key = Column(String, nullable=True)
+    origin = Column(String, nullable=False)  # publishing process, which skips its own events
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+
+class InvoiceNonce(Base):
+    """Pooled invoice link handed to a user; the payment's nonce maps back to them (see invoice_links.py)"""
+    __tablename__ = "invoice_nonces"
+    
+    nonce = Column(String, primary_key=True)
+    user_id = Column(BigInteger, nullable=False)  # Telegram user id the link was issued to
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,181 @@
+"""
+Idempotent successful_payment handling keyed on telegram_payment_charge_id
+An in-memory TTL set short-circuits redeliveries; the unique
+transactions.telegram_payment_id column is the cross-process guarantee.
+A claimed payment that never completes (its worker died, or the spin failed) keeps
+the charge id, so redeliveries cannot retry it; recovery refunds those instead.
+"""
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import os
+
+from cache import TTLCache
+from database import AsyncSessionLocal
+from models import Transaction, User
+from metrics import ERRORS, PAYMENT_DUPLICATES, PAYMENT_REFUNDS
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_DEDUP_TTL = float(os.getenv("PAYMENT_DEDUP_TTL", "86400"))
+PAYMENT_DEDUP_SIZE = int(os.getenv("PAYMENT_DEDUP_SIZE", "100000"))
+PAYMENT_RECOVERY_AGE = float(os.getenv("PAYMENT_RECOVERY_AGE", "900"))
+PAYMENT_RECOVERY_INTERVAL = float(os.getenv("PAYMENT_RECOVERY_INTERVAL", "300"))
+
+# refund(payer telegram id, charge id); raises when the refund was not made
+Refund = Callable[[int, str], Awaitable[None]]
+
+
+class PaymentDeduplicator:
+    """Two-level duplicate filter for Telegram payment charge ids"""
+
+    def __init__(
+        self,
+        ttl: float = PAYMENT_DEDUP_TTL,
+        maxsize: int = PAYMENT_DEDUP_SIZE,
+        recovery_age: float = PAYMENT_RECOVERY_AGE,
+        recovery_interval: float = PAYMENT_RECOVERY_INTERVAL,
+    ):
+        self._seen = TTLCache(maxsize, ttl)
+        self.recovery_age = recovery_age
+        self.recovery_interval = recovery_interval
+        self._task: Optional[asyncio.Task] = None
+        self.duplicates = 0
+        self.refunded = 0
+        self.refund_failures = 0
+
+    def start(self, refund: Refund):
+        """Refund stuck payments now and every recovery_interval seconds (FastAPI startup)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(refund))
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def mark(self, charge_id: Optional[str]) -> bool:
+        """
+        Mark a charge id as in progress without awaiting
+        Returns False when it was already seen by this process
+        """
+        if not charge_id:
+            return True
+        if self._seen.add(charge_id):
+            return True
+        self.duplicates += 1
+        PAYMENT_DUPLICATES.labels("memory").inc()
+        return False
+
+    def forget(self, charge_id: Optional[str]):
+        """Undo mark() when the update was not accepted (so a redelivery is processed)"""
+        if charge_id:
+            self._seen.pop(charge_id)
+
+    async def claim(self, row: Dict[str, Any]) -> Optional[int]:
+        """
+        Insert the pending payment transaction; the unique telegram_payment_id
+        makes exactly one caller win across workers and restarts
+        Returns the transaction id, or None for a duplicate
+        """
+        async with AsyncSessionLocal() as db:
+            try:
+                result = await db.execute(
+                    insert(Transaction).values(status="pending", **row).returning(Transaction.id)
+                )
+                await db.commit()
+                return result.scalar_one()
+            except IntegrityError:
+                await db.rollback()
+                self.duplicates += 1
+                PAYMENT_DUPLICATES.labels("database").inc()
+                logger.info(f"Duplicate payment {row.get('telegram_payment_id')} ignored")
+                return None
+
+    async def finish(self, transaction_id: int, status: str) -> bool:
+        """
+        Move a pending claim to its final status ('completed' / 'failed')
+        False when recovery already refunded it (the claim sat longer than recovery_age)
+        """
+        if await self._move(transaction_id, "pending", status):
+            return True
+        logger.error(f"Payment transaction {transaction_id} was no longer pending when it finished as {status}")
+        return False
+
+    async def release(self, transaction_id: int):
+        """Delete a pending claim that was not accepted, so a redelivery can claim it again"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                delete(Transaction).where(Transaction.id == transaction_id, Transaction.status == "pending")
+            )
+            await db.commit()
+
+    async def recover(self, refund: Refund, older_than: Optional[float] = None) -> int:
+        """
+        Refund payments claimed more than older_than seconds ago (default recovery_age)
+        that are still 'pending' or ended 'failed' (or 'refunding', if a worker died mid-refund;
+        Telegram refuses a second refund of a charge). Each row is taken with a conditional
+        UPDATE to 'refunding', so concurrent workers refund it once; it ends 'refunded',
+        or 'failed' again (retried on the next pass) when the refund call fails.
+        Returns the number refunded
+        """
+        older_than = self.recovery_age if older_than is None else older_than
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Transaction.id, Transaction.status, Transaction.telegram_payment_id, User.telegram_id)
+                .join(User, User.id == Transaction.user_id)
+                .where(
+                    Transaction.status.in_(("pending", "failed", "refunding")),
+                    Transaction.telegram_payment_id.is_not(None),
+                    Transaction.created_at < cutoff,
+                )
+                .order_by(Transaction.id)
+            )).all()
+
+        refunded = 0
+        for transaction_id, status, charge_id, telegram_id in rows:
+            if not await self._move(transaction_id, status, "refunding"):
+                continue  # another worker took it
+            try:
+                await refund(telegram_id, charge_id)
+            except Exception as e:
+                await self._move(transaction_id, "refunding", "failed")
+                self.refund_failures += 1
+                PAYMENT_REFUNDS.labels("failed").inc()
+                logger.error(f"Refund of {status} payment {charge_id} to {telegram_id} failed: {e}")
+                continue
+            await self._move(transaction_id, "refunding", "refunded")
+            refunded += 1
+            self.refunded += 1
+            PAYMENT_REFUNDS.labels("refunded").inc()
+            logger.warning(f"Refunded {status} payment {charge_id} to {telegram_id}")
+        return refunded
+
+    async def _move(self, transaction_id: int, status: str, new_status: str) -> bool:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Transaction)
+                .where(Transaction.id == transaction_id, Transaction.status == status)
+                .values(status=new_status)
+            )
+            await db.commit()
+        return result.rowcount == 1
+
+    async def _run(self, refund: Refund):
+        while True:
+            try:
+                await self.recover(refund)
+            except Exception as e:
+                ERRORS.labels("webhook").inc()
+                logger.error(f"Payment recovery failed: {e}")
+            await asyncio.sleep(self.recovery_interval)
@@ -0,0 +1,67 @@
+"""
+Pay-table: win multipliers per slot symbol combination
+Rules are matched in order; "*" matches any symbol on that reel
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = "*"
+
+# Default rules: three of a kind only (x bet), roughly following the gift prize ranges;
+# paid in Stars only when no gift prize is in stock (see process_payment_update in main.py)
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"symbols": ["777", "777", "777"], "multiplier": 20},
+    {"symbols": ["lemon", "lemon", "lemon"], "multiplier": 15},
+    {"symbols": ["grape", "grape", "grape"], "multiplier": 8},
+    {"symbols": ["bar", "bar", "bar"], "multiplier": 6},
+]
+
+
+class PayTable:
+    """Ordered (pattern, multiplier) rules; the first matching rule pays"""
+
+    def __init__(self, rules: Sequence[Dict[str, Any]] = DEFAULT_RULES, source: str = "default"):
+        self.rules: Tuple[Tuple[Tuple[str, str, str], float], ...] = tuple(
+            self._parse_rule(rule) for rule in rules
+        )
+        self.source = source
+
+    @staticmethod
+    def _parse_rule(rule: Dict[str, Any]) -> Tuple[Tuple[str, str, str], float]:
+        symbols = tuple(str(s).lower() for s in rule["symbols"])
+        if len(symbols) != 3:
+            raise ValueError(f"Pay-table rule needs 3 symbols: {rule}")
+        multiplier = float(rule["multiplier"])
+        if multiplier < 0:
+            raise ValueError(f"Negative multiplier in pay-table rule: {rule}")
+        return symbols, multiplier
+
+    @classmethod
+    def from_file(cls, path: Path) -> "PayTable":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["rules"] if isinstance(data, dict) else data, str(path))
+
+    def multiplier(self, symbols: Sequence[str]) -> float:
+        for pattern, multiplier in self.rules:
+            if all(p == WILDCARD or p == s for p, s in zip(pattern, symbols)):
+                return multiplier
+        return 0.0
+
+    def win_amount(self, symbols: Sequence[str], bet: float) -> int:
+        """Whole Stars won for a bet on this combination"""
+        return int(bet * self.multiplier(symbols))
+
+
+def load_paytable(path: Optional[Path]) -> PayTable:
+    """Pay-table from PAYTABLE_FILE if configured, else the default rules"""
+    if path is None:
+        return PayTable()
+    table = PayTable.from_file(path)
+    logger.info(f"Pay-table loaded: {len(table.rules)} rules from {path}")
+    return table
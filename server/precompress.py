@@ -0,0 +1,50 @@
+"""
+Write .gz (and .br, when the brotli package is installed) next to every compressible
+file of the built client, for PrecompressedStaticFiles to serve
+
+    python precompress.py               # ../app/static
+    python precompress.py path/to/dist
+"""
+
+from pathlib import Path
+import gzip
+import sys
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path(__file__).parent.parent / "app" / "static"
+COMPRESSIBLE = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt", ".xml", ".ico", ".wasm"}
+MIN_SIZE = 1024
+
+
+def precompress(directory: Path) -> int:
+    """Compress files whose variants are missing or older; returns the number written"""
+    written = 0
+    for path in sorted(directory.rglob("*")):
+        if not path.is_file() or path.suffix not in COMPRESSIBLE or path.stat().st_size < MIN_SIZE:
+            continue
+        data = None
+        targets = [(path.with_name(path.name + ".gz"), lambda d: gzip.compress(d, 9, mtime=0))]
+        if brotli is not None:
+            targets.append((path.with_name(path.name + ".br"), lambda d: brotli.compress(d, quality=11)))
+        for target, compress in targets:
+            if target.exists() and target.stat().st_mtime >= path.stat().st_mtime:
+                continue
+            data = data if data is not None else path.read_bytes()
+            compressed = compress(data)
+            if len(compressed) >= len(data):
+                continue
+            target.write_bytes(compressed)
+            written += 1
+            print(f"{target.relative_to(directory)}: {len(data)} -> {len(compressed)} bytes")
+    return written
+
+
+if __name__ == "__main__":
+    directory = Path(sys.argv[1]) if len(sys.argv) > 1 else STATIC_DIR
+    if brotli is None:
+        print("brotli not installed, writing .gz only (pip install brotli)")
+    print(f"✅ {precompress(directory)} compressed files written in {directory}")
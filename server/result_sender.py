@@ -0,0 +1,123 @@
+"""
+Delivery of per-spin result messages to the dice channels
+inline:     reply to the dice before the spin returns (one extra round trip per spin)
+background: reply to the dice from a tracked task after the spin returns
+digest:     collect results per channel and post one summary message per interval
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import logging
+import os
+
+from send_scheduler import SendScheduler, PRIORITY_MESSAGE
+
+logger = logging.getLogger(__name__)
+
+RESULT_MESSAGE_MODE = os.getenv("RESULT_MESSAGE_MODE", "inline")
+RESULT_DIGEST_INTERVAL = float(os.getenv("RESULT_DIGEST_INTERVAL", "10"))
+RESULT_DIGEST_MAX_LINES = int(os.getenv("RESULT_DIGEST_MAX_LINES", "30"))
+
+RESULT_MODES = ("inline", "background", "digest")
+
+
+class ResultSender:
+    """Sends (or batches) result messages according to the configured mode"""
+
+    def __init__(
+        self,
+        scheduler: SendScheduler,
+        mode: str = RESULT_MESSAGE_MODE,
+        digest_interval: float = RESULT_DIGEST_INTERVAL,
+        digest_max_lines: int = RESULT_DIGEST_MAX_LINES,
+    ):
+        if mode not in RESULT_MODES:
+            raise ValueError(f"RESULT_MESSAGE_MODE must be one of {RESULT_MODES}, got {mode!r}")
+        self.scheduler = scheduler
+        self.mode = mode
+        self.digest_interval = digest_interval
+        self.digest_max_lines = digest_max_lines
+        self._tasks: Set[asyncio.Task] = set()
+        self._digest: Dict[str, List[str]] = defaultdict(list)
+        self._flusher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.sent = 0
+        self.failed = 0
+        self.digests_sent = 0
+
+    def start(self):
+        """Start the digest flusher when batching (FastAPI startup)"""
+        if self.mode == "digest" and self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Post pending digests and wait for in-flight sends (FastAPI shutdown)"""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        for channel in list(self._digest):
+            self._spawn(self._send_digest(channel))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, channel: str, dice_message_id: int, text: str, summary: str):
+        """Deliver one spin result: full text as a reply, or a summary line in the digest"""
+        if self.mode == "inline":
+            await self._send_reply(channel, dice_message_id, text)
+        elif self.mode == "background":
+            self._spawn(self._send_reply(channel, dice_message_id, text))
+        else:
+            lines = self._digest[channel]
+            lines.append(summary)
+            if len(lines) >= self.digest_max_lines:
+                self._spawn(self._send_digest(channel))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "in_flight": len(self._tasks),
+            "sent": self.sent,
+            "failed": self.failed,
+            "digests_sent": self.digests_sent,
+            "pending_digest_lines": sum(len(lines) for lines in self._digest.values()),
+        }
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, channel: str, payload: Dict[str, Any]) -> bool:
+        try:
+            data = await self.scheduler.send("sendMessage", payload, chat_id=channel, priority=PRIORITY_MESSAGE)
+        except Exception as e:
+            data = {"ok": False, "description": str(e)}
+        if data.get("ok"):
+            self.sent += 1
+            return True
+        self.failed += 1
+        logger.warning(f"Failed to send result message to {channel}: {data.get('description', data)}")
+        return False
+
+    async def _send_reply(self, channel: str, dice_message_id: int, text: str):
+        await self._send(channel, {"chat_id": channel, "text": text, "reply_to_message_id": dice_message_id})
+
+    async def _send_digest(self, channel: str):
+        lines = self._digest.pop(channel, None)
+        if not lines:
+            return
+        text = f"🎰 Results ({len(lines)} spins)\n━━━━━━━━━━━━━━\n" + "\n".join(lines)
+        if await self._send(channel, {"chat_id": channel, "text": text}):
+            self.digests_sent += 1
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.digest_interval)
+            for channel in list(self._digest):
+                self._spawn(self._send_digest(channel))
@@ -0,0 +1,278 @@
+"""
+Rate-limit-aware scheduler for outbound Telegram messages
+Per-chat and global token buckets, retry_after handling for 429s,
+and priorities so dice sends go out before cosmetic messages
+"""
+
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Optional, Set
+import asyncio
+import logging
+import os
+
+from telegram_client import TelegramClient, get_telegram_client
+
+logger = logging.getLogger(__name__)
+
+# Telegram limits: ~30 msg/s overall, ~20 msg/min per group/channel, ~1 msg/s per private chat
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_GROUP_RATE_PER_MIN = float(os.getenv("TELEGRAM_GROUP_RATE_PER_MIN", "20"))
+TELEGRAM_GROUP_BURST = float(os.getenv("TELEGRAM_GROUP_BURST", "3"))
+TELEGRAM_PRIVATE_RATE = float(os.getenv("TELEGRAM_PRIVATE_RATE", "1"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+TELEGRAM_SEND_MAX_QUEUE = int(os.getenv("TELEGRAM_SEND_MAX_QUEUE", "10000"))
+
+# Lower value is sent first
+PRIORITY_DICE = 0
+PRIORITY_MESSAGE = 1
+
+
+class SchedulerBusy(Exception):
+    """Raised when the outbound queue is full"""
+
+
+class TokenBucket:
+    """Classic token bucket; pause() empties it until a retry_after deadline"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = 0.0
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until one token is available (0 when it is available now)"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        self.blocked_until = max(self.blocked_until, until)
+        self.tokens = 0
+        self.updated = until
+
+
+class _Job:
+    __slots__ = ("method", "payload", "chat_id", "future", "attempts")
+
+    def __init__(self, method: str, payload: Dict[str, Any], chat_id: Any, future: asyncio.Future):
+        self.method = method
+        self.payload = payload
+        self.chat_id = chat_id
+        self.future = future
+        self.attempts = 0
+
+
+def is_group_chat(chat_id: Any) -> bool:
+    """Channels/groups are @usernames or negative ids; private chats are positive ids"""
+    if isinstance(chat_id, str):
+        return chat_id.startswith("@") or chat_id.startswith("-")
+    return isinstance(chat_id, int) and chat_id < 0
+
+
+class SendScheduler:
+    """
+    Single dispatcher task releasing queued Bot API calls as buckets allow
+    send() resolves with the Bot API response once the call has been made
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], TelegramClient] = get_telegram_client,
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        group_rate_per_min: float = TELEGRAM_GROUP_RATE_PER_MIN,
+        group_burst: float = TELEGRAM_GROUP_BURST,
+        private_rate: float = TELEGRAM_PRIVATE_RATE,
+        max_retries: int = TELEGRAM_MAX_RETRIES,
+        max_queue: int = TELEGRAM_SEND_MAX_QUEUE,
+    ):
+        self.client_factory = client_factory
+        self.group_rate = group_rate_per_min / 60
+        self.group_burst = group_burst
+        self.private_rate = private_rate
+        self.max_retries = max_retries
+        self.max_queue = max_queue
+        self._global = TokenBucket(global_rate, global_rate)
+        self._buckets: Dict[Any, TokenBucket] = {}
+        # priority -> chat_id -> FIFO of jobs
+        self._pending: Dict[int, "OrderedDict[Any, Deque[_Job]]"] = {}
+        self._queued = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.sent = 0
+        self.rate_limited = 0
+        self.retries_exhausted = 0
+
+    def start(self):
+        """Start the dispatcher (FastAPI startup)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop dispatching, wait for in-flight calls and fail whatever is still queued (FastAPI shutdown)"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # A call answered with 429 meanwhile goes back to the queue and is failed below
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+        for chats in self._pending.values():
+            for jobs in chats.values():
+                for job in jobs:
+                    if not job.future.done():
+                        job.future.set_exception(SchedulerBusy("Scheduler stopped"))
+        self._pending.clear()
+        self._queued = 0
+
+    async def send(
+        self,
+        method: str,
+        payload: Dict[str, Any],
+        chat_id: Any = None,
+        priority: int = PRIORITY_MESSAGE,
+    ) -> Dict[str, Any]:
+        """Queue a Bot API call for chat_id and wait for its response"""
+        if self._queued >= self.max_queue:
+            raise SchedulerBusy(f"Outbound Telegram queue full ({self._queued})")
+        job = _Job(method, payload, chat_id, asyncio.get_running_loop().create_future())
+        self._enqueue(priority, job)
+        return await job.future
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queued,
+            "in_flight": len(self._in_flight),
+            "queued_by_priority": {
+                priority: sum(len(jobs) for jobs in chats.values())
+                for priority, chats in sorted(self._pending.items())
+            },
+            "sent": self.sent,
+            "rate_limited": self.rate_limited,
+            "retries_exhausted": self.retries_exhausted,
+            "chats": len(self._buckets),
+        }
+
+    def _bucket(self, chat_id: Any) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if is_group_chat(chat_id):
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            else:
+                bucket = TokenBucket(self.private_rate, 1)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _enqueue(self, priority: int, job: _Job, front: bool = False):
+        chats = self._pending.setdefault(priority, OrderedDict())
+        jobs = chats.get(job.chat_id)
+        if jobs is None:
+            jobs = chats[job.chat_id] = deque()
+        if front:
+            jobs.appendleft(job)
+        else:
+            jobs.append(job)
+        self._queued += 1
+        self._wakeup.set()
+
+    def _dispatch_ready(self, now: float) -> Optional[float]:
+        """
+        Start every job whose buckets allow it
+        Returns seconds until the next job could go, or None when idle
+        """
+        while self._queued:
+            global_wait = self._global.wait_time(now)
+            if global_wait > 0:
+                return global_wait
+
+            picked = None
+            min_wait = None
+            for priority in sorted(self._pending):
+                chats = self._pending[priority]
+                for chat_id, jobs in chats.items():
+                    wait = 0.0 if chat_id is None else self._bucket(chat_id).wait_time(now)
+                    if wait == 0:
+                        picked = (priority, chat_id)
+                        break
+                    min_wait = wait if min_wait is None else min(min_wait, wait)
+                if picked:
+                    break
+            if picked is None:
+                return min_wait
+
+            priority, chat_id = picked
+            chats = self._pending[priority]
+            jobs = chats[chat_id]
+            job = jobs.popleft()
+            if jobs:
+                chats.move_to_end(chat_id)  # round-robin between chats
+            else:
+                del chats[chat_id]
+            self._queued -= 1
+
+            self._global.consume(now)
+            if chat_id is not None:
+                self._bucket(chat_id).consume(now)
+            task = asyncio.create_task(self._execute(priority, job))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+        return None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            delay = self._dispatch_ready(loop.time())
+            if delay is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _execute(self, priority: int, job: _Job):
+        job.attempts += 1
+        try:
+            data = await self.client_factory().call(job.method, job.payload)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+
+        if data.get("error_code") == 429:
+            self.rate_limited += 1
+            retry_after = float((data.get("parameters") or {}).get("retry_after", 1))
+            until = asyncio.get_running_loop().time() + retry_after
+            if job.chat_id is None:
+                self._global.pause(until)
+            else:
+                self._bucket(job.chat_id).pause(until)
+            logger.warning(f"Telegram 429 on {job.method} to {job.chat_id}, retry after {retry_after}s")
+            if job.attempts <= self.max_retries:
+                self._enqueue(priority, job, front=True)
+                return
+            self.retries_exhausted += 1
+        else:
+            self.sent += 1
+
+        if not job.future.done():
+            job.future.set_result(data)
@@ -0,0 +1,81 @@
+"""
+Production entry point: several uvicorn worker processes sharing one port
+
+    python serve.py                    # one worker per CPU core
+    python serve.py --workers 4 --port 5174
+
+Before the workers start, this process:
+- creates the database tables once, so workers do not race on CREATE TABLE
+- enables the cache bus, so per-worker caches are invalidated across processes
+- divides the Telegram send rates between workers, since every worker runs its
+  own scheduler and the limits are per bot
+- points every worker at one empty metrics directory, so /metrics adds up all workers
+
+With gunicorn instead (pip install gunicorn), set the same environment yourself:
+    CACHE_BUS_ENABLED=1 METRICS_MULTIPROC_DIR=/tmp/phs-metrics gunicorn main:app -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:5174
+"""
+
+from pathlib import Path
+import argparse
+import logging
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Send-rate settings split between workers, with their single-process defaults
+SHARED_RATES = {
+    "TELEGRAM_GLOBAL_RATE": 30.0,
+    "TELEGRAM_GROUP_RATE_PER_MIN": 20.0,
+    "TELEGRAM_GROUP_BURST": 3.0,
+    "TELEGRAM_PRIVATE_RATE": 1.0,
+}
+
+
+def share_rates(workers: int):
+    """Give each worker 1/N of every send rate (bursts never below one message)"""
+    for name, default in SHARED_RATES.items():
+        total = float(os.getenv(name, default))
+        share = total / workers
+        if name == "TELEGRAM_GROUP_BURST":
+            share = max(1.0, share)
+        os.environ[name] = repr(share)
+
+
+def prepare_metrics_dir() -> str:
+    """METRICS_MULTIPROC_DIR (or a new temporary directory) without snapshots of earlier runs"""
+    directory = Path(os.getenv("METRICS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="phs-metrics-"))
+    directory.mkdir(parents=True, exist_ok=True)
+    for snapshot in directory.glob("*.json"):
+        snapshot.unlink()
+    os.environ["METRICS_MULTIPROC_DIR"] = str(directory)
+    return str(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5174")))
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("serve")
+
+    from database import init_db
+    init_db()
+
+    if args.workers > 1:
+        os.environ["CACHE_BUS_ENABLED"] = "1"
+        share_rates(args.workers)
+        logger.info(f"Worker metrics are merged through {prepare_metrics_dir()}")
+
+    import uvicorn
+    logger.info(f"🚀 Starting {args.workers} workers on http://{args.host}:{args.port}")
+    uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+User session store backed by the users table
+Logins upsert one row by telegram_id; an LRU cache skips unchanged profiles
+"""
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import json
+import logging
+import os
+
+from cache import LRUCache
+from cache_bus import CacheBus
+from database import AsyncSessionLocal, SessionLocal, engine
+from models import User
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "10000"))
+SESSIONS_FILE = Path(__file__).parent / "sessions.json"
+
+PROFILE_FIELDS = ("username", "first_name", "last_name", "photo_url", "language_code")
+
+
+def _insert(table):
+    """Dialect-specific INSERT supporting ON CONFLICT DO UPDATE"""
+    if engine.dialect.name == "postgresql":
+        return postgresql.insert(table)
+    return sqlite.insert(table)
+
+
+def upsert_user_stmt(telegram_id: int, profile: Dict[str, Any]):
+    """INSERT ... ON CONFLICT (telegram_id) DO UPDATE returning users.id"""
+    fields = {key: profile.get(key) for key in PROFILE_FIELDS}
+    stmt = _insert(User).values(telegram_id=telegram_id, **fields)
+    return stmt.on_conflict_do_update(
+        index_elements=[User.telegram_id],
+        set_={**fields, "updated_at": datetime.utcnow()},
+    ).returning(User.id)
+
+
+class SessionStore:
+    """Upsert-by-telegram_id session store with an in-process LRU in front"""
+
+    def __init__(self, bus: Optional[CacheBus] = None, cache_size: int = SESSION_CACHE_SIZE):
+        # telegram_id -> (users.id, profile snapshot)
+        self._cache = LRUCache(cache_size)
+        self.bus = bus
+        if bus is not None:
+            # Another worker stored a newer profile; our snapshot may hide the next change
+            bus.subscribe("session", lambda key: self._cache.pop(int(key)))
+
+    async def login(self, telegram_id: int, profile: Dict[str, Any]) -> int:
+        """Record a login; the database is only touched when the profile changed"""
+        snapshot = tuple(profile.get(key) for key in PROFILE_FIELDS)
+        cached: Optional[Tuple[int, tuple]] = self._cache.get(telegram_id)
+        if cached and cached[1] == snapshot:
+            return cached[0]
+
+        async with AsyncSessionLocal() as db:
+            user_id = (await db.execute(upsert_user_stmt(telegram_id, profile))).scalar_one()
+            await db.commit()
+        self._cache.set(telegram_id, (user_id, snapshot))
+        if self.bus is not None:
+            self.bus.publish("session", telegram_id)
+        return user_id
+
+    async def user_pk(self, telegram_id: int) -> int:
+        """users.id for a telegram_id, creating a bare row on first sight"""
+        cached = self._cache.get(telegram_id)
+        if cached:
+            return cached[0]
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                _insert(User).values(telegram_id=telegram_id)
+                .on_conflict_do_nothing(index_elements=[User.telegram_id])
+            )
+            user_id = (await db.execute(
+                select(User.id).where(User.telegram_id == telegram_id)
+            )).scalar_one()
+            await db.commit()
+        self._cache.set(telegram_id, (user_id, None))
+        return user_id
+
+
+def import_sessions_file(path: Path = SESSIONS_FILE) -> int:
+    """One-shot import of a legacy sessions.json into the users table"""
+    with open(path, 'r', encoding='utf-8') as f:
+        sessions = json.load(f)
+
+    db = SessionLocal()
+    try:
+        for key, session in sessions.items():
+            db.execute(upsert_user_stmt(int(session.get("id") or key), session))
+        db.commit()
+    finally:
+        db.close()
+
+    logger.info(f"Imported {len(sessions)} sessions from {path}")
+    return len(sessions)
+
+
+if __name__ == "__main__":
+    # Usage: python session_store.py [path/to/sessions.json]
+    import sys
+    from database import init_db
+
+    logging.basicConfig(level=logging.INFO)
+    init_db()
+    count = import_sessions_file(Path(sys.argv[1]) if len(sys.argv) > 1 else SESSIONS_FILE)
+    print(f"✅ Imported {count} sessions")
@@ -0,0 +1,115 @@
+"""
+Offline pay-table simulator
+Runs vectorized Monte Carlo spins over the compiled dice table and reports RTP,
+variance and house edge next to the exact values for a uniform 1..64 dice
+
+Usage:
+    python simulate.py --spins 50000000
+    python simulate.py --paytable paytable.json --mapping mapping.json --seed 1
+
+Requires numpy (pip install numpy); the server itself does not
+"""
+
+from pathlib import Path
+from typing import Any, Dict, Optional
+import argparse
+import json
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from dice_table import DICE_VALUES, DiceTable
+from paytable import load_paytable
+
+BASE_DIR = Path(__file__).parent
+CHUNK_SIZE = 10_000_000
+
+
+def payout_vector(table: DiceTable) -> "np.ndarray":
+    """Multiplier (x bet) for each dice value, indexed by value - 1"""
+    return np.array([outcome.multiplier for outcome in table.outcomes], dtype=np.float64)
+
+
+def exact_stats(payouts: "np.ndarray") -> Dict[str, float]:
+    """RTP and per-spin variance of the multiplier for a fair 64-sided dice"""
+    rtp = float(payouts.mean())
+    return {
+        "rtp": rtp,
+        "variance": float((payouts ** 2).mean() - rtp ** 2),
+        "hit_rate": float((payouts > 0).mean()),
+        "house_edge": 1.0 - rtp,
+    }
+
+
+def simulate(payouts: "np.ndarray", spins: int, seed: Optional[int] = None, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    """Monte Carlo over `spins` dice rolls, in chunks to bound memory"""
+    rng = np.random.default_rng(seed)
+    total = 0.0
+    total_sq = 0.0
+    hits = 0
+    remaining = spins
+    started = time.perf_counter()
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        won = payouts[rng.integers(0, DICE_VALUES, size=n)]
+        total += float(won.sum())
+        total_sq += float(np.square(won).sum())
+        hits += int(np.count_nonzero(won))
+        remaining -= n
+    elapsed = time.perf_counter() - started
+
+    rtp = total / spins
+    variance = total_sq / spins - rtp ** 2
+    return {
+        "spins": spins,
+        "rtp": rtp,
+        "variance": variance,
+        "std_error": (variance / spins) ** 0.5,
+        "hit_rate": hits / spins,
+        "house_edge": 1.0 - rtp,
+        "seconds": elapsed,
+        "spins_per_second": spins / elapsed if elapsed else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a pay-table against the dice mapping")
+    parser.add_argument("--spins", type=int, default=10_000_000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--mapping", type=Path, default=BASE_DIR / "mapping.json")
+    parser.add_argument("--paytable", type=Path, default=None, help="pay-table JSON (default: built-in rules)")
+    parser.add_argument("--json", action="store_true", help="print machine-readable output")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("numpy is required: pip install numpy")
+
+    paytable = load_paytable(args.paytable)
+    table = DiceTable.from_file(args.mapping, paytable) if args.mapping.exists() else DiceTable.builtin(paytable)
+    payouts = payout_vector(table)
+
+    report = {
+        "paytable": paytable.source,
+        "mapping": table.source,
+        "exact": exact_stats(payouts),
+        "simulated": simulate(payouts, args.spins, args.seed),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    exact, sim = report["exact"], report["simulated"]
+    print(f"Pay-table: {report['paytable']}   Mapping: {report['mapping']}")
+    print(f"{'':12}{'exact':>12}{'simulated':>14}")
+    print(f"{'RTP':12}{exact['rtp']:>12.4%}{sim['rtp']:>14.4%}  ± {1.96 * sim['std_error']:.4%}")
+    print(f"{'House edge':12}{exact['house_edge']:>12.4%}{sim['house_edge']:>14.4%}")
+    print(f"{'Variance':12}{exact['variance']:>12.4f}{sim['variance']:>14.4f}")
+    print(f"{'Hit rate':12}{exact['hit_rate']:>12.4%}{sim['hit_rate']:>14.4%}")
+    print(f"{sim['spins']:,} spins in {sim['seconds']:.2f}s ({sim['spins_per_second']:,.0f} spins/s)")
+
+
+if __name__ == "__main__":
+    main()
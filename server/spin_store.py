@@ -0,0 +1,109 @@
+"""
+Spin persistence and keyset-paginated history queries
+Pages are ordered by (created_at, id) descending and resumed from an opaque cursor;
+first pages, which every client polls, can be served from a short-lived cache
+"""
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import logging
+import os
+
+from cache_backend import CacheBackend
+from models import Spin, User
+
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 100
+SPIN_HISTORY_CACHE_TTL = float(os.getenv("SPIN_HISTORY_CACHE_TTL", "2"))
+
+
+def encode_cursor(created_at: datetime, spin_id: int) -> str:
+    """Opaque cursor pointing just past the given spin"""
+    raw = f"{created_at.isoformat()}|{spin_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed input"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, spin_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), int(spin_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def serialize_spin(spin: Spin, telegram_id: int) -> Dict[str, Any]:
+    """Spin row in the shape the client expects (see client/src/lib/types.ts)"""
+    return {
+        "id": spin.id,
+        "userId": telegram_id,
+        "betAmount": spin.bet_amount,
+        "result": {
+            "symbols": spin.symbols,
+            "diceValue": spin.dice_value,
+            "isWin": spin.is_win,
+            "isJackpot": spin.is_jackpot,
+            "win_amount": spin.win_amount,
+            "diceMessageId": spin.telegram_message_id,
+            "diceChatId": spin.telegram_chat_id,
+        },
+        "createdAt": spin.created_at.isoformat(),
+    }
+
+
+async def fetch_spins(
+    db: AsyncSession,
+    telegram_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of spins, newest first, optionally for a single user
+    Returns (spins, next_cursor); next_cursor is None on the last page
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = select(Spin, User.telegram_id).join(User, Spin.user_id == User.id)
+    if telegram_id is not None:
+        query = query.where(User.telegram_id == telegram_id)
+    if cursor:
+        created_at, spin_id = decode_cursor(cursor)
+        query = query.where(tuple_(Spin.created_at, Spin.id) < tuple_(created_at, spin_id))
+    query = query.order_by(Spin.created_at.desc(), Spin.id.desc()).limit(limit + 1)
+
+    rows = (await db.execute(query)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.created_at, last.id)
+
+    return [serialize_spin(spin, tg_id) for spin, tg_id in rows], next_cursor
+
+
+
+async def fetch_spins_cached(
+    cache: CacheBackend,
+    db: AsyncSession,
+    telegram_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = 10,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    fetch_spins, with first pages cached for the cache's ttl (new spins show up that late)
+    Later pages are stable under keyset pagination but rarely re-read, so they skip the cache
+    """
+    if cursor or not cache.ttl:
+        return await fetch_spins(db, telegram_id, cursor, limit)
+
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    key = f"{'all' if telegram_id is None else telegram_id}:{limit}"
+    spins, next_cursor = await cache.get_or_load(
+        key, lambda: fetch_spins(db, telegram_id, None, limit)
+    )
+    return spins, next_cursor
@@ -0,0 +1,138 @@
+"""
+Serving the built client
+index.html is held in memory (identity + compressed) with a strong ETag and reloaded
+when the file changes; static assets are served from precompressed .br/.gz siblings
+when the client accepts them (create those with precompress.py after a build)
+"""
+
+from pathlib import Path
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+import gzip
+import hashlib
+import logging
+import stat
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Vite puts content-hashed files under assets/, so they never change under the same URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Preferred order when the client accepts several encodings
+ENCODINGS: Tuple[Tuple[str, str], ...] = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Encodings from an Accept-Encoding header, without the ones refused with q=0"""
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if name:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def etag_matches(if_none_match: Optional[str], etags: Set[str]) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") in etags for tag in if_none_match.split(","))
+
+
+class IndexPage:
+    """index.html in memory: {encoding: (body, etag)}, swapped in one assignment on load()"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._variants: Dict[str, Tuple[bytes, str]] = {}
+        self._etags: Set[str] = set()
+        self.files: FrozenSet[str] = frozenset()
+        self.loads = 0
+        self.load()
+
+    @property
+    def available(self) -> bool:
+        return bool(self._variants)
+
+    def load(self, *_) -> bool:
+        """(Re)read index.html and the list of top-level files next to it"""
+        try:
+            body = self.path.read_bytes()
+        except OSError:
+            if self._variants:
+                logger.warning(f"{self.path} disappeared, keeping the cached copy")
+            return False
+
+        tag = hashlib.sha256(body).hexdigest()[:32]
+        variants = {"identity": (body, f'"{tag}"'), "gzip": (gzip.compress(body, 9, mtime=0), f'"{tag}-gz"')}
+        if brotli is not None:
+            variants["br"] = (brotli.compress(body), f'"{tag}-br"')
+        self._variants = variants
+        self._etags = {etag for _, etag in variants.values()}
+        self.files = frozenset(
+            entry.name for entry in self.path.parent.iterdir()
+            if entry.is_file() and not entry.name.endswith((".br", ".gz"))
+        )
+        self.loads += 1
+        logger.info(f"Loaded {self.path} ({len(body)} bytes, ETag {tag[:8]})")
+        return True
+
+    def response(self, request: Request) -> Response:
+        accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((name for name, _ in ENCODINGS if name in accepted and name in self._variants), "identity")
+        body, etag = self._variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        if etag_matches(request.headers.get("if-none-match"), self._etags):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type="text/html; charset=utf-8", headers=headers)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that prefers a .br/.gz sibling of the requested file when accepted"""
+
+    def __init__(self, *args, cache_control: str = REVALIDATE_CACHE_CONTROL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        if scope["method"] in ("GET", "HEAD"):
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for encoding, suffix in ENCODINGS:
+                if encoding not in accepted:
+                    continue
+                try:
+                    full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+                except OSError:
+                    break
+                if stat_result and stat.S_ISREG(stat_result.st_mode):
+                    response = self.file_response(full_path, stat_result, scope)
+                    # FileResponse guesses "x.js.br" as the JavaScript type with encoding br
+                    if response.status_code == 200:
+                        response.headers["content-encoding"] = encoding
+                    return self._finish(response)
+
+        return self._finish(await super().get_response(path, scope))
+
+    def _finish(self, response: Response) -> Response:
+        if response.status_code in (200, 304):
+            response.headers["cache-control"] = self.cache_control
+            response.headers["vary"] = "Accept-Encoding"
+        return response
@@ -0,0 +1,114 @@
+"""
+Shared Telegram Bot API client
+One pooled HTTP/2 keep-alive client for the whole application lifetime
+"""
+
+import httpx
+import os
+import logging
+from time import perf_counter
+from typing import Optional, Dict, Any
+
+from metrics import TELEGRAM_REQUEST_SECONDS, TELEGRAM_ERRORS, TELEGRAM_RATE_LIMITED
+
+logger = logging.getLogger(__name__)
+
+# Environment variables
+BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "")
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org").rstrip("/")
+TELEGRAM_HTTP2 = os.getenv("TELEGRAM_HTTP2", "1") not in ("0", "false", "False")
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "100"))
+TELEGRAM_MAX_KEEPALIVE = int(os.getenv("TELEGRAM_MAX_KEEPALIVE", "20"))
+TELEGRAM_KEEPALIVE_EXPIRY = float(os.getenv("TELEGRAM_KEEPALIVE_EXPIRY", "60"))
+TELEGRAM_TIMEOUT = float(os.getenv("TELEGRAM_TIMEOUT", "30"))
+TELEGRAM_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_CONNECT_TIMEOUT", "5"))
+
+
+class TelegramClient:
+    """Thin wrapper around a pooled httpx.AsyncClient bound to one bot token"""
+
+    def __init__(
+        self,
+        token: str = BOT_TOKEN,
+        api_url: str = TELEGRAM_API_URL,
+        http2: bool = TELEGRAM_HTTP2,
+        max_connections: int = TELEGRAM_MAX_CONNECTIONS,
+        max_keepalive: int = TELEGRAM_MAX_KEEPALIVE,
+        keepalive_expiry: float = TELEGRAM_KEEPALIVE_EXPIRY,
+        timeout: float = TELEGRAM_TIMEOUT,
+        connect_timeout: float = TELEGRAM_CONNECT_TIMEOUT,
+        verify: bool = True,
+    ):
+        self._client = httpx.AsyncClient(
+            base_url=f"{api_url}/bot{token}/",
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            verify=verify,
+        )
+
+    async def call(self, method: str, payload: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Call a Bot API method and return the decoded JSON response
+        Transport errors are raised as httpx.HTTPError, and so is a body that is not a
+        JSON object (e.g. an HTML 502 page from a proxy), as httpx.DecodingError
+        """
+        started = perf_counter()
+        try:
+            response = await self._client.post(method, json=payload or {})
+            try:
+                data = response.json()
+            except ValueError as e:
+                raise httpx.DecodingError(
+                    f"{method}: HTTP {response.status_code} with a non-JSON body", request=response.request
+                ) from e
+            if not isinstance(data, dict):
+                raise httpx.DecodingError(f"{method}: HTTP {response.status_code} without a JSON object", request=response.request)
+        except Exception:
+            TELEGRAM_ERRORS.labels(method).inc()
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.labels(method).observe(perf_counter() - started)
+        
+        if not data.get("ok"):
+            TELEGRAM_ERRORS.labels(method).inc()
+            if data.get("error_code") == 429:
+                TELEGRAM_RATE_LIMITED.labels(method).inc()
+        return data
+
+    async def aclose(self):
+        """Close all pooled connections"""
+        await self._client.aclose()
+
+
+_client: Optional[TelegramClient] = None
+
+
+def init_telegram_client(**kwargs) -> TelegramClient:
+    """Create the application-wide client (called at FastAPI startup)"""
+    global _client
+    if _client is None:
+        _client = TelegramClient(**kwargs)
+        logger.info(
+            f"Telegram client ready: {TELEGRAM_API_URL} "
+            f"(http2={TELEGRAM_HTTP2}, max_connections={TELEGRAM_MAX_CONNECTIONS})"
+        )
+    return _client
+
+
+def get_telegram_client() -> TelegramClient:
+    """Return the application-wide client, creating it on first use"""
+    return _client or init_telegram_client()
+
+
+async def close_telegram_client():
+    """Close the application-wide client (called at FastAPI shutdown)"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Telegram client closed")
@@ -0,0 +1,92 @@
+"""
+Typed decoding of the Telegram Update subset the webhook handles
+Raw bodies are screened for the update types we act on before any JSON parsing; the rest
+are decoded straight from bytes into msgspec structs, skipping fields we do not declare
+"""
+
+from typing import Optional, Union
+import logging
+
+import msgspec
+
+logger = logging.getLogger(__name__)
+
+# Keys that only occur in bodies we act on; everything else is acknowledged unparsed
+HANDLED_MARKERS = (b'"successful_payment"', b'"pre_checkout_query"')
+
+
+class TelegramUser(msgspec.Struct):
+    id: int
+
+
+class Chat(msgspec.Struct):
+    id: int
+    type: Optional[str] = None
+
+
+class SuccessfulPayment(msgspec.Struct):
+    total_amount: int
+    telegram_payment_charge_id: str
+    currency: str = "XTR"
+    invoice_payload: str = ""
+    provider_payment_charge_id: Optional[str] = None
+
+
+class Message(msgspec.Struct):
+    message_id: int
+    chat: Chat
+    from_user: Optional[TelegramUser] = msgspec.field(default=None, name="from")
+    successful_payment: Optional[SuccessfulPayment] = None
+
+
+class PreCheckoutQuery(msgspec.Struct):
+    id: str
+    from_user: Optional[TelegramUser] = msgspec.field(default=None, name="from")
+    currency: str = "XTR"
+    total_amount: int = 0
+    invoice_payload: str = ""
+
+
+class Update(msgspec.Struct):
+    update_id: int
+    message: Optional[Message] = None
+    pre_checkout_query: Optional[PreCheckoutQuery] = None
+
+
+class InvoicePayload(msgspec.Struct):
+    """
+    JSON payload of our invoice links: pooled links carry a signed nonce (see invoice_links.py),
+    links created before the pool carry userId ("unknown" when no user id was given)
+    """
+
+    userId: Union[int, str, None] = None
+    betAmount: int = 0
+    nonce: Optional[str] = None
+    sig: Optional[str] = None
+
+
+_update_decoder = msgspec.json.Decoder(Update)
+_payload_decoder = msgspec.json.Decoder(InvoicePayload)
+
+
+def is_handled(body: bytes) -> bool:
+    """Cheap byte scan: False means the update needs no decoding at all"""
+    return any(marker in body for marker in HANDLED_MARKERS)
+
+
+def decode_update(body: bytes) -> Optional[Update]:
+    """Update for bodies we act on, None for the rest; raises msgspec.DecodeError when malformed"""
+    if not is_handled(body):
+        return None
+    return _update_decoder.decode(body)
+
+
+def parse_invoice_payload(payload: str) -> InvoicePayload:
+    """Invoice payload fields; an unreadable payload yields the defaults"""
+    if not payload:
+        return InvoicePayload()
+    try:
+        return _payload_decoder.decode(payload)
+    except msgspec.DecodeError as e:
+        logger.warning(f"Failed to parse invoice payload {payload!r}: {e}")
+        return InvoicePayload()
@@ -6,10 +6,16 @@ Run this to test the API endpoints
 import httpx
 import asyncio
 import json
+import os
+import uuid
 from datetime import datetime
 
 
+# A script against a running server (python test_api.py), not a pytest module
+__test__ = False
+
 BASE_URL = "http://localhost:5174"
+WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", os.getenv("WEBHOOK_SECRET", ""))
 
 
 async def test_status():
@@ -97,6 +103,60 @@ async def test_send_dice():
             return False
 
 
+async def _history_count(client: httpx.AsyncClient, user_id: int) -> int:
+    response = await client.get(f"{BASE_URL}/slots/history", params={"user_id": user_id, "limit": 100})
+    return len(response.json()["history"])
+
+
+async def test_webhook_replay():
+    """
+    Replay one successful_payment update concurrently against one server; exactly one spin
+    must happen (test_payment_dedup.py covers the unique claim across separate workers)
+    """
+    print("\n🧪 Testing /api/telegram-webhook duplicate delivery...")
+    
+    user_id = 987654321
+    charge_id = f"test-charge-{uuid.uuid4()}"
+    update = {
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "chat": {"id": user_id},
+            "from": {"id": user_id},
+            "successful_payment": {
+                "currency": "XTR",
+                "total_amount": 50,
+                "invoice_payload": json.dumps({"userId": user_id, "betAmount": 50}),
+                "telegram_payment_charge_id": charge_id
+            }
+        }
+    }
+    headers = {"x-telegram-bot-api-secret-token": WEBHOOK_SECRET} if WEBHOOK_SECRET else {}
+    
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        try:
+            before = await _history_count(client, user_id)
+            
+            # Concurrent redeliveries, then a late one after processing
+            responses = await asyncio.gather(*(
+                client.post(f"{BASE_URL}/api/telegram-webhook", json=update, headers=headers)
+                for _ in range(20)
+            ))
+            await asyncio.sleep(2)
+            late = await client.post(f"{BASE_URL}/api/telegram-webhook", json=update, headers=headers)
+            await asyncio.sleep(1)
+            
+            after = await _history_count(client, user_id)
+            statuses = {r.status_code for r in responses} | {late.status_code}
+            print(f"   Statuses: {sorted(statuses)}")
+            print(f"   Spins recorded: {after - before} (expected 1)")
+            return statuses == {200} and after - before == 1
+        except Exception as e:
+            print(f"   ❌ Error: {e}")
+            print("   Note: This requires a configured bot (fake_telegram.py works) and channel ID")
+            return False
+
+
 async def test_docs():
     """Test API documentation"""
     print("\n🧪 Testing /docs endpoint...")
@@ -124,6 +184,7 @@ async def main():
     results.append(("Telegram Auth", await test_auth()))
     results.append(("Create Invoice", await test_create_invoice()))
     results.append(("Send Dice", await test_send_dice()))
+    results.append(("Webhook Replay", await test_webhook_replay()))
     
     # Summary
     print("\n" + "=" * 60)
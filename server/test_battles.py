@@ -0,0 +1,251 @@
+"""
+Tests for battles.py with a scripted die and a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_battles.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select
+
+from battles import BattleService, BattleUnavailable
+from conftest import create_user
+from database import AsyncSessionLocal
+from ledger import InsufficientFunds, Ledger
+from models import Battle, Transaction, User
+
+
+class Dice:
+    """
+    Roll stand-in throwing the given values in order (an exception among them fails that throw);
+    optionally waits on gate before each throw
+    """
+
+    def __init__(self, *values, gate: asyncio.Event = None, fail: Exception = None):
+        self.values = list(values)
+        self.gate = gate
+        self.fail = fail
+        self.thrown = 0
+
+    async def __call__(self):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail is not None:
+            raise self.fail
+        value = self.values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        self.thrown += 1
+        return value, 1000 + self.thrown
+
+
+async def balances(*user_ids):
+    async with AsyncSessionLocal() as db:
+        rows = dict((await db.execute(select(User.id, User.balance).where(User.id.in_(user_ids)))).all())
+    return [rows[user_id] for user_id in user_ids]
+
+
+async def battle_row(battle_id: int) -> Battle:
+    async with AsyncSessionLocal() as db:
+        return await db.get(Battle, battle_id)
+
+
+def test_match_fights_the_oldest_battle_and_pays_the_winner(run_db):
+    async def main():
+        dice = Dice(3, 5)  # creator throws 3, opponent 5
+        service = BattleService(Ledger(), dice)
+        creator, opponent = await create_user(1, 100), await create_user(2, 100)
+
+        opened = await service.match(creator, 1, 40)  # nobody waiting: opens one
+        assert opened["status"] == "waiting" and opened["balance"] == 60
+        result = await service.match(opponent, 2, 40)
+
+        assert result["id"] == opened["id"]
+        assert result["winnerId"] == 2
+        assert result["creatorResult"] == {"value": 3, "messageId": 1001}
+        assert result["opponentResult"] == {"value": 5, "messageId": 1002}
+        assert result["balance"] == 140
+        assert await balances(creator, opponent) == [60, 140]
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.opponent_id, battle.winner_id) == ("completed", opponent, opponent)
+        assert service.open_battles() == []
+        assert service.stats()["completed"] == 1
+
+    run_db(main)
+
+
+def test_join_of_a_player_short_of_stars_throws_no_dice(run_db):
+    async def main():
+        dice = Dice()
+        service = BattleService(Ledger(), dice)
+        creator, opponent = await create_user(1, 100), await create_user(2, 10)
+        opened = await service.create(creator, 1, 40)
+
+        with pytest.raises(InsufficientFunds):
+            await service.join(opened["id"], opponent, 2)
+
+        assert dice.thrown == 0
+        assert await balances(creator, opponent) == [60, 10]
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.opponent_id) == ("waiting", None)
+        assert [open_battle["id"] for open_battle in service.open_battles()] == [opened["id"]]
+        with pytest.raises(ValueError):
+            await service.join(opened["id"], creator, 1)
+
+    run_db(main)
+
+
+def test_battle_is_claimed_and_staked_before_the_dice_are_thrown(run_db):
+    async def main():
+        gate = asyncio.Event()
+        dice = Dice(6, 2, gate=gate)
+        ledger = Ledger()
+        first, second = BattleService(ledger, dice), BattleService(ledger, dice)  # two workers
+        creator, opponent, late = await create_user(1, 100), await create_user(2, 100), await create_user(3, 100)
+        opened = await first.create(creator, 1, 40)
+        await second.start()
+
+        fight = asyncio.create_task(first.join(opened["id"], opponent, 2))
+        while (await battle_row(opened["id"])).status == "waiting":
+            await asyncio.sleep(0.01)
+        # The dice are in flight: the stake and the claim are already committed
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.opponent_id) == ("active", opponent)
+        assert await balances(creator, opponent) == [60, 60]
+        with pytest.raises(BattleUnavailable):
+            await second.join(opened["id"], late, 3)
+        assert await balances(late) == [100]
+
+        gate.set()
+        result = await fight
+        assert result["winnerId"] == 1
+        assert await balances(creator, opponent) == [140, 60]
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.winner_id, battle.opponent_result["value"]) == ("completed", creator, 2)
+        assert second.stats()["conflicts"] == 1
+
+    run_db(main)
+
+
+def test_draw_refunds_both_stakes(run_db):
+    async def main():
+        dice = Dice(4, 4, 2, 2, 6, 6)  # three ties in a row
+        service = BattleService(Ledger(), dice)
+        creator, opponent = await create_user(1, 100), await create_user(2, 100)
+        opened = await service.create(creator, 1, 40)
+
+        result = await service.join(opened["id"], opponent, 2)
+
+        assert result["winnerId"] is None and result["balance"] == 100
+        assert await balances(creator, opponent) == [100, 100]
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.winner_id) == ("completed", None)
+        assert service.stats()["draws"] == 1 and service.stats()["throws"] == 3
+
+    run_db(main)
+
+
+def test_cancel_refunds_the_creator_once(run_db):
+    async def main():
+        service = BattleService(Ledger(), Dice())
+        creator, other = await create_user(1, 100), await create_user(2, 100)
+        opened = await service.create(creator, 1, 40)
+
+        with pytest.raises(LookupError):
+            await service.cancel(opened["id"], other)
+        result = await service.cancel(opened["id"], creator)
+        assert result["status"] == "cancelled" and result["balance"] == 100
+        assert (await battle_row(opened["id"])).status == "cancelled"
+        with pytest.raises(LookupError):
+            await service.cancel(opened["id"], creator)
+        assert await balances(creator) == [100]
+
+    run_db(main)
+
+
+def test_throw_failing_before_any_die_is_posted_reopens_the_battle(run_db):
+    async def main():
+        service = BattleService(Ledger(), Dice(fail=RuntimeError("sendDice failed")))
+        creator, opponent = await create_user(1, 100), await create_user(2, 100)
+        opened = await service.create(creator, 1, 40)
+
+        with pytest.raises(RuntimeError):
+            await service.join(opened["id"], opponent, 2)
+
+        assert await balances(creator, opponent) == [60, 100]
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.opponent_id, battle.completed_at) == ("waiting", None, None)
+        assert [open_battle["id"] for open_battle in service.open_battles()] == [opened["id"]]
+
+    run_db(main)
+
+
+def test_failed_throw_after_a_posted_tie_settles_as_a_draw(run_db):
+    async def main():
+        dice = Dice(4, 4, 6, RuntimeError("sendDice failed"))  # the second round's second die fails
+        service = BattleService(Ledger(), dice)
+        creator, opponent = await create_user(1, 100), await create_user(2, 100)
+        opened = await service.create(creator, 1, 40)
+
+        result = await service.join(opened["id"], opponent, 2)
+
+        assert result["winnerId"] is None
+        assert (result["creatorResult"], result["opponentResult"]) == (
+            {"value": 4, "messageId": 1001}, {"value": 4, "messageId": 1002},
+        )
+        assert await balances(creator, opponent) == [100, 100]
+        battle = await battle_row(opened["id"])
+        assert (battle.status, battle.winner_id, battle.creator_result["value"]) == ("completed", None, 4)
+        assert service.open_battles() == []
+        assert service.stats()["draws"] == 1
+
+    run_db(main)
+
+
+def test_round_with_one_die_posted_is_cancelled_not_reopened(run_db):
+    async def main():
+        dice = Dice(5, RuntimeError("sendDice failed"))  # the creator's die is already in the channel
+        service = BattleService(Ledger(), dice)
+        creator, opponent = await create_user(1, 100), await create_user(2, 100)
+        opened = await service.create(creator, 1, 40)
+
+        with pytest.raises(RuntimeError):
+            await service.join(opened["id"], opponent, 2)
+
+        assert await balances(creator, opponent) == [100, 100]
+        assert (await battle_row(opened["id"])).status == "cancelled"
+        assert service.open_battles() == []
+        with pytest.raises(LookupError):
+            await service.join(opened["id"], opponent, 2)
+
+    run_db(main)
+
+
+def test_battles_abandoned_mid_fight_are_refunded_on_startup(run_db):
+    async def main():
+        ledger = Ledger()
+        creator, opponent = await create_user(1, 60), await create_user(2, 60)
+        async with AsyncSessionLocal() as db:
+            claimed = {"creator_id": creator, "opponent_id": opponent, "bet_amount": 40, "status": "active"}
+            stale, recent = (await db.execute(insert(Battle).returning(Battle.id), [
+                {**claimed, "completed_at": datetime.utcnow() - timedelta(seconds=600)},
+                {**claimed, "completed_at": datetime.utcnow()},
+            ])).scalars().all()
+            await db.commit()
+
+        service = BattleService(ledger, Dice())
+        await service.start()
+
+        assert await balances(creator, opponent) == [100, 100]
+        assert (await battle_row(stale)).status == "cancelled"
+        assert (await battle_row(recent)).status == "active"  # may still be fought by another worker
+        assert service.open_battles() == []
+        assert await service.recover() == 0
+        async with AsyncSessionLocal() as db:
+            refunds = (await db.execute(
+                select(Transaction.transaction_type).where(Transaction.transaction_type == "battle_refund")
+            )).scalars().all()
+        assert len(refunds) == 2
+
+    run_db(main)
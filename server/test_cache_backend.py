@@ -0,0 +1,142 @@
+"""
+Tests for cache_backend.py against the in-memory backend and fakeredis
+Run with: python -m pytest test_cache_backend.py  (pip install fakeredis for the Redis cases)
+"""
+
+import asyncio
+
+import pytest
+
+from cache_backend import MemoryCacheBackend, RedisCacheBackend, SingleFlight
+
+
+def make_backend(kind: str, ttl=None):
+    if kind == "memory":
+        return MemoryCacheBackend("test", ttl, maxsize=100)
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisCacheBackend(fakeredis.FakeAsyncRedis(), "test", ttl)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def kind(request):
+    return request.param
+
+
+def test_set_get_delete(kind):
+    async def run():
+        cache = make_backend(kind)
+        assert await cache.get("a") is None
+        await cache.set("a", {"balance": 5, "symbols": ["bar", "777"]})
+        assert await cache.get("a") == {"balance": 5, "symbols": ["bar", "777"]}
+        await cache.delete("a")
+        assert await cache.get("a") is None
+
+    asyncio.run(run())
+
+
+def test_ttl_expiry(kind):
+    async def run():
+        cache = make_backend(kind, ttl=0.05)
+        await cache.set(1, 10)
+        await cache.set(2, 20, ttl=5)
+        await asyncio.sleep(0.1)
+        assert await cache.get(1) is None
+        assert await cache.get(2) == 20
+
+    asyncio.run(run())
+
+
+def test_get_or_load_is_single_flight(kind):
+    async def run():
+        cache = make_backend(kind)
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            return 42
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(20)))
+        assert results == [42] * 20
+        assert calls == 1
+        assert await cache.get_or_load("k", loader) == 42
+        assert calls == 1
+        stats = cache.stats()
+        assert stats["misses"] == 20 and stats["hits"] == 1 and stats["coalesced"] == 19
+
+    asyncio.run(run())
+
+
+def test_loader_errors_reach_every_waiter(kind):
+    async def run():
+        cache = make_backend(kind)
+
+        async def loader():
+            await asyncio.sleep(0.01)
+            raise LookupError("gone")
+
+        results = await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)), return_exceptions=True)
+        assert all(isinstance(r, LookupError) for r in results)
+        assert await cache.get_or_load("k", lambda: asyncio.sleep(0, result=7)) == 7
+
+    asyncio.run(run())
+
+
+def test_none_is_not_cached(kind):
+    async def run():
+        cache = make_backend(kind)
+        assert await cache.get_or_load("k", lambda: asyncio.sleep(0, result=None)) is None
+        assert await cache.get_or_load("k", lambda: asyncio.sleep(0, result=3)) == 3
+
+    asyncio.run(run())
+
+
+def test_memory_backend_evicts_least_recently_used():
+    async def run():
+        cache = MemoryCacheBackend("test", maxsize=2)
+        await cache.set("a", 1)
+        await cache.set("b", 2)
+        await cache.get("a")
+        await cache.set("c", 3)
+        assert await cache.get("b") is None
+        assert await cache.get("a") == 1
+
+    asyncio.run(run())
+
+
+def test_redis_backend_prefixes_keys_and_survives_errors():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        client = fakeredis.FakeAsyncRedis()
+        cache = RedisCacheBackend(client, "balance", prefix="phs")
+        await cache.set(7, 100)
+        assert await client.get("phs:balance:7") == b"100"
+
+        await client.aclose()
+        cache.client = None  # every call now fails
+        assert await cache.get(7) is None
+        await cache.set(7, 1)
+        assert cache.stats()["errors"] == 2
+
+    asyncio.run(run())
+
+
+def test_single_flight_retries_after_leader_cancelled():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flight.do("k", slow))
+        await started.wait()
+        follower = asyncio.create_task(flight.do("k", lambda: asyncio.sleep(0, result="fresh")))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "fresh"
+
+    asyncio.run(run())
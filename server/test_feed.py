@@ -0,0 +1,127 @@
+"""
+Tests for feed.py: fan-out, slow-consumer drops and replay for late joiners
+Run with: python -m pytest test_feed.py
+"""
+
+import asyncio
+
+from feed import FeedBroadcaster
+
+
+async def collect(subscription, count: int):
+    messages = []
+    async for message in subscription:
+        messages.append(message)
+        if len(messages) == count:
+            break
+    return messages
+
+
+def test_one_serialized_message_for_every_subscriber():
+    async def run():
+        feed = FeedBroadcaster(client_buffer=10, history=5)
+        subscriptions = [feed.subscribe() for _ in range(3)]
+        feed.publish({"type": "spin", "diceValue": 64})
+
+        messages = [await subscription.next() for subscription in subscriptions]
+        assert messages[0] == '{"type":"spin","diceValue":64}'
+        assert all(message is messages[0] for message in messages)
+        assert feed.stats()["delivered"] == 3
+
+    asyncio.run(run())
+
+
+def test_thousands_of_subscribers_receive_every_event_in_order():
+    async def run():
+        feed = FeedBroadcaster(client_buffer=50, history=10)
+        subscriptions = [feed.subscribe() for _ in range(5000)]
+        readers = [asyncio.create_task(collect(subscription, 100)) for subscription in subscriptions]
+        await asyncio.sleep(0)
+
+        for i in range(100):
+            feed.publish({"n": i})
+            if i % 10 == 9:
+                await asyncio.sleep(0)  # let readers drain, as they would between spins
+
+        results = await asyncio.gather(*readers)
+        expected = [f'{{"n":{i}}}' for i in range(100)]
+        assert all(messages == expected for messages in results)
+        stats = feed.stats()
+        assert stats["delivered"] == 500_000
+        assert stats["dropped"] == 0
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_is_dropped_without_affecting_others():
+    async def run():
+        feed = FeedBroadcaster(client_buffer=5, history=5)
+        slow = feed.subscribe()
+        fast = feed.subscribe()
+        reader = asyncio.create_task(collect(fast, 20))
+
+        for i in range(20):
+            feed.publish({"n": i})
+            await asyncio.sleep(0)
+
+        assert len(await reader) == 20
+        assert slow.dropped and slow.closed
+        assert await slow.next() is None  # queued messages are discarded
+        assert feed.stats()["dropped"] == 1
+        assert feed.stats()["subscribers"] == 1
+
+    asyncio.run(run())
+
+
+def test_late_joiner_gets_recent_events_then_new_ones():
+    async def run():
+        feed = FeedBroadcaster(client_buffer=10, history=3)
+        for i in range(5):
+            feed.publish({"n": i})
+
+        late = feed.subscribe()
+        assert [await late.next() for _ in range(3)] == ['{"n":2}', '{"n":3}', '{"n":4}']
+        feed.publish({"n": 5})
+        assert await late.next() == '{"n":5}'
+        assert len(feed.subscribe(replay=False)) == 0
+
+    asyncio.run(run())
+
+
+def test_close_ends_open_streams():
+    async def run():
+        feed = FeedBroadcaster()
+        subscription = feed.subscribe(replay=False)
+        reader = asyncio.create_task(collect(subscription, 1))
+        await asyncio.sleep(0)
+        feed.close()
+        assert await reader == []
+        assert not subscription.dropped
+
+    asyncio.run(run())
+
+
+def test_events_from_other_workers_are_fanned_out_locally():
+    class Bus:
+        def __init__(self):
+            self.callbacks = {}
+            self.published = []
+
+        def subscribe(self, topic, callback):
+            self.callbacks[topic] = callback
+
+        def publish(self, topic, key=""):
+            self.published.append((topic, key))
+
+    async def run():
+        bus = Bus()
+        feed = FeedBroadcaster(bus, client_buffer=10, history=5)
+        subscription = feed.subscribe()
+        feed.publish({"n": 1})
+        assert bus.published == [("feed", '{"n":1}')]
+
+        bus.callbacks["feed"]('{"n":2}')  # as the cache bus delivers another worker's event
+        assert [await subscription.next() for _ in range(2)] == ['{"n":1}', '{"n":2}']
+        assert len(bus.published) == 1  # not forwarded again
+
+    asyncio.run(run())
@@ -0,0 +1,163 @@
+"""
+Tests for gift_inventory.py against a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_gift_inventory.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, update
+
+from conftest import create_user
+from database import AsyncSessionLocal
+from gift_inventory import GiftInventory, PrizeRange
+from models import Gift
+
+
+class Bus:
+    """Cache bus stand-in connecting inventories the way workers are connected"""
+
+    def __init__(self):
+        self.callbacks = {}
+        self.published = []
+
+    def subscribe(self, topic, callback):
+        self.callbacks.setdefault(topic, []).append(callback)
+
+    def publish(self, topic, key=""):
+        self.published.append((topic, key))
+
+    def deliver(self, skip=None):
+        """Hand every published event to the other subscribers"""
+        events, self.published = self.published, []
+        for topic, key in events:
+            for callback in self.callbacks.get(topic, ()):
+                if getattr(callback, "__self__", None) is not skip:
+                    callback(key)
+
+
+async def stock(*gifts):
+    """Available prize gifts from (price, rarity) pairs; returns their ids"""
+    async with AsyncSessionLocal() as db:
+        ids = (await db.execute(
+            insert(Gift).returning(Gift.id),
+            [
+                {"gift_type": "prize", "name": f"Gift {i}", "price": price, "rarity": rarity,
+                 "status": "available", "assigned_at": None}
+                for i, (price, rarity) in enumerate(gifts)
+            ],
+        )).scalars().all()
+        await db.commit()
+    return list(ids)
+
+
+async def gift_status(gift_id: int):
+    async with AsyncSessionLocal() as db:
+        return (await db.execute(select(Gift.status, Gift.user_id).where(Gift.id == gift_id))).one()
+
+
+def test_concurrent_wins_in_two_workers_never_share_a_gift(run_db):
+    async def main():
+        await stock(*[(300 + i % 20, "common") for i in range(40)])
+        winners = [await create_user(i) for i in range(60)]
+        first, second = GiftInventory(prize_ranges={}), GiftInventory(prize_ranges={})
+        await first.start()
+        await second.start()  # both index the same 40 gifts; neither hears of the other's takes
+
+        prize = PrizeRange(290, 330)
+        reservations = await asyncio.gather(*(
+            (first if i % 2 else second).reserve(user_id, prize) for i, user_id in enumerate(winners)
+        ))
+
+        won = [reservation.gift_id for reservation in reservations if reservation]
+        assert len(won) == 40
+        assert len(set(won)) == 40
+        assert first.conflicts + second.conflicts > 0  # stale entries were skipped, not assigned twice
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(select(Gift.id, Gift.user_id).where(Gift.status == "reserved"))).all()
+        assert {gift_id: user_id for gift_id, user_id in rows} == {
+            reservation.gift_id: reservation.user_id for reservation in reservations if reservation
+        }
+        await first.stop()
+        await second.stop()
+
+    run_db(main)
+
+
+def test_reserve_takes_cheapest_in_range_of_the_rarity(run_db):
+    async def main():
+        cheap, rare, dear = await stock((300, "common"), (310, "rare"), (900, "common"))
+        inventory = GiftInventory(prize_ranges={(50, "bar"): PrizeRange(290, 330)})
+        await inventory.start()
+        user_id = await create_user(1)
+
+        assert (await inventory.reserve(user_id, PrizeRange(290, 330, "rare"))).gift_id == rare
+        assert (await inventory.reserve_prize(user_id, 50, "bar")).gift_id == cheap
+        assert await inventory.reserve_prize(user_id, 50, "bar") is None  # 900 is out of range
+        assert await inventory.reserve_prize(user_id, 50, "lemon") is None  # no prize configured
+        assert inventory.stats()["in_stock"]["common"] == 1
+        await inventory.stop()
+
+    run_db(main)
+
+
+def test_confirm_hands_over_and_release_restocks(run_db):
+    async def main():
+        first, second = await stock((300, "common"), (305, "common"))
+        inventory = GiftInventory(prize_ranges={})
+        await inventory.start()
+        user_id = await create_user(1)
+        prize = PrizeRange(290, 330)
+
+        won = await inventory.reserve(user_id, prize)
+        gift = await inventory.confirm(won)
+        assert gift["id"] == first and gift["assignedAt"] is not None
+        assert await gift_status(first) == ("owned", user_id)
+        assert await inventory.confirm(won) is None  # confirmed once
+
+        lost = await inventory.reserve(user_id, prize)
+        await inventory.release(lost)
+        assert await gift_status(second) == ("available", None)
+        assert (await inventory.reserve(user_id, prize)).gift_id == second
+        page, cursor = await inventory.owned(user_id)
+        assert [owned["id"] for owned in page] == [first] and cursor is None
+        await inventory.stop()
+
+    run_db(main)
+
+
+def test_expired_reservations_return_to_stock_in_every_worker(run_db):
+    async def main():
+        (gift_id,) = await stock((300, "common"))
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Gift).values(rarity=None))  # a legacy row; offered as common
+            await db.commit()
+        bus = Bus()
+        first = GiftInventory(bus, prize_ranges={}, reservation_ttl=60)
+        second = GiftInventory(bus, prize_ranges={}, reservation_ttl=60)
+        await first.start()
+        await second.start()
+        winner, other = await create_user(1), await create_user(2)
+        prize = PrizeRange(290, 330)
+
+        reservation = await first.reserve(winner, prize)
+        bus.deliver(skip=first)
+        assert second.stats()["in_stock"]["common"] == 0
+
+        # The winner's worker died before confirming; the sweep returns the gift after the TTL
+        assert await first.release_expired() == 0
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(Gift).values(reserved_at=datetime.utcnow() - timedelta(seconds=120)))
+            await db.commit()
+        assert await first.release_expired() == 1
+        assert bus.published == [("gift", f"add:{gift_id}:300:common")]
+        bus.deliver(skip=first)
+        assert second.stats()["in_stock"]["common"] == 1
+
+        assert (await second.reserve(other, prize)).gift_id == gift_id
+        assert await first.confirm(reservation) is None  # the expired reservation is gone
+        assert await gift_status(gift_id) == ("reserved", other)
+        await first.stop()
+        await second.stop()
+
+    run_db(main)
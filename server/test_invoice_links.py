@@ -0,0 +1,162 @@
+"""
+Tests for invoice_links.py with a stub Bot API client and a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_invoice_links.py
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import invoice_links as invoice_links_module
+from database import AsyncSessionLocal
+from invoice_links import InvoiceLinkError, InvoiceLinkPool
+from models import InvoiceNonce
+
+
+class StubTelegram:
+    """createInvoiceLink answering with numbered links; payloads are kept for the assertions"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.payloads = []
+
+    async def call(self, method, payload=None):
+        assert method == "createInvoiceLink"
+        await asyncio.sleep(0)
+        if self.fail:
+            return {"ok": False, "error_code": 400, "description": "Bad Request"}
+        self.payloads.append(json.loads(payload["payload"]))
+        return {"ok": True, "result": f"https://t.me/$invoice-{len(self.payloads)}"}
+
+
+@pytest.fixture
+def telegram(monkeypatch):
+    stub = StubTelegram()
+    monkeypatch.setattr(invoice_links_module, "get_telegram_client", lambda: stub)
+    return stub
+
+
+async def settle(pool: InvoiceLinkPool):
+    """Wait for background refills to finish"""
+    while pool._refills:
+        await asyncio.gather(*pool._refills.values(), return_exceptions=True)
+
+
+def payload_of(telegram: StubTelegram, url: str):
+    return telegram.payloads[int(url.rsplit("-", 1)[1]) - 1]
+
+
+def test_pool_prewarms_serves_and_refills(run_db, telegram):
+    async def main():
+        pool = InvoiceLinkPool("1:test", tiers=[50, 100], pool_size=3)
+        pool.start()
+        await settle(pool)
+        assert pool.stats()["pooled"] == {50: 3, 100: 3}
+
+        urls = [await pool.issue(50, user_id=7) for _ in range(2)]
+        assert [payload_of(telegram, url)["betAmount"] for url in urls] == [50, 50]
+        numbers = [int(url.rsplit("-", 1)[1]) for url in urls]
+        assert numbers == sorted(numbers)  # oldest first
+        await settle(pool)
+        assert pool.stats()["pooled"] == {50: 3, 100: 3}
+        assert (pool.hits, pool.misses, pool.created) == (2, 0, 8)
+        await pool.stop()
+
+    run_db(main)
+
+
+def test_other_amounts_and_empty_pools_create_on_demand(run_db, telegram):
+    async def main():
+        pool = InvoiceLinkPool("1:test", tiers=[50], pool_size=2)
+        pool.start()
+        url = await pool.issue(75)  # not a tier: created now, never pooled
+        assert payload_of(telegram, url)["betAmount"] == 75
+        await settle(pool)
+        assert pool.stats()["pooled"] == {50: 2}
+        assert pool.misses == 1
+        await pool.stop()
+
+    run_db(main)
+
+
+def test_stale_pooled_links_are_discarded(run_db, telegram):
+    async def main():
+        pool = InvoiceLinkPool("1:test", tiers=[50], pool_size=2, link_ttl=0.01)
+        pool.start()
+        await settle(pool)
+        await asyncio.sleep(0.02)
+        url = await pool.issue(50)
+        assert url == "https://t.me/$invoice-3"  # both pooled links had expired
+        assert (pool.expired, pool.misses) == (2, 1)
+        await pool.stop()
+
+    run_db(main)
+
+
+def test_failed_refill_leaves_creation_on_demand(run_db, monkeypatch):
+    async def main():
+        stub = StubTelegram(fail=True)
+        monkeypatch.setattr(invoice_links_module, "get_telegram_client", lambda: stub)
+        pool = InvoiceLinkPool("1:test", tiers=[50], pool_size=2)
+        pool.start()
+        await settle(pool)
+        assert pool.stats()["pooled"] == {50: 0}
+        with pytest.raises(InvoiceLinkError):
+            await pool.issue(50)
+
+        stub.fail = False
+        assert await pool.issue(50)
+        await settle(pool)
+        assert pool.stats()["pooled"] == {50: 2}
+        await pool.stop()
+
+    run_db(main)
+
+
+def test_nonce_resolves_once_with_a_valid_signature(run_db, telegram):
+    async def main():
+        pool = InvoiceLinkPool("1:test", tiers=[], pool_size=0)
+        payload = payload_of(telegram, await pool.issue(50, user_id=7))
+        nonce, sig = payload["nonce"], payload["sig"]
+
+        assert await pool.resolve(nonce, "0" * 32, 50) is None  # forged signature
+        assert await pool.resolve(nonce, sig, 100) is None  # signed for another amount
+        assert await InvoiceLinkPool("2:other").resolve(nonce, sig, 50) is None  # another bot's key
+        assert await pool.resolve(nonce, sig, 50) == 7
+        assert await pool.resolve(nonce, sig, 50) is None  # single use
+        assert (pool.resolved, pool.unresolved) == (1, 1)
+
+    run_db(main)
+
+
+def test_concurrent_resolves_in_separate_workers_get_the_user_once(run_db, telegram):
+    async def main():
+        pool = InvoiceLinkPool("1:test", tiers=[])
+        payload = payload_of(telegram, await pool.issue(50, user_id=7))
+        workers = [InvoiceLinkPool("1:test", tiers=[]) for _ in range(10)]
+
+        users = await asyncio.gather(*(
+            worker.resolve(payload["nonce"], payload["sig"], 50) for worker in workers
+        ))
+        assert sorted(users, key=lambda user: user is None) == [7] + [None] * 9
+
+    run_db(main)
+
+
+def test_expired_nonces_do_not_resolve_and_are_purged(run_db, telegram):
+    async def main():
+        pool = InvoiceLinkPool("1:test", tiers=[], nonce_ttl=60)
+        payload = payload_of(telegram, await pool.issue(50, user_id=7))
+        async with AsyncSessionLocal() as db:
+            await db.execute(update(InvoiceNonce).values(created_at=datetime.utcnow() - timedelta(seconds=120)))
+            await db.commit()
+
+        assert await pool.resolve(payload["nonce"], payload["sig"], 50) is None
+        await pool._purge_nonces()
+        async with AsyncSessionLocal() as db:
+            assert await db.get(InvoiceNonce, payload["nonce"]) is None
+
+    run_db(main)
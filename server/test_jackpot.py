@@ -0,0 +1,159 @@
+"""
+Tests for jackpot.py against a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_jackpot.py
+"""
+
+import random
+
+import pytest
+from sqlalchemy import select
+
+import jackpot as jackpot_module
+from conftest import create_user
+from database import AsyncSessionLocal
+from jackpot import FenwickTree, JackpotService
+from ledger import InsufficientFunds, Ledger
+from models import JackpotEntry, JackpotRound
+
+
+def test_fenwick_tree_matches_a_linear_scan():
+    rng = random.Random(7)
+    tree, weights = FenwickTree(), []
+    for _ in range(300):
+        if weights and rng.random() < 0.4:
+            slot = rng.randrange(len(weights))
+            extra = rng.randint(1, 5)
+            tree.add(slot, extra)
+            weights[slot] += extra
+        else:
+            weights.append(rng.randint(0, 9))  # a slot may hold no ticket yet
+            assert tree.append(weights[-1]) == len(weights) - 1
+
+    assert tree.total == sum(weights)
+    assert [tree.weight(slot) for slot in range(len(weights))] == weights
+    owners = [slot for slot, weight in enumerate(weights) for _ in range(weight)]
+    assert [tree.find(ticket) for ticket in range(tree.total)] == owners
+    with pytest.raises(IndexError):
+        tree.find(tree.total)
+
+
+def test_entries_fill_the_round_and_the_close_pays_the_pool(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        service = JackpotService(ledger, ticket_price=5)
+        await service.start()
+        first, second = await create_user(11, 100), await create_user(12, 100)
+
+        entered = await service.enter(first, 30)
+        assert (entered["tickets"], entered["balance"], entered["myTickets"]) == (6, 70, 6)
+        assert entered["closesIn"] is not None
+        await service.enter(second, 12)  # 2 tickets; the 2 Stars left over still go to the pool
+        await service.enter(first, 10)
+        snapshot = service.snapshot(first)
+        assert (snapshot["pool"], snapshot["totalTickets"], snapshot["players"], snapshot["myTickets"]) == (52, 10, 2, 8)
+        with pytest.raises(ValueError):
+            await service.enter(second, 4)
+        with pytest.raises(InsufficientFunds):
+            await service.enter(second, 500)
+
+        round_id = snapshot["roundId"]
+        monkeypatch.setattr(jackpot_module.secrets, "randbelow", lambda n: 8)  # the first of second's tickets
+        result = await service.close_round()
+
+        assert result == {
+            "roundId": round_id, "pool": 52, "tickets": 10, "players": 2, "winningTicket": 8, "winnerId": 12,
+        }
+        assert await ledger.balance(first) == 60
+        assert await ledger.balance(second) == 88 + 52
+        async with AsyncSessionLocal() as db:
+            drawn = await db.get(JackpotRound, round_id)
+            assert (drawn.status, drawn.winner_id, drawn.total_pool) == ("completed", second, 52)
+        after = service.snapshot()
+        assert after["roundId"] != round_id and after["totalTickets"] == 0 and after["closesIn"] is None
+        assert after["lastRound"] == result
+        assert await service.close_round() is None  # nobody entered the new round
+        await service.stop()
+
+    run_db(main)
+
+
+def test_winning_ticket_picks_players_by_weight(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        service = JackpotService(ledger)
+        await service.start()
+        players = [await create_user(20 + n, 100) for n in range(3)]
+        owners = []
+        for user_id, tickets in zip(players, (3, 1, 6)):  # tickets 0-2, 3, 4-9
+            await service.enter(user_id, tickets)
+            owners += [user_id] * tickets
+
+        assert [service._players[service._tree.find(ticket)] for ticket in range(10)] == owners
+
+        monkeypatch.setattr(jackpot_module.secrets, "randbelow", lambda n: 3)
+        assert (await service.close_round())["winnerId"] == 21
+        assert await ledger.balance(players[1]) == 99 + 10
+        await service.stop()
+
+    run_db(main)
+
+
+def test_entry_into_a_round_drawn_by_another_worker_moves_to_the_next_round(run_db):
+    async def main():
+        ledger = Ledger()
+        first, second = JackpotService(ledger), JackpotService(ledger)  # two workers on one round
+        await first.start()
+        await second.start()
+        early, late = await create_user(31, 100), await create_user(32, 100)
+        old_round = first.snapshot()["roundId"]
+        assert second.snapshot()["roundId"] == old_round
+
+        await first.enter(early, 10)
+        assert (await first.close_round())["pool"] == 10
+        # second still believes the old round is active: RoundClosed, reload, enter the new one
+        entered = await second.enter(late, 5)
+
+        new_round = first.snapshot()["roundId"]
+        assert entered["roundId"] == new_round != old_round
+        assert entered["balance"] == 95
+        async with AsyncSessionLocal() as db:
+            rounds = (await db.execute(
+                select(JackpotEntry.jackpot_round_id).where(JackpotEntry.user_id == late)
+            )).scalars().all()
+        assert rounds == [new_round]  # the rolled-back attempt left no entry and no debit
+        await first.stop()
+        await second.stop()
+
+    run_db(main)
+
+
+def test_round_is_rebuilt_from_persisted_entries(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        service = JackpotService(ledger, round_seconds=60)
+        await service.start()
+        players = [await create_user(40 + n, 100) for n in range(3)]
+        for user_id, amount in zip(players, (4, 2, 4)):
+            await service.enter(user_id, amount)
+        await service.enter(players[0], 1)
+        await service.stop()
+
+        # A restarted worker picks the round up with the same pool, slots and deadline
+        restarted = JackpotService(ledger, round_seconds=60)
+        await restarted.start()
+        snapshot = restarted.snapshot(players[0])
+        assert (snapshot["pool"], snapshot["totalTickets"], snapshot["players"], snapshot["myTickets"]) == (11, 11, 3, 5)
+        assert restarted._players == players  # in order of first entry
+        assert 50 < snapshot["closesIn"] <= 60
+
+        # A worker that missed entries draws from the database instead of its own pool
+        stale = JackpotService(ledger)
+        stale._reset(snapshot["roundId"])
+        # Tickets 0-4 are players[0]'s (the later entry joins their slot), 5-6 and 7-10 the others'
+        monkeypatch.setattr(jackpot_module.secrets, "randbelow", lambda n: 4)
+        result = await stale.close_round()
+        assert (result["tickets"], result["pool"], result["winnerId"]) == (11, 11, 40)
+        assert await ledger.balance(players[0]) == 95 + 11
+        await restarted.stop()
+
+    run_db(main)
@@ -0,0 +1,163 @@
+"""
+Tests for ledger.py against a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_ledger.py
+"""
+
+import asyncio
+from contextlib import nullcontext
+
+import pytest
+from sqlalchemy import select
+
+import ledger as ledger_module
+from conftest import create_user
+from database import AsyncSessionLocal
+from ledger import InsufficientFunds, Ledger
+from models import Transaction
+
+
+def test_apply_updates_balance_and_records_transaction(run_db):
+    async def main():
+        ledger = Ledger()
+        user_id = await create_user(1, 100)
+
+        transaction_id, balance = await ledger.apply(user_id, -30, "bet")
+        assert balance == 70
+        assert await ledger.balance(user_id) == 70
+        with pytest.raises(InsufficientFunds):
+            await ledger.debit(user_id, 71)
+        assert await ledger.credit(user_id, 5) == 75
+
+        async with AsyncSessionLocal() as db:
+            amounts = (await db.execute(
+                select(Transaction.amount).where(Transaction.user_id == user_id).order_by(Transaction.id)
+            )).scalars().all()
+        assert amounts == [-30, 5]
+        assert transaction_id is not None
+
+    run_db(main)
+
+
+class PausedRead:
+    """Stands in for the ledger's next session: pauses after its first read until resume is set"""
+
+    def __init__(self, monkeypatch):
+        self.read = asyncio.Event()
+        self.resume = asyncio.Event()
+        pending = [self]
+        monkeypatch.setattr(ledger_module, "AsyncSessionLocal", lambda: pending.pop() if pending else AsyncSessionLocal())
+
+    async def __aenter__(self):
+        self.session = AsyncSessionLocal()
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+    async def execute(self, statement):
+        result = await self.session.execute(statement)
+        self.read.set()
+        await self.resume.wait()
+        return result
+
+
+class PausedClose(PausedRead):
+    """Stands in for the ledger's next session: pauses once it has committed and closed"""
+
+    async def __aexit__(self, *exc):
+        await self.session.__aexit__(*exc)
+        self.read.set()
+        await self.resume.wait()
+
+    async def execute(self, statement):
+        return await self.session.execute(statement)
+
+    async def commit(self):
+        await self.session.commit()
+
+
+def test_transaction_resuming_after_a_later_commit_does_not_cache_its_older_balance(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        ledger._write_lock = nullcontext()  # as on PostgreSQL, where the row lock ends at the commit
+        user_id = await create_user(5, 100)
+        paused = PausedClose(monkeypatch)
+
+        first = asyncio.create_task(ledger.credit(user_id, 10))
+        await paused.read.wait()  # committed 110, not cached yet
+        assert await ledger.credit(user_id, 20) == 130
+        paused.resume.set()
+
+        assert await first == 110
+        assert await ledger.balance(user_id) == 130
+        assert ledger.stats()["superseded"] == 1
+        assert ledger._latest == {}
+
+    run_db(main)
+
+
+def test_rolled_back_change_does_not_hold_back_the_cache(run_db):
+    async def main():
+        ledger = Ledger()
+        user_id = await create_user(6, 100)
+        with pytest.raises(RuntimeError):
+            async with ledger.transaction() as tx:
+                await tx.apply(user_id, 50, "deposit")
+                raise RuntimeError("caller failed after the change")
+        assert ledger._latest == {}
+        assert await ledger.balance(user_id) == 100
+        assert await ledger.credit(user_id, 1) == 101
+        assert await ledger.balance(user_id) == 101
+        assert ledger.stats()["cache"]["hits"] >= 1
+
+    run_db(main)
+
+
+def test_load_overtaken_by_a_credit_does_not_cache_the_older_balance(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        user_id = await create_user(2, 100)
+        paused = PausedRead(monkeypatch)
+
+        load = asyncio.create_task(ledger.balance(user_id))
+        await paused.read.wait()  # the loader has read 100 and not cached it yet
+        assert (await ledger.apply(user_id, 50, "deposit"))[1] == 150
+        paused.resume.set()
+
+        assert await load == 150
+        assert await ledger.balance(user_id) == 150
+        assert ledger.stats()["reloads"] == 1
+
+    run_db(main)
+
+
+def test_load_overtaken_by_another_workers_change(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        other = Ledger()  # a second worker with its own cache
+        user_id = await create_user(3, 100)
+        paused = PausedRead(monkeypatch)
+
+        load = asyncio.create_task(ledger.balance(user_id))
+        await paused.read.wait()
+        await other.credit(user_id, 25)
+        await ledger.invalidate(user_id)  # as the cache bus delivers the other worker's change
+        paused.resume.set()
+
+        assert await load == 125
+        assert await ledger.balance(user_id) == 125
+
+    run_db(main)
+
+
+def test_load_without_changes_is_cached_once(run_db, monkeypatch):
+    async def main():
+        ledger = Ledger()
+        user_id = await create_user(4, 40)
+        assert await asyncio.gather(*(ledger.balance(user_id) for _ in range(10))) == [40] * 10
+        stats = ledger.stats()
+        assert stats["reloads"] == 0
+        assert stats["cache"]["misses"] >= 1 and stats["cache"]["hits"] + stats["cache"]["misses"] == 10
+
+    run_db(main)
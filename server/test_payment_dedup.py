@@ -0,0 +1,145 @@
+"""
+Tests for payment_dedup.py against a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_payment_dedup.py
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from conftest import create_user
+from database import AsyncSessionLocal
+from models import Transaction
+from payment_dedup import PaymentDeduplicator
+
+
+def payment_row(user_id: int, charge_id: str):
+    return {
+        "user_id": user_id,
+        "transaction_type": "bet",
+        "amount": 50,
+        "currency": "XTR",
+        "description": "Slot spin (50 Stars)",
+        "telegram_payment_id": charge_id,
+    }
+
+
+async def statuses():
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(select(Transaction.telegram_payment_id, Transaction.status))).all()
+    return dict(rows)
+
+
+async def transaction_ids():
+    async with AsyncSessionLocal() as db:
+        return dict((await db.execute(select(Transaction.telegram_payment_id, Transaction.id))).all())
+
+
+async def age(charge_id: str, seconds: float):
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(Transaction)
+            .where(Transaction.telegram_payment_id == charge_id)
+            .values(created_at=datetime.utcnow() - timedelta(seconds=seconds))
+        )
+        await db.commit()
+
+
+def test_concurrent_claims_from_separate_workers_have_one_winner(run_db):
+    async def main():
+        user_id = await create_user(1)
+        workers = [PaymentDeduplicator() for _ in range(25)]  # one per simulated process
+
+        claims = await asyncio.gather(*(
+            worker.claim(payment_row(user_id, "charge-1")) for worker in workers
+        ))
+
+        winners = [transaction_id for transaction_id in claims if transaction_id is not None]
+        assert len(winners) == 1
+        assert sum(worker.duplicates for worker in workers) == 24
+        assert await statuses() == {"charge-1": "pending"}
+
+    run_db(main)
+
+
+def test_memory_filter_short_circuits_within_a_process():
+    dedup = PaymentDeduplicator()
+    assert dedup.mark("charge-1")
+    assert not dedup.mark("charge-1")
+    assert dedup.mark(None)
+    dedup.forget("charge-1")
+    assert dedup.mark("charge-1")
+    assert dedup.duplicates == 1
+
+
+def test_released_claim_can_be_claimed_again(run_db):
+    async def main():
+        user_id = await create_user(1)
+        dedup = PaymentDeduplicator()
+        transaction_id = await dedup.claim(payment_row(user_id, "charge-1"))
+        await dedup.release(transaction_id)
+
+        assert await dedup.claim(payment_row(user_id, "charge-1")) is not None
+        assert await dedup.claim(payment_row(user_id, "charge-1")) is None
+
+    run_db(main)
+
+
+def test_recovery_refunds_stuck_payments_once(run_db):
+    async def main():
+        user_id = await create_user(42)
+        dedup = PaymentDeduplicator(recovery_age=60)
+        for charge_id in ("stuck", "failed", "completed", "recent"):
+            await dedup.claim(payment_row(user_id, charge_id))
+        ids = await transaction_ids()
+        await dedup.finish(ids["failed"], "failed")
+        await dedup.finish(ids["completed"], "completed")
+        for charge_id in ("stuck", "failed", "completed"):
+            await age(charge_id, 120)
+
+        refunds = []
+
+        async def refund(telegram_id, charge_id):
+            await asyncio.sleep(0)
+            refunds.append((telegram_id, charge_id))
+
+        # Two workers recovering at the same time refund each payment once
+        other = PaymentDeduplicator(recovery_age=60)
+        assert sum(await asyncio.gather(dedup.recover(refund), other.recover(refund))) == 2
+
+        assert sorted(refunds) == [(42, "failed"), (42, "stuck")]
+        assert await statuses() == {
+            "stuck": "refunded", "failed": "refunded", "completed": "completed", "recent": "pending",
+        }
+        # A refunded claim cannot be completed by a worker that finishes late
+        assert not await dedup.finish(ids["stuck"], "completed")
+        assert await dedup.recover(refund) == 0
+
+    run_db(main)
+
+
+def test_failed_refund_is_retried(run_db):
+    async def main():
+        user_id = await create_user(42)
+        dedup = PaymentDeduplicator(recovery_age=60)
+        await dedup.claim(payment_row(user_id, "stuck"))
+        await age("stuck", 120)
+
+        async def unavailable(telegram_id, charge_id):
+            raise RuntimeError("refundStarPayment failed: Bad Gateway")
+
+        assert await dedup.recover(unavailable) == 0
+        assert await statuses() == {"stuck": "failed"}
+        assert dedup.refund_failures == 1
+
+        refunds = []
+
+        async def refund(telegram_id, charge_id):
+            refunds.append(charge_id)
+
+        assert await dedup.recover(refund) == 1
+        assert refunds == ["stuck"]
+        assert await statuses() == {"stuck": "refunded"}
+
+    run_db(main)
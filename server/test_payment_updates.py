@@ -0,0 +1,121 @@
+"""
+Tests for the paid-spin pipeline in main.py (process_payment_update) with a scripted spin,
+a stub scheduler and a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_payment_updates.py
+"""
+
+import json
+
+import msgspec
+import pytest
+from sqlalchemy import insert, select
+
+import main
+from database import AsyncSessionLocal
+from gift_inventory import GiftInventory, PrizeRange
+from ledger import Ledger
+from models import Gift, Transaction
+from payment_dedup import PaymentDeduplicator
+from session_store import SessionStore
+from telegram_updates import Update
+
+PAYER = 4242
+
+
+class Scheduler:
+    """send_scheduler stand-in keeping the private notifications"""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, method, payload, chat_id=None, priority=None):
+        self.sent.append(payload["text"])
+        return {"ok": True}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """main's services, fresh for the test; a 777 three-of-a-kind worth 1000 Stars on a 50-Star bet"""
+    async def winning_spin(user_id, bet_amount):
+        return main.SpinResult(
+            symbols=["777", "777", "777"], diceValue=64, isWin=True, isJackpot=True,
+            winAmount=1000, text="🎰 777 777 777\n🏆 Won: 1000 Stars",
+        )
+
+    scheduler = Scheduler()
+    monkeypatch.setattr(main, "perform_spin", winning_spin)
+    monkeypatch.setattr(main, "session_store", SessionStore())
+    monkeypatch.setattr(main, "payment_dedup", PaymentDeduplicator())
+    monkeypatch.setattr(main, "ledger", Ledger())
+    monkeypatch.setattr(main, "gifts", GiftInventory(prize_ranges={(50, "777"): PrizeRange(900, 1000)}))
+    monkeypatch.setattr(main, "send_scheduler", scheduler)
+    return scheduler
+
+
+def payment_update(charge_id: str) -> Update:
+    return msgspec.convert({
+        "update_id": 1,
+        "message": {
+            "message_id": 1,
+            "chat": {"id": PAYER, "type": "private"},
+            "from": {"id": PAYER},
+            "successful_payment": {
+                "total_amount": 50,
+                "telegram_payment_charge_id": charge_id,
+                "invoice_payload": json.dumps({"betAmount": 50}),
+            },
+        },
+    }, Update)
+
+
+async def pay(charge_id: str):
+    update = payment_update(charge_id)
+    transaction_id = await main.claim_payment(update)
+    await main.process_payment_update((transaction_id, update))
+
+
+async def prizes(user_id: int):
+    """(Stars credited, gifts owned) for users.id"""
+    async with AsyncSessionLocal() as db:
+        credited = (await db.execute(
+            select(Transaction.amount).where(Transaction.user_id == user_id, Transaction.transaction_type != "bet")
+        )).scalars().all()
+        owned = (await db.execute(
+            select(Gift.price).where(Gift.user_id == user_id, Gift.status == "owned")
+        )).scalars().all()
+    return list(credited), list(owned)
+
+
+def test_winning_spin_with_a_gift_in_stock_pays_only_the_gift(run_db, service):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Gift).values(
+                gift_type="prize", name="Golden Hat", price=950, rarity="common", status="available", assigned_at=None,
+            ))
+            await db.commit()
+        await main.gifts.start()
+
+        await pay("charge-1")
+
+        user_id = await main.session_store.user_pk(PAYER)
+        assert await prizes(user_id) == ([], [950])
+        assert await main.ledger.balance(user_id) == 0
+        assert service.sent[0].endswith("🎁 Gift: Golden Hat (instead of the Stars)")
+        await main.gifts.stop()
+
+    run_db(run)
+
+
+def test_winning_spin_without_a_gift_in_stock_pays_stars(run_db, service):
+    async def run():
+        await main.gifts.start()
+
+        await pay("charge-1")
+
+        user_id = await main.session_store.user_pk(PAYER)
+        assert await prizes(user_id) == ([1000], [])
+        assert await main.ledger.balance(user_id) == 1000
+        assert "Gift" not in service.sent[0]
+        await main.gifts.stop()
+
+    run_db(run)
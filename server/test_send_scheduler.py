@@ -0,0 +1,70 @@
+"""
+Tests for send_scheduler.py with a stub Bot API client (no network)
+Run with: python -m pytest test_send_scheduler.py
+"""
+
+import asyncio
+
+import pytest
+
+from send_scheduler import SchedulerBusy, SendScheduler
+
+
+class SlowTelegram:
+    """Answers every call once released; rate_limited answers with 429 instead"""
+
+    def __init__(self, rate_limited: bool = False):
+        self.release = asyncio.Event()
+        self.rate_limited = rate_limited
+        self.calls = 0
+
+    async def call(self, method, payload=None):
+        self.calls += 1
+        await self.release.wait()
+        if self.rate_limited:
+            return {"ok": False, "error_code": 429, "parameters": {"retry_after": 1}}
+        return {"ok": True, "result": payload}
+
+
+def test_stop_waits_for_calls_in_flight():
+    async def main():
+        telegram = SlowTelegram()
+        scheduler = SendScheduler(client_factory=lambda: telegram)
+        scheduler.start()
+        sends = [asyncio.create_task(scheduler.send("sendMessage", {"n": n})) for n in range(3)]
+        while telegram.calls < 3:
+            await asyncio.sleep(0)
+        assert scheduler.stats()["in_flight"] == 3
+
+        stopping = asyncio.create_task(scheduler.stop())
+        await asyncio.sleep(0.01)
+        assert not stopping.done()
+        telegram.release.set()
+        await stopping
+
+        assert [(await send)["result"]["n"] for send in sends] == [0, 1, 2]
+        assert scheduler.stats()["in_flight"] == 0 and scheduler.sent == 3
+
+    asyncio.run(main())
+
+
+def test_call_rate_limited_during_shutdown_is_failed():
+    async def main():
+        telegram = SlowTelegram(rate_limited=True)
+        scheduler = SendScheduler(client_factory=lambda: telegram)
+        scheduler.start()
+        send = asyncio.create_task(scheduler.send("sendMessage", {}, chat_id="@dice"))
+        while not telegram.calls:
+            await asyncio.sleep(0)
+
+        stopping = asyncio.create_task(scheduler.stop())
+        while scheduler._task is not None:  # the dispatcher is gone when the 429 comes back
+            await asyncio.sleep(0)
+        telegram.release.set()
+        await stopping
+
+        with pytest.raises(SchedulerBusy):
+            await asyncio.wait_for(send, 1)
+        assert scheduler.stats()["queued"] == 0
+
+    asyncio.run(main())
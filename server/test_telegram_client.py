@@ -0,0 +1,46 @@
+"""
+Tests for telegram_client.py against canned HTTP responses (no network)
+Run with: python -m pytest test_telegram_client.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from telegram_client import TelegramClient
+
+
+def client_answering(response: httpx.Response) -> TelegramClient:
+    client = TelegramClient(token="1:test", http2=False)
+    client._client = httpx.AsyncClient(
+        base_url="https://api.telegram.org/bot1:test/",
+        transport=httpx.MockTransport(lambda request: response),
+    )
+    return client
+
+
+def call(client: TelegramClient, method: str):
+    async def main():
+        try:
+            return await client.call(method)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+def test_json_responses_are_returned():
+    ok = client_answering(httpx.Response(200, json={"ok": True, "result": {"id": 1}}))
+    assert call(ok, "getMe") == {"ok": True, "result": {"id": 1}}
+    limited = client_answering(httpx.Response(429, json={"ok": False, "error_code": 429}))
+    assert call(limited, "sendDice")["error_code"] == 429
+
+
+@pytest.mark.parametrize("response", [
+    httpx.Response(502, text="<html><body>502 Bad Gateway</body></html>"),
+    httpx.Response(200, json=["not", "an", "object"]),
+])
+def test_bodies_that_are_not_json_objects_raise_http_errors(response):
+    with pytest.raises(httpx.HTTPError):
+        call(client_answering(response), "sendDice")
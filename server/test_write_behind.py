@@ -0,0 +1,102 @@
+"""
+Tests for write_behind.py against a temporary SQLite database (see conftest.py)
+Run with: python -m pytest test_write_behind.py
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import OperationalError
+
+import write_behind as write_behind_module
+from conftest import create_user
+from database import AsyncSessionLocal
+from models import Transaction
+from write_behind import WriteBehindBuffer
+
+
+class LockedSessions:
+    """Stands in for the buffer's sessions: the executes numbered in locked fail like a busy SQLite"""
+
+    def __init__(self, monkeypatch, *locked: int):
+        self.locked = set(locked)
+        self.executes = 0
+        monkeypatch.setattr(write_behind_module, "AsyncSessionLocal", lambda: Session(self))
+
+
+class Session:
+    def __init__(self, sessions: LockedSessions):
+        self.sessions = sessions
+
+    async def __aenter__(self):
+        self.session = AsyncSessionLocal()
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self.session.__aexit__(*exc)
+
+    async def execute(self, *args):
+        self.sessions.executes += 1
+        if self.sessions.executes in self.sessions.locked:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return await self.session.execute(*args)
+
+    async def commit(self):
+        await self.session.commit()
+
+    async def rollback(self):
+        await self.session.rollback()
+
+
+def payment(user_id: int, charge_id: str, created_at: datetime = None):
+    row = {"user_id": user_id, "transaction_type": "bet", "amount": 50, "telegram_payment_id": charge_id}
+    if created_at is not None:
+        row["created_at"] = created_at
+    return row
+
+
+async def written():
+    async with AsyncSessionLocal() as db:
+        return sorted((await db.execute(select(Transaction.telegram_payment_id))).scalars().all())
+
+
+def test_batch_is_retried_while_the_database_is_locked(run_db, monkeypatch):
+    async def main():
+        user_id = await create_user(1)
+        LockedSessions(monkeypatch, 1, 2)  # the first two attempts fail
+        buffer = WriteBehindBuffer(flush_ms=5, retry_max_ms=20)
+        buffer.start()
+        queued_at = datetime.utcnow() - timedelta(seconds=30)
+        for n in range(3):
+            await buffer.put(Transaction, payment(user_id, f"charge-{n}", queued_at))
+        await buffer.stop()
+
+        assert await written() == ["charge-0", "charge-1", "charge-2"]
+        stats = buffer.stats()
+        assert (stats["rows_written"], stats["rows_failed"], stats["retries"]) == (3, 0, 2)
+        async with AsyncSessionLocal() as db:
+            assert set((await db.execute(select(Transaction.created_at))).scalars()) == {queued_at}
+
+    run_db(main)
+
+
+def test_only_rows_violating_a_constraint_are_dropped(run_db, monkeypatch):
+    async def main():
+        user_id = await create_user(1)
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Transaction).values(payment(user_id, "taken")))
+            await db.commit()
+        # Bulk insert fails on "taken"; row by row, "late" then finds the database locked once
+        LockedSessions(monkeypatch, 4)
+        buffer = WriteBehindBuffer(flush_ms=5, retry_max_ms=20)
+        buffer.start()
+        for charge_id in ("early", "taken", "late"):
+            await buffer.put(Transaction, payment(user_id, charge_id))
+        await buffer.stop()
+
+        assert await written() == ["early", "late", "taken"]  # each once
+        stats = buffer.stats()
+        assert (stats["rows_written"], stats["rows_failed"], stats["retries"]) == (2, 1, 1)
+
+    run_db(main)
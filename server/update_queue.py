@@ -0,0 +1,132 @@
+"""
+In-process task queue for Telegram webhook updates
+The webhook enqueues and returns; a fixed pool of async workers does the work
+"""
+
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, List
+import asyncio
+import logging
+import os
+import time
+
+from metrics import WEBHOOK_UPDATE_SECONDS, ERRORS
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_QUEUE = int(os.getenv("WEBHOOK_MAX_QUEUE", "1000"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25"))
+
+
+class UpdateQueue:
+    """
+    Bounded queue of updates processed by `workers` concurrent tasks
+    describe(update) names an update in logs (e.g. its payment charge id)
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Any], Awaitable[None]],
+        workers: int = WEBHOOK_WORKERS,
+        max_queue: int = WEBHOOK_MAX_QUEUE,
+        describe: Callable[[Any], str] = repr,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.max_queue = max_queue
+        self.describe = describe
+        self._queue: "asyncio.Queue[tuple]" = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+        self._unfinished: Dict[int, Any] = {}  # queued or running updates by submit order
+        self._seq = count()
+
+        # Metrics
+        self.enqueued = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy = 0
+        self.max_wait_ms = 0.0
+        self.max_run_ms = 0.0
+        self._total_wait_ms = 0.0
+        self._total_run_ms = 0.0
+
+    def start(self):
+        """Spawn the worker tasks (FastAPI startup)"""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, update: Any) -> bool:
+        """Enqueue without waiting; False when the queue is full"""
+        seq = next(self._seq)
+        try:
+            self._queue.put_nowait((time.perf_counter(), seq, update))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self._unfinished[seq] = update
+        self.enqueued += 1
+        return True
+
+    async def stop(self, warn_after: float = WEBHOOK_DRAIN_TIMEOUT):
+        """
+        Let workers finish every queued update, then stop them (FastAPI shutdown)
+        Accepted updates were already acknowledged, so the drain has no deadline; every
+        warn_after seconds the updates still waiting are logged by name
+        """
+        if not self._tasks:
+            return
+        drained = asyncio.ensure_future(self._queue.join())
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(drained), warn_after)
+                break
+            except asyncio.TimeoutError:
+                waiting = ", ".join(self.describe(update) for update in self._unfinished.values())
+                logger.warning(f"Webhook queue still draining {len(self._unfinished)} updates: {waiting}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        done = self.processed + self.failed
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "busy": self.busy,
+            "enqueued": self.enqueued,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self._total_wait_ms / done, 2) if done else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 2),
+            "avg_run_ms": round(self._total_run_ms / done, 2) if done else 0.0,
+            "max_run_ms": round(self.max_run_ms, 2),
+        }
+
+    async def _worker(self):
+        while True:
+            enqueued_at, seq, update = await self._queue.get()
+            started = time.perf_counter()
+            wait_ms = (started - enqueued_at) * 1000
+            self.busy += 1
+            try:
+                await self.handler(update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                ERRORS.labels("webhook").inc()
+                logger.error(f"Webhook update processing failed: {e}")
+            finally:
+                run_ms = (time.perf_counter() - started) * 1000
+                WEBHOOK_UPDATE_SECONDS.observe(run_ms / 1000)
+                self.busy -= 1
+                self._total_wait_ms += wait_ms
+                self._total_run_ms += run_ms
+                self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+                self.max_run_ms = max(self.max_run_ms, run_ms)
+                del self._unfinished[seq]
+                self._queue.task_done()
@@ -0,0 +1,182 @@
+"""
+Write-behind buffer for append-only rows (spins)
+Rows are queued in memory and bulk-inserted every N ms or N rows
+"""
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DBAPIError, IntegrityError
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import time
+
+from database import AsyncSessionLocal
+from metrics import WRITE_BEHIND_FLUSH_SECONDS, WRITE_BEHIND_PENDING, WRITE_BEHIND_ROWS
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND_MAX_QUEUE = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+WRITE_BEHIND_FLUSH_MS = int(os.getenv("WRITE_BEHIND_FLUSH_MS", "200"))
+WRITE_BEHIND_RETRY_MAX_MS = int(os.getenv("WRITE_BEHIND_RETRY_MAX_MS", "30000"))  # longest wait between retries
+
+_written = WRITE_BEHIND_ROWS.labels("written")
+_failed = WRITE_BEHIND_ROWS.labels("failed")
+
+
+class WriteBehindBuffer:
+    """
+    Bounded asyncio queue of (model, row) pairs drained by one flusher task
+    put() waits while the queue is full, which pushes back on the request path.
+    A batch the database cannot take (locked, connection lost, ...) is retried with
+    exponential backoff until it is written; only rows violating a constraint are dropped.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = WRITE_BEHIND_MAX_QUEUE,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_ms: int = WRITE_BEHIND_FLUSH_MS,
+        retry_max_ms: int = WRITE_BEHIND_RETRY_MAX_MS,
+    ):
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.retry_max = retry_max_ms / 1000
+        self._queue: "asyncio.Queue[Tuple[Any, Dict[str, Any]]]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.retries = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """Start the flusher task (FastAPI startup)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued (retrying while the database is unavailable), then stop the flusher (FastAPI shutdown)"""
+        if self._task is None:
+            return
+        await self._queue.join()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def put(self, model: Any, row: Dict[str, Any]):
+        """Queue one row for insertion into model's table"""
+        await self._queue.put((model, row))
+        WRITE_BEHIND_PENDING.inc()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "max_queue": self.max_queue,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_failed": self.rows_failed,
+            "retries": self.retries,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 2),
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                while len(batch) < self.batch_size and not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                remaining = deadline - loop.time()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await self._flush_until_written(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+                WRITE_BEHIND_PENDING.dec(len(batch))
+
+    async def _flush_until_written(self, batch: List[Tuple[Any, Dict[str, Any]]]):
+        by_model: Dict[Any, List[Dict[str, Any]]] = defaultdict(list)
+        for model, row in batch:
+            by_model[model].append(row)
+
+        delay = self.flush_interval
+        while True:
+            try:
+                await self._flush(by_model)
+                return
+            except DBAPIError as e:
+                # Database locked, connection lost, ...: the rows not written yet are kept
+                self.retries += 1
+                pending = sum(len(rows) for rows in by_model.values())
+                logger.warning(f"Write-behind flush of {pending} rows failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max)
+            except Exception as e:
+                # Not the database's doing (e.g. a malformed row); retrying would not help
+                failed = sum(len(rows) for rows in by_model.values())
+                self.rows_failed += failed
+                _failed.inc(failed)
+                logger.error(f"Write-behind flush of {failed} rows failed: {e}")
+                return
+
+    async def _flush(self, by_model: Dict[Any, List[Dict[str, Any]]]):
+        """Insert the rows of by_model, removing them from it as they are written or dropped"""
+        start = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            try:
+                for model, rows in by_model.items():
+                    if rows:  # a retried batch may have been partly written row by row
+                        await db.execute(insert(model), rows)
+                await db.commit()
+                written = sum(len(rows) for rows in by_model.values())
+                self.rows_written += written
+                _written.inc(written)
+                by_model.clear()
+            except IntegrityError:
+                # One bad row (e.g. a duplicate payment id) must not drop the batch
+                await db.rollback()
+                await self._flush_rows(db, by_model)
+
+        elapsed = time.perf_counter() - start
+        WRITE_BEHIND_FLUSH_SECONDS.observe(elapsed)
+        elapsed_ms = elapsed * 1000
+        self.flushes += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+    async def _flush_rows(self, db, by_model: Dict[Any, List[Dict[str, Any]]]):
+        for model, rows in by_model.items():
+            while rows:
+                try:
+                    await db.execute(insert(model), [rows[0]])
+                    await db.commit()
+                    self.rows_written += 1
+                    _written.inc()
+                except IntegrityError as e:
+                    await db.rollback()
+                    self.rows_failed += 1
+                    _failed.inc()
+                    logger.warning(f"Dropping {model.__tablename__} row: {e.orig}")
+                rows.pop(0)